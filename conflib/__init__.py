@@ -6,18 +6,48 @@ from .common import (
     rmdir,
     get_user_home,
     get_abspath,
+    get_file_hash,
+    link_file,
+    clone_tree,
+    get_staging_dir,
+    replace_dir,
+    extract_tar_stream,
+    TarExtractor,
+    TreeManifest,
     download_file,
+    download_and_extract,
+    download_files,
+    probe_mirror,
+    MirrorRanking,
+    HttpMetadataCache,
+    is_https_url,
+    AsyncDownloader,
+    QueueReader,
+    get_http_session,
+    configure_http_session,
+    configure_rate_limit,
+    RateLimiter,
     get_terminal_width,
     File,
     FileReader,
     FileJson,
     JSON,
     ByteSize,
+    ShaSum,
+    CatalogEntry,
+    PackageCatalog,
+    ContentStore,
+    CacheManager,
+    TreeCache,
+    parse_byte_size,
     PackageApp,
+    download_packages,
     PackageTarGz,
     PackagePython3Zip,
     PackagePython2Zip,
     PackageWinExe,
+    invalidate_dirs_cache,
+    makedirs_batch,
     UserDirs,
     AppDirs,
     BuilderUserDirs,
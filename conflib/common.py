@@ -1,27 +1,58 @@
 #!/usr/bin/env python3
 #
 
+# As anotações não são avaliadas na importação, assim requests (Response) e
+# asyncio só são importados quando usados.
+from __future__ import annotations
 
+import copy
 import os
 import shutil
+import stat
 import sys
 import hashlib
+import tarfile
 import json
-import urllib.request
+import queue
+import threading
+import time
 from shutil import (unpack_archive, copyfile, rmtree)
 from pathlib import Path
 from platform import system
 from tempfile import NamedTemporaryFile, TemporaryDirectory
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from contextlib import contextmanager
 
 
-try:
-	#from bs4 import BeautifulSoup
-	import requests
-	from requests import Response
-	import tqdm
-except Exception as e:
-	print(e)
-	sys.exit(1)
+def _import_requests():
+	"""
+	   Importa o requests (e urllib3) no primeiro uso, assim comandos que não
+	acessam a rede não pagam o tempo de importação.
+	"""
+	try:
+		import requests
+	except Exception as e:
+		print(e)
+		sys.exit(1)
+	return requests
+
+
+def _import_tqdm():
+	try:
+		import tqdm
+	except Exception as e:
+		print(e)
+		sys.exit(1)
+	return tqdm
+
+
+def _import_aiohttp():
+	"""Retorna o módulo aiohttp (opcional, usado por AsyncDownloader), ou None."""
+	try:
+		import aiohttp
+	except ImportError:
+		return None
+	return aiohttp
 
 KERNEL_TYPE = system()
 
@@ -82,6 +113,568 @@ def get_abspath(path: str) -> str:
     return os.path.abspath(path)
 
 
+def get_staging_dir(target_dir: str) -> str:
+    """
+       Retorna um diretório temporário ao lado de target_dir (mesmo sistema de
+    arquivos), onde o conteúdo pode ser preparado e depois movido com os.rename().
+    """
+    return f'{get_abspath(target_dir)}.staging-{os.getpid()}'
+
+
+def replace_dir(src_dir: str, target_dir: str) -> None:
+    """
+       Move src_dir para target_dir com os.rename(). Se target_dir já existir ele
+    é renomeado antes e apagado depois, então target_dir nunca fica incompleto.
+    src_dir e target_dir devem estar no mesmo sistema de arquivos.
+    """
+    if not os.path.exists(target_dir):
+        os.rename(src_dir, target_dir)
+        return
+
+    old_dir = f'{get_abspath(target_dir)}.old-{os.getpid()}'
+    os.rename(target_dir, old_dir)
+    try:
+        os.rename(src_dir, target_dir)
+    except OSError:
+        os.rename(old_dir, target_dir)
+        raise
+    rmtree(old_dir, ignore_errors=True)
+
+
+class TreeManifest(object):
+    """
+       Lista dos arquivos de uma árvore instalada, gravada em <dir>/.manifest.json:
+
+    files - caminho relativo -> [tamanho, mtime_ns, sha256]
+    links - caminho relativo -> destino do link simbólico
+
+    Criada durante a extração (TarExtractor), permite saber quais arquivos vieram
+    do pacote (e não do usuário) e comparar versões sem reler os arquivos.
+    """
+
+    FILE_NAME = '.manifest.json'
+
+    def __init__(self) -> None:
+        self.files: dict = {}
+        self.links: dict = {}
+
+    def add_file(self, rel_path: str, size: int, mtime_ns: int, sha256: str) -> None:
+        self.files[rel_path] = [size, mtime_ns, sha256]
+
+    def add_link(self, rel_path: str, target: str) -> None:
+        self.links[rel_path] = target
+
+    def paths(self) -> set:
+        return set(self.files.keys()) | set(self.links.keys())
+
+    def save(self, tree_dir: str) -> None:
+        file_json = FileJson(os.path.join(tree_dir, self.FILE_NAME))
+        # Pode ser um hardlink do manifest de outra árvore (clone_tree).
+        if file_json.exists():
+            file_json.delete()
+        file_json.write_lines({
+            'files': self.files,
+            'links': self.links,
+        })
+
+    def check(self, tree_dir: str, workers: int = 1, full: bool = False) -> dict:
+        """
+           Confere os arquivos de tree_dir com o manifest. Cada arquivo é verificado
+        com stat(), e só os que mudaram de mtime (com o mesmo tamanho) são lidos
+        para comparar o sha256. Com full=True todos os arquivos são relidos. Com
+        workers > 1 o sha256 é calculado em um pool de processos.
+
+        Retorna {'ok': int, 'missing': [caminhos], 'modified': [caminhos],
+        'extra': [caminhos]}. 'extra' são os arquivos e links de tree_dir que não
+        estão no manifest (ex: criados pelo usuário).
+        """
+        result = {'ok': 0, 'missing': [], 'modified': [], 'extra': []}
+        to_hash = []
+
+        for rel_path, (size, mtime_ns, sha256) in self.files.items():
+            try:
+                st = os.lstat(os.path.join(tree_dir, rel_path))
+            except OSError:
+                result['missing'].append(rel_path)
+                continue
+
+            if (not stat.S_ISREG(st.st_mode)) or (st.st_size != size):
+                result['modified'].append(rel_path)
+            elif full or (st.st_mtime_ns != mtime_ns):
+                to_hash.append(rel_path)
+            else:
+                result['ok'] += 1
+
+        for rel_path, target in self.links.items():
+            path = os.path.join(tree_dir, rel_path)
+            if not os.path.lexists(path):
+                result['missing'].append(rel_path)
+            elif (not os.path.islink(path)) or (os.readlink(path) != target):
+                result['modified'].append(rel_path)
+            else:
+                result['ok'] += 1
+
+        files = [os.path.join(tree_dir, rel_path) for rel_path in to_hash]
+        if (workers > 1) and (len(files) > 1):
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                hashes = list(executor.map(get_file_hash, files, chunksize=16))
+        else:
+            hashes = [get_file_hash(file) for file in files]
+
+        for rel_path, file_hash in zip(to_hash, hashes):
+            if file_hash == self.files[rel_path][2]:
+                result['ok'] += 1
+            else:
+                result['modified'].append(rel_path)
+
+        paths = self.paths()
+        for dirpath, dirnames, filenames in os.walk(tree_dir):
+            # Links para diretórios aparecem em dirnames e não são seguidos.
+            names = filenames + [d for d in dirnames if os.path.islink(os.path.join(dirpath, d))]
+            for name in names:
+                rel_path = os.path.relpath(os.path.join(dirpath, name), tree_dir)
+                if (rel_path not in paths) and (rel_path != self.FILE_NAME):
+                    result['extra'].append(rel_path)
+
+        result['missing'].sort()
+        result['modified'].sort()
+        result['extra'].sort()
+        return result
+
+    @classmethod
+    def load(cls, tree_dir: str):
+        """Retorna o TreeManifest gravado em tree_dir, ou None se não existir."""
+        file_json = FileJson(os.path.join(tree_dir, cls.FILE_NAME))
+        if not file_json.exists():
+            return None
+
+        content = file_json.lines_to_dict()
+        manifest = cls()
+        manifest.files = content.get('files', {})
+        manifest.links = content.get('links', {})
+        return manifest
+
+
+class TarExtractor(object):
+    """
+       Extrai arquivos tar lendo o arquivo uma única vez, em modo stream.
+
+    - A descompressão de .tar.xz é feita pelo programa xz com '-T0' quando ele
+      existe, em outro processo, usando várias threads se o arquivo tiver vários
+      blocos (xz -T). Sem o xz é usado o módulo lzma.
+    - A thread atual lê os membros do tar e entrega o conteúdo dos arquivos para
+      um pool de threads que grava os arquivos (com fchmod/utime pelo descritor).
+    - Os diretórios são criados uma vez só (cache em memória) e as permissões e
+      datas dos diretórios são aplicadas todas no fim, em um único passo.
+    - Links são criados depois que todos os arquivos foram gravados.
+
+    strip     - extrair apenas o conteúdo deste diretório do tar, na raiz de extract_dir.
+    manifest  - TreeManifest preenchido com o sha256 de cada arquivo extraído.
+    unchanged - função (caminho, TarInfo, sha256) -> bool. Se retornar True o arquivo
+                que já existe em extract_dir é mantido e não é gravado de novo.
+
+    Arquivos existentes são removidos antes de gravar (nunca sobrescritos no
+    lugar), então extract_dir pode conter hardlinks de outra árvore. Se o mesmo
+    caminho aparecer mais de uma vez no tar, a gravação anterior termina antes
+    da próxima começar e o último membro vence (como no tarfile).
+    """
+
+    # Limite de bytes lidos do tar e ainda não gravados no disco.
+    MAX_PENDING_BYTES = 64 * 1024 * 1024
+    # Arquivos maiores que isso são gravados pela thread atual, sem passar pela memória.
+    MAX_BUFFERED_FILE = 8 * 1024 * 1024
+
+    def __init__(self, workers: int = None, strip: str = None, manifest: TreeManifest = None, unchanged=None) -> None:
+        self.workers: int = workers or min(8, (os.cpu_count() or 1) + 2)
+        self.strip: str = strip
+        self.manifest: TreeManifest = manifest
+        self.unchanged = unchanged
+
+    def _open(self, archive):
+        """Retorna (tarfile, processo do xz ou None)."""
+        if not isinstance(archive, str):
+            return (tarfile.open(fileobj=archive, mode='r|*'), None)
+
+        if not archive.endswith(('.xz', '.txz')):
+            return (tarfile.open(archive, mode='r|*'), None)
+
+        # A descompressão fica fora do tarfile (processo xz ou lzma.open(), ambos
+        # com leitura bufferizada), o modo 'r|*' copia o buffer a cada leitura.
+        xz = shutil.which('xz')
+        if xz is None:
+            import lzma
+            return (tarfile.open(fileobj=lzma.open(archive), mode='r|'), None)
+
+        import subprocess
+        proc = subprocess.Popen([xz, '-d', '-c', '-T0', archive], stdout=subprocess.PIPE, bufsize=HASH_CHUNK_SIZE)
+        return (tarfile.open(fileobj=proc.stdout, mode='r|'), proc)
+
+    def _filter(self, member: tarfile.TarInfo) -> tarfile.TarInfo:
+        """
+           Recusa membros com caminho ou link apontando para fora do diretório de
+        destino, ignora dispositivos/fifos e remove os bits setuid/setgid/sticky e
+        de escrita para grupo/outros (como o filtro 'data' do tarfile).
+
+        Esta verificação é só sobre os nomes. Como um link pode mudar o caminho
+        real dos membros seguintes (ex: 'a -> .' e depois 'a/b -> ..'), extract()
+        também confere com realpath o destino de cada membro e de cada link.
+        """
+        def _is_outside(name: str) -> bool:
+            return os.path.isabs(name) or (name == '..') or name.startswith('..' + os.sep)
+
+        name = os.path.normpath(member.name)
+        if _is_outside(name):
+            raise tarfile.TarError(f'membro fora do diretório de destino ... {member.name}')
+
+        if member.issym():
+            target = os.path.normpath(os.path.join(os.path.dirname(name), member.linkname))
+            if os.path.isabs(member.linkname) or _is_outside(target):
+                raise tarfile.TarError(f'link fora do diretório de destino ... {member.name}')
+        elif member.islnk():
+            if _is_outside(os.path.normpath(member.linkname)):
+                raise tarfile.TarError(f'link fora do diretório de destino ... {member.name}')
+        elif not (member.isfile() or member.isdir()):
+            return None
+
+        member.name = name
+        member.mode &= ~(stat.S_ISUID | stat.S_ISGID | stat.S_ISVTX | stat.S_IWGRP | stat.S_IWOTH)
+        return member
+
+    def _strip(self, name: str) -> str:
+        """Remove o prefixo self.strip do nome, retorna None se estiver fora dele."""
+        if self.strip is None:
+            return name
+        if name == self.strip:
+            return '.'
+        if name.startswith(self.strip + os.sep):
+            return name[len(self.strip) + 1:]
+        return None
+
+    @staticmethod
+    def _check_inside(path: str, real_root: str, name: str) -> str:
+        """Retorna o realpath de path, lança TarError se estiver fora de real_root."""
+        real_path = os.path.realpath(path)
+        if (real_path != real_root) and not real_path.startswith(real_root + os.sep):
+            raise tarfile.TarError(f'membro fora do diretório de destino ... {name}')
+        return real_path
+
+    def _write_file(self, path: str, data, mode: int, mtime: float, hasher=None) -> None:
+        """
+           Grava data (bytes ou objeto de arquivo) em um novo arquivo path e aplica
+        modo e mtime pelo descritor. Com hasher, o conteúdo lido de data também é
+        passado para hasher.update().
+        """
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+        with open(path, 'wb') as fp:
+            if isinstance(data, bytes):
+                fp.write(data)
+            else:
+                while True:
+                    chunk = data.read(HASH_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    fp.write(chunk)
+                    if hasher is not None:
+                        hasher.update(chunk)
+            fp.flush()
+            if hasattr(os, 'fchmod'):
+                os.fchmod(fp.fileno(), mode)
+            if os.utime in os.supports_fd:
+                os.utime(fp.fileno(), (mtime, mtime))
+
+        if not hasattr(os, 'fchmod'):
+            os.chmod(path, mode)
+        if os.utime not in os.supports_fd:
+            os.utime(path, (mtime, mtime))
+
+    def _write_pending(self, path: str, data: bytes, mode: int, mtime: float, pending, units: int) -> None:
+        try:
+            self._write_file(path, data, mode, mtime)
+        finally:
+            pending.release(units)
+
+    def _is_unchanged(self, name: str, member: tarfile.TarInfo, sha256: str) -> bool:
+        return (self.unchanged is not None) and self.unchanged(name, member, sha256)
+
+    def _add_to_manifest(self, name: str, member: tarfile.TarInfo, sha256: str, path: str, kept: bool) -> None:
+        if self.manifest is None:
+            return
+        # Arquivos mantidos podem ter outro mtime no disco.
+        mtime_ns = os.stat(path).st_mtime_ns if kept else int(member.mtime) * 10**9
+        self.manifest.add_file(name, member.size, mtime_ns, sha256)
+
+    def extract(self, archive, extract_dir: str) -> None:
+        """
+           Extrai archive (caminho ou objeto de arquivo binário) em extract_dir.
+        """
+        extract_dir = get_abspath(extract_dir)
+        mkdir(extract_dir)
+        real_root = os.path.realpath(extract_dir)
+
+        # Diretórios já conferidos com realpath (dentro de extract_dir).
+        created_dirs = {extract_dir}
+        dirs = []
+        links = []
+        need_hash = (self.manifest is not None) or (self.unchanged is not None)
+        # Cada unidade do semáforo representa 64 KiB pendentes de gravação.
+        pending = threading.Semaphore(self.MAX_PENDING_BYTES // 65536)
+        max_units = self.MAX_PENDING_BYTES // 65536
+        tar, proc = self._open(archive)
+
+        def _makedirs(path: str, name: str) -> None:
+            if path not in created_dirs:
+                # extract_dir pode ter links de uma extração anterior.
+                self._check_inside(path, real_root, name)
+                os.makedirs(path, exist_ok=True)
+                created_dirs.add(path)
+
+        try:
+            with tar, ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = []
+                # Gravação pendente de cada caminho (arquivos pequenos, no pool).
+                writing = {}
+                for member in tar:
+                    member = self._filter(member)
+                    if member is None:
+                        continue
+                    name = self._strip(member.name)
+                    if name is None:
+                        continue
+                    path = os.path.normpath(os.path.join(extract_dir, name))
+                    previous = writing.pop(path, None)
+                    if previous is not None:
+                        # Caminho repetido no tar: esperar a gravação anterior.
+                        previous.result()
+
+                    if member.isdir():
+                        _makedirs(path, member.name)
+                        dirs.append((path, member))
+                    elif member.isfile() and (member.size > self.MAX_BUFFERED_FILE):
+                        _makedirs(os.path.dirname(path), member.name)
+                        # Gravar ao lado e só substituir o arquivo atual se mudou.
+                        tmp_file = f'{path}.{os.getpid()}.tmp'
+                        hasher = hashlib.sha256() if need_hash else None
+                        self._write_file(tmp_file, tar.extractfile(member), member.mode, member.mtime, hasher)
+                        sha256 = None if hasher is None else hasher.hexdigest()
+                        kept = self._is_unchanged(name, member, sha256)
+                        if kept:
+                            os.remove(tmp_file)
+                        else:
+                            os.replace(tmp_file, path)
+                        self._add_to_manifest(name, member, sha256, path, kept)
+                    elif member.isfile():
+                        _makedirs(os.path.dirname(path), member.name)
+                        data = tar.extractfile(member).read()
+                        sha256 = hashlib.sha256(data).hexdigest() if need_hash else None
+                        kept = self._is_unchanged(name, member, sha256)
+                        if not kept:
+                            units = min(max_units, max(1, len(data) // 65536))
+                            for _ in range(units):
+                                pending.acquire()
+                            writing[path] = executor.submit(
+                                self._write_pending, path, data, member.mode, member.mtime, pending, units
+                            )
+                            futures.append(writing[path])
+                        self._add_to_manifest(name, member, sha256, path, kept)
+                    elif member.issym() or member.islnk():
+                        _makedirs(os.path.dirname(path), member.name)
+                        links.append((path, member))
+                        if (self.manifest is not None) and member.issym():
+                            self.manifest.add_link(name, member.linkname)
+
+                for future in futures:
+                    future.result()
+
+            # Cada link criado pode mudar o caminho real dos próximos, então o
+            # diretório e o destino de cada link são conferidos na hora.
+            for path, member in links:
+                parent = self._check_inside(os.path.dirname(path), real_root, member.name)
+                path = os.path.join(parent, os.path.basename(path))
+                if os.path.isdir(path) and not os.path.islink(path):
+                    raise tarfile.TarError(f'link no lugar de um diretório ... {member.name}')
+                if os.path.lexists(path):
+                    os.remove(path)
+                if member.issym():
+                    self._check_inside(os.path.join(parent, member.linkname), real_root, member.name)
+                    os.symlink(member.linkname, path)
+                else:
+                    link_name = self._strip(os.path.normpath(member.linkname))
+                    if link_name is None:
+                        raise tarfile.TarError(f'link fora do diretório extraído ... {member.name}')
+                    src = self._check_inside(os.path.join(extract_dir, link_name), real_root, member.name)
+                    if not os.path.isfile(src):
+                        raise tarfile.TarError(f'hardlink para um arquivo inexistente ... {member.name}')
+                    os.link(src, path)
+                    if self.manifest is not None:
+                        self.manifest.files[self._strip(member.name)] = list(self.manifest.files[link_name])
+
+            # Um link criado depois pode mudar o destino de um link anterior
+            # (ex: 's -> x/../y' e depois 'x -> .').
+            for path, member in links:
+                if member.issym():
+                    self._check_inside(path, real_root, member.name)
+
+            # Diretórios por último e do mais profundo para o mais raso, assim a
+            # gravação dos arquivos não altera o mtime e modos sem escrita não
+            # impedem a extração.
+            dirs.sort(key=lambda item: item[0], reverse=True)
+            for path, member in dirs:
+                os.chmod(path, member.mode)
+                os.utime(path, (member.mtime, member.mtime))
+        finally:
+            if proc is not None:
+                proc.stdout.close()
+                if proc.wait() not in (0, -13):
+                    raise tarfile.ReadError(f'ERRO ... xz terminou com código {proc.returncode}')
+
+
+def extract_tar_stream(archive, extract_dir: str, extractor: TarExtractor = None) -> None:
+    """
+       Extrai um arquivo tar (.tar, .tar.gz, .tar.xz, .tar.bz2) em extract_dir,
+    lendo o arquivo em modo stream, sem busca (seek) no arquivo e sem cópia
+    intermediária. archive pode ser um caminho ou um objeto de arquivo aberto
+    em modo binário. Veja TarExtractor.
+    """
+    if extractor is None:
+        extractor = TarExtractor()
+    extractor.extract(archive, extract_dir)
+
+
+# ioctl do Linux para clonar um arquivo (reflink) em btrfs/xfs.
+FICLONE = 0x40049409
+
+def _reflink_file(src: str, dst: str) -> bool:
+    """Cria dst como reflink de src (cópia sob demanda), retorna False se não for suportado."""
+    if KERNEL_TYPE != 'Linux':
+        return False
+
+    try:
+        import fcntl
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+    except (OSError, ImportError):
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+
+    shutil.copystat(src, dst)
+    return True
+
+
+def link_file(src: str, dst: str, hardlink: bool = True) -> None:
+    """
+       Cria dst com o conteúdo de src evitando copiar os dados: tenta um hardlink
+    (se hardlink=True), depois um reflink, e só então faz uma cópia normal.
+    Se dst já existir ele é substituído de forma atômica.
+    """
+    tmp_file = f'{dst}.{os.getpid()}.tmp'
+    if os.path.lexists(tmp_file):
+        os.remove(tmp_file)
+
+    try:
+        if not hardlink:
+            raise OSError()
+        os.link(src, tmp_file)
+    except OSError:
+        if not _reflink_file(src, tmp_file):
+            shutil.copy2(src, tmp_file)
+    os.replace(tmp_file, dst)
+
+
+def clone_tree(src_dir: str, dst_dir: str, hardlink: bool = False, copy: bool = True) -> str:
+    """
+       Recria a árvore src_dir em dst_dir (que não deve existir) sem copiar os
+    dados quando possível. Para cada arquivo tenta um reflink, depois um hardlink
+    (só se hardlink=True) e por último uma cópia (só se copy=True, se não lança
+    OSError). Um método que falha uma vez (ex: outro sistema de arquivos) não é
+    tentado de novo nos próximos arquivos.
+    Retorna o último método usado: 'reflink', 'hardlink' ou 'copy'.
+
+    Com hardlink=True os arquivos de dst_dir e src_dir são o mesmo inode, uma
+    alteração feita no lugar (sem criar um novo arquivo) aparece nos dois.
+    """
+    methods = ['reflink', 'hardlink', 'copy'] if hardlink else ['reflink', 'copy']
+    if not copy:
+        methods.remove('copy')
+    dirs_stat = []
+
+    for root, dirs, files in os.walk(src_dir):
+        rel_root = os.path.relpath(root, src_dir)
+        dst_root = os.path.normpath(os.path.join(dst_dir, rel_root))
+        os.makedirs(dst_root)
+        dirs_stat.append((root, dst_root))
+
+        # Links para diretórios aparecem em dirs, mas devem ser recriados como links.
+        for name in [d for d in dirs if os.path.islink(os.path.join(root, d))] + files:
+            src = os.path.join(root, name)
+            dst = os.path.join(dst_root, name)
+            if os.path.islink(src):
+                os.symlink(os.readlink(src), dst)
+                continue
+
+            while True:
+                method = methods[0]
+                try:
+                    if method == 'reflink':
+                        if not _reflink_file(src, dst):
+                            raise OSError()
+                    elif method == 'hardlink':
+                        os.link(src, dst)
+                    else:
+                        shutil.copy2(src, dst)
+                except OSError:
+                    if len(methods) == 1:
+                        raise
+                    methods.pop(0)
+                    continue
+                break
+
+    # Modos e datas dos diretórios no fim, do mais profundo para o mais raso.
+    for src, dst in reversed(dirs_stat):
+        shutil.copystat(src, dst)
+    return methods[0]
+
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+def update_hash_from_file(hash_obj, file: str, chunk_size: int = HASH_CHUNK_SIZE, length: int = None, offset: int = 0) -> None:
+    """
+       Passa o conteúdo de file para hash_obj.update(), lendo o arquivo em blocos
+    de chunk_size bytes com readinto() em um único buffer reutilizado.
+    Se length for informado, apenas length bytes (a partir de offset) são lidos.
+    """
+    buffer = bytearray(chunk_size)
+    view = memoryview(buffer)
+
+    with open(file, 'rb', buffering=0) as fp:
+        fp.seek(offset)
+        while (length is None) or (length > 0):
+            size = fp.readinto(buffer if (length is None) or (length >= chunk_size) else view[:length])
+            if not size:
+                break
+            hash_obj.update(view[:size])
+            if length is not None:
+                length -= size
+
+
+def get_file_hash(file: str, algorithm: str = 'sha256', chunk_size: int = HASH_CHUNK_SIZE) -> str:
+    """
+       Retorna o hash (hexdigest) de um arquivo, sem carregar o arquivo inteiro
+    na memória. Retorna None se o arquivo não puder ser lido.
+    """
+    hash_obj = hashlib.new(algorithm)
+    try:
+        update_hash_from_file(hash_obj, file, chunk_size)
+    except Exception as e:
+        print(__name__, e)
+        return None
+    return hash_obj.hexdigest()
+
+
 #=========================================================================#
 # Downloader
 #=========================================================================#
@@ -98,7 +691,556 @@ def clean_line():
 	print(' ' * get_terminal_width(), end='\r')
 
 
-def download_file(url: str, output_file: str, verbose: bool=True) -> bool:
+# Configuração padrão da sessão HTTP compartilhada.
+HTTP_POOL_SIZE = 10
+HTTP_RETRIES = 3
+HTTP_BACKOFF = 0.5
+# (conexão, leitura) em segundos. Sem o timeout de leitura uma conexão parada
+# nunca falha, e o download não passa para o próximo mirror.
+HTTP_TIMEOUT = (15, 60)
+
+_http_session = None
+_http_session_config: tuple = (HTTP_POOL_SIZE, HTTP_RETRIES, HTTP_BACKOFF)
+_http_session_lock = threading.Lock()
+
+
+def new_http_session(pool_size: int = HTTP_POOL_SIZE, retries: int = HTTP_RETRIES, backoff: float = HTTP_BACKOFF):
+	"""
+	   Cria uma requests.Session com um pool de até pool_size conexões keep-alive
+	por host, e novas tentativas (retries) com espera exponencial (backoff) para
+	erros de conexão e respostas 429/5xx.
+	"""
+	requests = _import_requests()
+	from requests.adapters import HTTPAdapter
+	from urllib3.util.retry import Retry
+
+	retry = Retry(
+		total=retries, connect=retries, read=retries, backoff_factor=backoff,
+		status_forcelist=(429, 500, 502, 503, 504), allowed_methods=frozenset(['HEAD', 'GET']),
+		raise_on_status=False,
+	)
+	adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+
+	session = requests.Session()
+	session.mount('http://', adapter)
+	session.mount('https://', adapter)
+	return session
+
+
+def get_http_session():
+	"""
+	   Retorna a requests.Session compartilhada pelo processo, criada no primeiro
+	uso. Todas as requisições HTTP do módulo passam por ela, assim downloads
+	para o mesmo servidor reutilizam as conexões já abertas.
+	"""
+	global _http_session
+
+	with _http_session_lock:
+		if _http_session is None:
+			_http_session = new_http_session(*_http_session_config)
+		return _http_session
+
+
+def configure_http_session(pool_size: int = HTTP_POOL_SIZE, retries: int = HTTP_RETRIES, backoff: float = HTTP_BACKOFF) -> None:
+	"""
+	   Define a configuração da sessão compartilhada. A sessão atual é fechada e
+	a nova só é criada no próximo get_http_session().
+	"""
+	global _http_session, _http_session_config
+
+	with _http_session_lock:
+		if _http_session is not None:
+			_http_session.close()
+		_http_session = None
+		_http_session_config = (pool_size, retries, backoff)
+
+
+# Limites do tamanho de bloco usado na leitura dos downloads.
+DOWNLOAD_CHUNK_MIN = 256 * 1024
+DOWNLOAD_CHUNK_MAX = 4 * 1024 * 1024
+
+
+class RateLimiter(object):
+	"""
+	   Limite de vazão (bytes/s) por token bucket, compartilhado por várias threads.
+	Cada leitura reserva seus bytes com reserve(), que pode deixar o balde
+	negativo (dívida), e espera o tempo necessário para pagar a dívida. Assim a
+	espera é um único sleep, sem laço de espera ativa, e várias conexões
+	dividem a vazão pela ordem em que chegam.
+
+	burst é o máximo de bytes acumulados enquanto não há leitura, e também o
+	tamanho máximo de cada leitura (max_chunk()), para não gerar rajadas.
+	"""
+
+	def __init__(self, rate: int, burst: int = None) -> None:
+		if rate <= 0:
+			raise ValueError(f'{__class__.__name__} ERRO ... vazão inválida {rate}')
+		self.rate: float = float(rate)
+		self.burst: float = float(burst if burst is not None else max(16 * 1024, rate / 10))
+		self._tokens: float = self.burst
+		self._last: float = time.monotonic()
+		self._lock = threading.Lock()
+
+	def max_chunk(self) -> int:
+		return int(self.burst)
+
+	def reserve(self, nbytes: int) -> float:
+		"""Consome nbytes e retorna quantos segundos o chamador deve esperar."""
+		with self._lock:
+			now = time.monotonic()
+			self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+			self._last = now
+			self._tokens -= nbytes
+			if self._tokens >= 0:
+				return 0.0
+			return -self._tokens / self.rate
+
+	def consume(self, nbytes: int) -> None:
+		delay = self.reserve(nbytes)
+		if delay > 0:
+			time.sleep(delay)
+
+
+_rate_limiter: RateLimiter = None
+
+
+def configure_rate_limit(rate: int = None) -> None:
+	"""
+	   Define o limite global de vazão (bytes/s) somado de todos os downloads do
+	processo, None remove o limite.
+	"""
+	global _rate_limiter
+	_rate_limiter = None if not rate else RateLimiter(rate)
+
+
+def _get_limiters(rate_limit: int = None) -> list:
+	"""Limite global (se houver) mais um limite próprio do download, se rate_limit for informado."""
+	limiters = [] if _rate_limiter is None else [_rate_limiter]
+	if rate_limit:
+		limiters.append(RateLimiter(rate_limit))
+	return limiters
+
+
+def _throttle(limiters: list, nbytes: int) -> float:
+	"""Reserva nbytes em todos os limites e retorna a maior espera."""
+	return max([limiter.reserve(nbytes) for limiter in limiters], default=0.0)
+
+
+class AdaptiveChunkSize(object):
+	"""
+	   Tamanho do bloco lido da rede, ajustado pela vazão medida para que cada
+	leitura leve cerca de TARGET_TIME segundos, entre minimum e maximum.
+	Se size for informado o tamanho é fixo.
+	"""
+
+	TARGET_TIME = 0.1
+
+	def __init__(self, size: int = None, minimum: int = DOWNLOAD_CHUNK_MIN, maximum: int = DOWNLOAD_CHUNK_MAX) -> None:
+		self.fixed: bool = size is not None
+		self.minimum: int = minimum
+		self.maximum: int = maximum
+		self.size: int = size if self.fixed else minimum
+
+	def update(self, nbytes: int, elapsed: float) -> None:
+		if self.fixed or (elapsed <= 0):
+			return
+		target = int(nbytes / elapsed * self.TARGET_TIME)
+		# Média com o valor atual, para não oscilar a cada leitura.
+		self.size = min(self.maximum, max(self.minimum, (self.size + target) // 2))
+
+
+def _iter_content(req: Response, chunk_size: AdaptiveChunkSize, limiters: list = None):
+	"""
+	   Igual a req.iter_content(), mas o tamanho de cada leitura é definido por
+	chunk_size, que é atualizado com o tempo gasto em cada leitura.
+
+	   Com limiters (RateLimiter) cada leitura espera a vazão permitida, e não é
+	maior que o burst do limite mais restrito.
+	"""
+	limiters = limiters or []
+	max_chunk = min([limiter.max_chunk() for limiter in limiters], default=None)
+	while True:
+		started = time.monotonic()
+		size = chunk_size.size if max_chunk is None else min(chunk_size.size, max_chunk)
+		chunk = req.raw.read(size, decode_content=True)
+		if not chunk:
+			break
+		chunk_size.update(len(chunk), time.monotonic() - started)
+		delay = _throttle(limiters, len(chunk))
+		if delay > 0:
+			time.sleep(delay)
+		yield chunk
+
+
+class DownloadProgress(object):
+	"""
+	   Barra de progresso (tqdm) atualizada no máximo a cada 'interval' segundos.
+	Com verbose=False, ou se a saída não for um terminal, nada é mostrado e o
+	tqdm não é usado.
+	"""
+
+	def __init__(self, total: int, initial: int = 0, desc: str = None, verbose: bool = True, interval: float = 0.5) -> None:
+		self.interval: float = interval
+		self._pending: int = 0
+		self._last_update: float = time.monotonic()
+		self._lock = threading.Lock()
+		self._bar = None
+
+		if verbose and sys.stderr.isatty():
+			clean_line()
+			self._bar = _import_tqdm().tqdm(
+				total=total if total > 0 else None, initial=initial, unit='B', unit_scale=True,
+				unit_divisor=1024, desc=desc, leave=True # progressbar stays
+			)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *args) -> None:
+		self.close()
+
+	def update(self, size: int) -> None:
+		if self._bar is None:
+			return
+
+		with self._lock:
+			self._pending += size
+			now = time.monotonic()
+			if now - self._last_update < self.interval:
+				return
+			self._bar.update(self._pending)
+			self._pending = 0
+			self._last_update = now
+
+	def close(self) -> None:
+		if self._bar is None:
+			return
+		with self._lock:
+			self._bar.update(self._pending)
+			self._pending = 0
+			self._bar.close()
+
+
+class DownloadJournal(object):
+	"""
+	   Registro dos intervalos já gravados em um arquivo .part. Fica em um arquivo
+	json ao lado do .part e permite continuar um download interrompido com
+	requisições HTTP Range.
+
+	Os intervalos são guardados como [inicio, fim) - fim não incluso.
+	"""
+
+	# Intervalo mínimo (segundos) entre duas gravações do journal no disco.
+	SAVE_INTERVAL = 1.0
+
+	def __init__(self, file: str) -> None:
+		self.file_json: FileJson = FileJson(file)
+		self.url: str = None
+		self.size: int = 0
+		self.etag: str = None
+		self.ranges: list = []
+		self._lock = threading.Lock()
+		self._last_save = 0.0
+
+	def load(self) -> bool:
+		"""Carrega o journal do disco, retorna False se não existir."""
+		if not self.file_json.exists():
+			return False
+
+		content = self.file_json.lines_to_dict()
+		if content == {}:
+			return False
+
+		self.url = content.get('url')
+		self.size = int(content.get('size', 0))
+		self.etag = content.get('etag')
+		self.ranges = [list(r) for r in content.get('ranges', [])]
+		return True
+
+	def save(self, force: bool = True) -> None:
+		"""Grava o journal no disco. Com force=False respeita SAVE_INTERVAL."""
+		with self._lock:
+			now = time.monotonic()
+			if (not force) and (now - self._last_save < self.SAVE_INTERVAL):
+				return
+			self._last_save = now
+			self.file_json.write_lines({
+				'url': self.url,
+				'size': self.size,
+				'etag': self.etag,
+				'ranges': self.ranges,
+			})
+
+	def delete(self) -> None:
+		if self.file_json.exists():
+			self.file_json.delete()
+
+	def reset(self, url: str, size: int, etag: str) -> None:
+		with self._lock:
+			self.url = url
+			self.size = size
+			self.etag = etag
+			self.ranges = []
+
+	def is_same(self, url: str, size: int, etag: str) -> bool:
+		"""Verifica se o journal se refere ao mesmo arquivo remoto."""
+		if self.url != url:
+			return False
+		if (size > 0) and (self.size != size):
+			return False
+		if (etag is not None) and (self.etag is not None) and (self.etag != etag):
+			return False
+		return True
+
+	def add_range(self, start: int, end: int) -> None:
+		"""Marca [start, end) como gravado, juntando intervalos vizinhos."""
+		if end <= start:
+			return
+
+		with self._lock:
+			merged = []
+			for r_start, r_end in sorted(self.ranges + [[start, end]]):
+				if merged and (r_start <= merged[-1][1]):
+					merged[-1][1] = max(merged[-1][1], r_end)
+				else:
+					merged.append([r_start, r_end])
+			self.ranges = merged
+
+	def completed(self) -> int:
+		"""Total de bytes já gravados."""
+		return sum(r_end - r_start for r_start, r_end in self.ranges)
+
+	def prefix(self) -> int:
+		"""Quantidade de bytes gravados de forma contínua a partir do início."""
+		if self.ranges and (self.ranges[0][0] == 0):
+			return self.ranges[0][1]
+		return 0
+
+	def missing(self) -> list:
+		"""Retorna os intervalos [inicio, fim) que ainda faltam baixar."""
+		_missing = []
+		position = 0
+		for r_start, r_end in self.ranges:
+			if r_start > position:
+				_missing.append([position, r_start])
+			position = max(position, r_end)
+		if position < self.size:
+			_missing.append([position, self.size])
+		return _missing
+
+
+def _get_remote_info(url: str) -> tuple:
+	"""
+	   Faz uma requisição HEAD em url e retorna (tamanho, aceita_range, etag).
+	tamanho é 0 se o servidor não informar Content-Length.
+	"""
+	req: Response = get_http_session().head(url, allow_redirects=True, timeout=HTTP_TIMEOUT)
+	req.raise_for_status()
+
+	try:
+		file_size = int(req.headers['Content-Length'])
+	except:
+		file_size = int(0)
+
+	accept_ranges = req.headers.get('Accept-Ranges', 'none').lower() == 'bytes'
+	return (file_size, accept_ranges, req.headers.get('ETag'))
+
+
+def _download_range(
+		url: str, output_file: str, start: int, end: int,
+		progress: DownloadProgress, journal: DownloadJournal, chunk_size: int = None, limiters: list = None
+	) -> None:
+	"""
+	   Baixa os bytes start-end (inclusive) de url e grava na mesma posição
+	de output_file, que já deve existir com o tamanho final.
+	"""
+	req: Response = get_http_session().get(url, headers={'Range': f'bytes={start}-{end}'}, stream=True, timeout=HTTP_TIMEOUT)
+	if req.status_code != 206:
+		req.close()
+		raise Exception(f'ERRO ... o servidor não retornou o intervalo {start}-{end} ({req.status_code})')
+
+	# Sem buffer, assim o journal nunca registra bytes que ainda não chegaram ao disco.
+	position = start
+	with open(output_file, 'r+b', buffering=0) as fp:
+		fp.seek(start)
+		try:
+			for chunk in _iter_content(req, AdaptiveChunkSize(chunk_size), limiters):
+				fp.write(chunk)
+				progress.update(len(chunk))
+				position += len(chunk)
+				journal.add_range(start, position)
+				journal.save(force=False)
+		finally:
+			req.close()
+			journal.add_range(start, position)
+
+	# O servidor pode encerrar a conexão antes do fim do intervalo.
+	if position != end + 1:
+		raise Exception(f'ERRO ... intervalo {start}-{end} incompleto')
+
+
+def _download_segments(
+		url: str, part_file: str, journal: DownloadJournal, connections: int, desc: str,
+		verbose: bool = True, chunk_size: int = None, limiters: list = None
+	) -> bool:
+	"""
+	   Divide o que falta baixar em até 'connections' intervalos e baixa todos em
+	paralelo, cada thread gravando seu intervalo diretamente no arquivo .part.
+	"""
+	missing = journal.missing()
+	segment_size = max(1, -(-sum(end - start for start, end in missing) // connections))
+	segments = []
+	for m_start, m_end in missing:
+		for start in range(m_start, m_end, segment_size):
+			segments.append((start, min(start + segment_size, m_end) - 1))
+
+	try:
+		if not os.path.isfile(part_file):
+			with open(part_file, 'wb') as fp:
+				fp.truncate(journal.size)
+
+		with DownloadProgress(journal.size, journal.completed(), desc, verbose) as progress:
+			with ThreadPoolExecutor(max_workers=connections) as executor:
+				futures = [
+					executor.submit(_download_range, url, part_file, start, end, progress, journal, chunk_size, limiters)
+					for start, end in segments
+				]
+				for future in futures:
+					future.result()
+	except Exception as e:
+		print(e)
+		return False
+	else:
+		return True
+	finally:
+		journal.save()
+
+
+def _download_stream(
+		url: str, part_file: str, journal: DownloadJournal, hasher, desc: str,
+		verbose: bool = True, chunk_size: int = None, limiters: list = None
+	) -> bool:
+	"""
+	   Baixa url em uma única conexão, continuando a partir do fim do trecho
+	contínuo já gravado em part_file, quando o servidor aceitar Range.
+	"""
+	start = journal.prefix() if os.path.isfile(part_file) else 0
+	headers = {}
+	if start > 0:
+		headers['Range'] = f'bytes={start}-'
+		if journal.etag is not None:
+			headers['If-Range'] = journal.etag
+
+	try:
+		req: Response = get_http_session().get(url, headers=headers, stream=True, timeout=HTTP_TIMEOUT)
+	except _import_requests().RequestException as e:
+		# Servidor fora do ar: retornar False para download_file() tentar o próximo mirror.
+		print(f'ERRO ... {url} ({e})')
+		return False
+	if req.status_code >= 400:
+		req.close()
+		print(f'ERRO ... {url} ({req.status_code})')
+		return False
+
+	try:
+		file_size = int(req.headers['Content-Length'])
+	except:
+		file_size = int(0)
+
+	content_range = req.headers.get('Content-Range', '')
+	if (start > 0) and (req.status_code == 206) and content_range.startswith(f'bytes {start}-'):
+		file_size += start
+		mode = 'r+b'
+	elif (hasher is not None) and (hasher.count > 0):
+		# O hasher já recebeu dados de outro mirror e não pode voltar ao início.
+		req.close()
+		print(f'ERRO ... {url} não continuou o download a partir de {start}')
+		return False
+	else:
+		# O servidor ignorou o Range (ou o arquivo mudou), começar do zero.
+		start = 0
+		mode = 'wb'
+		journal.reset(url, file_size, req.headers.get('ETag'))
+
+	position = start
+	try:
+		if hasher is not None:
+			_hash_part_file(hasher, part_file, start)
+
+		# Sem buffer, assim o journal nunca registra bytes que ainda não chegaram ao disco.
+		with open(part_file, mode, buffering=0) as fp, DownloadProgress(file_size, start, desc, verbose) as progress:
+			fp.seek(start)
+			try:
+				for chunk in _iter_content(req, AdaptiveChunkSize(chunk_size), limiters):
+					fp.write(chunk)
+					progress.update(len(chunk))
+					if hasher is not None:
+						hasher.update(chunk)
+					position += len(chunk)
+					journal.add_range(0, position)
+					journal.save(force=False)
+			finally:
+				req.close()
+				journal.add_range(0, position)
+				journal.save()
+
+	except Exception as e:
+		print(e)
+		return False
+
+	if (file_size > 0) and (position != file_size):
+		print(f'ERRO ... download incompleto {position} de {file_size} bytes')
+		return False
+	return True
+
+
+class _CountingHasher(object):
+	"""Repassa update() para hasher, contando os bytes já recebidos."""
+
+	def __init__(self, hasher) -> None:
+		self.hasher = hasher
+		self.count: int = 0
+
+	def update(self, data) -> None:
+		self.hasher.update(data)
+		self.count += len(data)
+
+
+def _hash_part_file(hasher: _CountingHasher, part_file: str, end: int) -> None:
+	"""Passa para hasher os bytes de part_file que ele ainda não recebeu, até end."""
+	if end > hasher.count:
+		update_hash_from_file(hasher, part_file, length=end - hasher.count, offset=hasher.count)
+
+
+def download_file(
+		url: str, output_file: str, verbose: bool=True, hasher=None, connections: int=1, chunk_size: int=None,
+		mirrors: list=None, rate_limit: int=None
+	) -> bool:
+	"""
+	   Baixa url em output_file. Se hasher (ex: hashlib.sha256()) for informado, cada
+	bloco gravado no disco também é passado para hasher.update(), assim o hash do
+	arquivo fica pronto no fim do download sem precisar ler o arquivo novamente.
+
+	   Com connections > 1 o arquivo é baixado em intervalos paralelos (HTTP Range),
+	se o servidor informar Content-Length e Accept-Ranges, se não o download é
+	feito em uma única conexão.
+
+	   Os dados são gravados em output_file.part, com os intervalos já baixados
+	registrados em output_file.part.json. Um download interrompido continua de
+	onde parou na próxima chamada, e output_file só é criado (os.replace) depois
+	que o download termina.
+
+	   mirrors são outras urls com o mesmo arquivo. Se o download em url falhar
+	(mesmo no meio da transferência) ele continua no próximo mirror a partir
+	do que já foi gravado, com HTTP Range.
+
+	   rate_limit limita a vazão (bytes/s) deste download, somada de todas as
+	conexões, além do limite global de configure_rate_limit().
+
+	   chunk_size define o tamanho fixo de cada leitura, com None o tamanho é
+	ajustado pela vazão (AdaptiveChunkSize). Com verbose=False a barra de
+	progresso não é mostrada.
+	"""
 	if os.path.isfile(output_file):
 		print(f'[PULANDO] ... {output_file}')
 		return True
@@ -108,33 +1250,529 @@ def download_file(url: str, output_file: str, verbose: bool=True) -> bool:
 	else:
 		show_filename = output_file
 
-	req: Response = requests.get(url, stream=True)
-	#req = requests.get(url, stream=True)
-	
+	urls = [url] + list(mirrors or [])
+	part_file = f'{output_file}.part'
+	journal = DownloadJournal(f'{part_file}.json')
+	if not (os.path.isfile(part_file) and journal.load() and (journal.url in urls)):
+		journal.reset(url, 0, None)
+
+	counting_hasher = None if hasher is None else _CountingHasher(hasher)
+	limiters = _get_limiters(rate_limit)
+	for num, _url in enumerate(urls):
+		if _url != journal.url:
+			# Mesmo arquivo em outro servidor: manter os intervalos já gravados,
+			# o ETag de um servidor não vale para outro.
+			journal.url = _url
+			journal.etag = None
+		if num > 0:
+			print(f'[MIRROR] ... {_url}')
+
+		if _download_from(_url, part_file, journal, counting_hasher, connections, show_filename, verbose, chunk_size, limiters):
+			return _finish_download(part_file, output_file, journal)
+	return False
+
+
+def _download_from(
+		url: str, part_file: str, journal: DownloadJournal, hasher: _CountingHasher, connections: int,
+		desc: str, verbose: bool, chunk_size: int, limiters: list
+	) -> bool:
+	"""Baixa url em part_file, continuando o que o journal já registra."""
+	if connections > 1:
+		try:
+			file_size, accept_ranges, etag = _get_remote_info(url)
+		except Exception as e:
+			print(e)
+			file_size, accept_ranges, etag = 0, False, None
+
+		if accept_ranges and (file_size > 0):
+			if not journal.is_same(url, file_size, etag):
+				if (hasher is not None) and (hasher.count > 0):
+					print(f'ERRO ... {url} tem um arquivo diferente ({file_size} bytes)')
+					return False
+				journal.reset(url, file_size, etag)
+				if os.path.isfile(part_file):
+					os.remove(part_file)
+			journal.size = file_size
+			journal.etag = etag
+
+			if not _download_segments(url, part_file, journal, connections, desc, verbose, chunk_size, limiters):
+				return False
+			if hasher is not None:
+				_hash_part_file(hasher, part_file, journal.size)
+			return True
+
+	if (journal.size > 0) and (journal.completed() == journal.size):
+		# Todos os bytes já foram gravados, falta apenas renomear o .part.
+		if hasher is not None:
+			_hash_part_file(hasher, part_file, journal.size)
+		return True
+
+	return _download_stream(url, part_file, journal, hasher, desc, verbose, chunk_size, limiters)
+
+
+def _finish_download(part_file: str, output_file: str, journal: DownloadJournal) -> bool:
+	if journal.missing() != []:
+		print(f'ERRO ... download incompleto ... {output_file}')
+		return False
+
+	os.replace(part_file, output_file)
+	journal.delete()
+	return True
+
+
+# Bytes lidos de cada mirror para medir a vazão.
+MIRROR_PROBE_SIZE = 256 * 1024
+# Tempo (segundos) em que o resultado de um teste continua válido.
+MIRROR_RANKING_TTL = 24 * 3600
+
+
+def probe_mirror(url: str, probe_size: int = MIRROR_PROBE_SIZE) -> dict:
+	"""
+	   Testa um mirror com HEAD e um GET dos primeiros probe_size bytes (Range).
+	Retorna {'ok', 'size', 'ttfb', 'throughput', 'ranges', 'time'}, onde ttfb é o
+	tempo (segundos) até o primeiro byte do GET e throughput é a vazão em bytes/s.
+	"""
+	result = {'ok': False, 'size': 0, 'ttfb': None, 'throughput': None, 'ranges': False, 'time': time.time()}
+	# Sessão própria e sem novas tentativas: um mirror fora do ar deve falhar logo.
+	session = new_http_session(pool_size=1, retries=0)
+	try:
+		req: Response = session.head(url, allow_redirects=True, timeout=HTTP_TIMEOUT)
+		req.raise_for_status()
+		try:
+			file_size = int(req.headers['Content-Length'])
+		except:
+			file_size = int(0)
+		accept_ranges = req.headers.get('Accept-Ranges', 'none').lower() == 'bytes'
+
+		started = time.monotonic()
+		req = session.get(url, headers={'Range': f'bytes=0-{probe_size - 1}'}, stream=True, timeout=HTTP_TIMEOUT)
+		try:
+			if req.status_code >= 400:
+				return result
+			received = 0
+			ttfb = None
+			for chunk in req.iter_content(64 * 1024):
+				if ttfb is None:
+					ttfb = time.monotonic() - started
+				received += len(chunk)
+				if received >= probe_size:
+					break
+			elapsed = time.monotonic() - started
+		finally:
+			req.close()
+	except Exception:
+		return result
+	finally:
+		session.close()
+
+	if ttfb is None:
+		return result
+	result.update({
+		'ok': True,
+		'size': file_size,
+		'ttfb': ttfb,
+		'throughput': received / max(elapsed - ttfb, 1e-3),
+		'ranges': accept_ranges and (req.status_code == 206),
+	})
+	return result
+
+
+class MirrorRanking(object):
+	"""
+	   Ordena os mirrors de um arquivo pelo tempo estimado do download (ttfb +
+	tamanho / vazão), testando todos ao mesmo tempo com probe_mirror(). Os
+	resultados ficam em um arquivo json (ex: no app_cache_dir()) e só são
+	refeitos depois de ttl segundos.
+	"""
+
+	def __init__(self, file: str, ttl: int = MIRROR_RANKING_TTL, probe_size: int = MIRROR_PROBE_SIZE) -> None:
+		self.file_json: FileJson = FileJson(file)
+		self.ttl: int = ttl
+		self.probe_size: int = probe_size
+
+	def _load(self) -> dict:
+		if not self.file_json.exists():
+			return {}
+		return self.file_json.lines_to_dict()
+
+	def probe(self, urls: list) -> dict:
+		"""Retorna o resultado de cada url, testando apenas os vencidos ou ausentes."""
+		results = self._load()
+		now = time.time()
+		stale = [url for url in urls if (url not in results) or (now - results[url].get('time', 0) > self.ttl)]
+		if stale:
+			with ThreadPoolExecutor(max_workers=len(stale)) as executor:
+				for url, result in zip(stale, executor.map(lambda u: probe_mirror(u, self.probe_size), stale)):
+					results[url] = result
+			# Remover resultados antigos de urls que não existem mais.
+			results = {url: result for url, result in results.items() if now - result.get('time', 0) <= self.ttl}
+			try:
+				mkdir(os.path.dirname(self.file_json.absolute()))
+				self.file_json.write_lines(results)
+			except Exception as e:
+				print(__class__.__name__, e)
+		return {url: results[url] for url in urls}
+
+	def rank(self, urls: list) -> list:
+		"""
+		   Retorna urls do mais rápido para o mais lento. Mirrors que falharam no
+		teste ficam no fim, na ordem original, como última opção.
+		"""
+		if len(urls) < 2:
+			return list(urls)
+
+		results = self.probe(urls)
+		def _estimated_time(url: str) -> float:
+			result = results[url]
+			return result['ttfb'] + max(result['size'], self.probe_size) / result['throughput']
+
+		working = sorted([url for url in urls if results[url]['ok']], key=_estimated_time)
+		return working + [url for url in urls if not results[url]['ok']]
+
+
+class QueueReader(object):
+	"""
+	   Objeto de arquivo (somente leitura) alimentado por outra thread através de
+	uma fila limitada de blocos. Quando a fila está cheia put() espera, assim
+	quem produz os dados nunca fica mais de maxsize blocos à frente de quem lê.
+
+	read() pode retornar menos bytes que o pedido (como um socket), e retorna
+	b'' no fim dos dados.
+	"""
+
+	def __init__(self, maxsize: int = 16) -> None:
+		self._queue = queue.Queue(maxsize)
+		self._aborted = threading.Event()
+		self._chunk = b''
+		self._offset = 0
+		self._eof = False
+
+	def put(self, chunk) -> bool:
+		"""
+		   Adiciona um bloco (bytes), None para indicar o fim dos dados, ou uma
+		exceção que será lançada em read(). Retorna False se o leitor desistiu.
+		"""
+		while not self._aborted.is_set():
+			try:
+				self._queue.put(chunk, timeout=0.5)
+			except queue.Full:
+				continue
+			return True
+		return False
+
+	def abort(self) -> None:
+		"""Usado pelo leitor para liberar quem está esperando em put()."""
+		self._aborted.set()
+
+	def read(self, size: int = -1) -> bytes:
+		if self._offset >= len(self._chunk):
+			if self._eof:
+				return b''
+			item = self._queue.get()
+			if item is None:
+				self._eof = True
+				return b''
+			if isinstance(item, BaseException):
+				raise item
+			self._chunk = item
+			self._offset = 0
+
+		if (size is None) or (size < 0):
+			end = len(self._chunk)
+		else:
+			end = min(len(self._chunk), self._offset + size)
+		data = self._chunk[self._offset:end]
+		self._offset = end
+		return data
+
+
+def download_and_extract(
+		url: str, extract_dir: str, hasher=None, verbose: bool=True, chunk_size: int=None, queue_size: int=16,
+		extractor: TarExtractor=None, rate_limit: int=None
+	) -> bool:
+	"""
+	   Baixa um arquivo tar (.tar.xz, .tar.gz ...) e extrai o conteúdo em extract_dir
+	ao mesmo tempo, sem gravar o arquivo compactado no disco.
+
+	   Uma thread lê a rede, atualiza hasher e coloca os blocos em uma QueueReader
+	limitada. A thread atual descompacta e extrai os blocos conforme chegam. O
+	tempo total fica próximo do maior entre rede e descompressão, e não da soma.
+	O chamador deve conferir o hash antes de usar o conteúdo de extract_dir.
+	rate_limit limita a vazão (bytes/s), como em download_file().
+
+	   Se o download ou a extração falhar e extract_dir não existia antes, ele é
+	removido, assim não fica uma árvore extraída pela metade.
+	"""
+	try:
+		req: Response = get_http_session().get(url, stream=True, timeout=HTTP_TIMEOUT)
+	except _import_requests().RequestException as e:
+		print(f'ERRO ... {url} ({e})')
+		return False
+	if req.status_code >= 400:
+		req.close()
+		print(f'ERRO ... {url} ({req.status_code})')
+		return False
+
 	try:
 		file_size = int(req.headers['Content-Length'])
 	except:
 		file_size = int(0)
 
-
-	chunk = 1
-	chunk_size = 1024
-	num_bars = int(file_size / chunk_size)
-	clean_line()
-	# unit='KB'
-
+	reader = QueueReader(queue_size)
+	created = not os.path.exists(extract_dir)
+
+	def _feed() -> None:
+		position = 0
+		try:
+			with DownloadProgress(file_size, 0, url.split('/')[-1], verbose) as progress:
+				for chunk in _iter_content(req, AdaptiveChunkSize(chunk_size), _get_limiters(rate_limit)):
+					if hasher is not None:
+						hasher.update(chunk)
+					progress.update(len(chunk))
+					position += len(chunk)
+					if not reader.put(chunk):
+						return
+
+			if (file_size > 0) and (position != file_size):
+				raise Exception(f'ERRO ... download incompleto {position} de {file_size} bytes')
+			reader.put(None)
+		except Exception as e:
+			reader.put(e)
+		finally:
+			req.close()
+
+	feeder = threading.Thread(target=_feed, daemon=True)
+	feeder.start()
 	try:
-		with open(output_file, 'wb') as fp:
-			for chunk in tqdm.tqdm(
-				req.iter_content(chunk_size=chunk_size), total=num_bars, unit='KB', desc=show_filename,leave=True # progressbar stays
-				):
-				fp.write(chunk)
-
+		mkdir(extract_dir)
+		extract_tar_stream(reader, extract_dir, extractor)
+		# O tar pode terminar antes do fim do arquivo (blocos de preenchimento),
+		# ler o restante para que o hasher receba todos os bytes.
+		while reader.read(HASH_CHUNK_SIZE):
+			pass
 	except Exception as e:
 		print(e)
+		if created:
+			rmdir(extract_dir)
 		return False
-	else:
-		return True
+	finally:
+		reader.abort()
+		feeder.join()
+	return True
+
+
+# Downloads com asyncio (aiohttp opcional, ver AsyncDownloader).
+ASYNC_MAX_DOWNLOADS = 8
+ASYNC_MAX_PER_HOST = 4
+ASYNC_DISK_WORKERS = 4
+
+
+class AsyncDownloader(object):
+	"""
+	   Baixa vários arquivos (e faz requisições HEAD) em um único event loop do
+	asyncio. max_downloads limita as transferências simultâneas e max_per_host as
+	conexões com o mesmo servidor. A gravação no disco é feita em um pool pequeno
+	de threads (disk_workers), assim o event loop nunca espera pelo disco.
+
+	   Usa o aiohttp quando estiver instalado. Sem o aiohttp cada download roda
+	download_file() no mesmo pool de threads, com os mesmos limites.
+
+	   Uso:
+	       async with AsyncDownloader() as downloader:
+	           await downloader.download(url, output_file)
+
+	   Fora de um event loop use download_files().
+	"""
+
+	def __init__(
+			self, max_downloads: int = ASYNC_MAX_DOWNLOADS, max_per_host: int = ASYNC_MAX_PER_HOST,
+			disk_workers: int = ASYNC_DISK_WORKERS, verbose: bool = False, chunk_size: int = None,
+			rate_limit: int = None
+		) -> None:
+		self.max_downloads: int = max_downloads
+		self.max_per_host: int = max_per_host
+		self.disk_workers: int = disk_workers
+		self.verbose: bool = verbose
+		self.chunk_size: int = chunk_size
+		self.rate_limit: int = rate_limit # Limite de cada download (bytes/s).
+		self._semaphore: asyncio.Semaphore = None
+		self._executor: ThreadPoolExecutor = None
+		self._session = None
+
+	async def __aenter__(self):
+		import asyncio
+
+		aiohttp = _import_aiohttp()
+		self._semaphore = asyncio.Semaphore(self.max_downloads)
+		if aiohttp is None:
+			# download_file() bloqueia a thread durante todo o download.
+			self._executor = ThreadPoolExecutor(max_workers=self.max_downloads)
+		else:
+			self._executor = ThreadPoolExecutor(max_workers=self.disk_workers)
+			self._session = aiohttp.ClientSession(
+				connector=aiohttp.TCPConnector(limit=self.max_downloads, limit_per_host=self.max_per_host),
+				timeout=aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=60),
+			)
+		return self
+
+	async def __aexit__(self, *args) -> None:
+		if self._session is not None:
+			await self._session.close()
+			self._session = None
+		self._executor.shutdown()
+
+	async def _run(self, func, *args):
+		import asyncio
+		return await asyncio.get_running_loop().run_in_executor(self._executor, func, *args)
+
+	async def get_remote_info(self, url: str) -> tuple:
+		"""Igual a _get_remote_info(): (tamanho, aceita_range, etag)."""
+		async with self._semaphore:
+			if self._session is None:
+				return await self._run(_get_remote_info, url)
+
+			async with self._session.head(url, allow_redirects=True) as resp:
+				resp.raise_for_status()
+				try:
+					file_size = int(resp.headers['Content-Length'])
+				except:
+					file_size = int(0)
+				accept_ranges = resp.headers.get('Accept-Ranges', 'none').lower() == 'bytes'
+				return (file_size, accept_ranges, resp.headers.get('ETag'))
+
+	async def download(self, url: str, output_file: str, hasher=None) -> bool:
+		"""
+		   Versão assíncrona de download_file(), com o mesmo .part e journal, assim
+		um download interrompido continua de onde parou com qualquer um dos dois.
+		"""
+		if os.path.isfile(output_file):
+			print(f'[PULANDO] ... {output_file}')
+			return True
+
+		async with self._semaphore:
+			if self._session is None:
+				return await self._run(
+					download_file, url, output_file, self.verbose, hasher, 1, self.chunk_size, None, self.rate_limit
+				)
+
+			try:
+				return await self._download(url, output_file, hasher)
+			except Exception as e:
+				print(e)
+				return False
+
+	async def _download(self, url: str, output_file: str, hasher) -> bool:
+		part_file = f'{output_file}.part'
+		journal = DownloadJournal(f'{part_file}.json')
+		if not (os.path.isfile(part_file) and journal.load() and journal.is_same(url, 0, None)):
+			journal.reset(url, 0, None)
+
+		start = journal.prefix() if os.path.isfile(part_file) else 0
+		headers = {}
+		if start > 0:
+			headers['Range'] = f'bytes={start}-'
+			if journal.etag is not None:
+				headers['If-Range'] = journal.etag
+
+		async with self._session.get(url, headers=headers) as resp:
+			if resp.status >= 400:
+				print(f'ERRO ... {url} ({resp.status})')
+				return False
+
+			try:
+				file_size = int(resp.headers['Content-Length'])
+			except:
+				file_size = int(0)
+
+			content_range = resp.headers.get('Content-Range', '')
+			if (start > 0) and (resp.status == 206) and content_range.startswith(f'bytes {start}-'):
+				file_size += start
+				mode = 'r+b'
+			else:
+				# O servidor ignorou o Range (ou o arquivo mudou), começar do zero.
+				start = 0
+				mode = 'wb'
+				journal.reset(url, file_size, resp.headers.get('ETag'))
+
+			if (hasher is not None) and (start > 0):
+				await self._run(update_hash_from_file, hasher, part_file, HASH_CHUNK_SIZE, start)
+
+			position = start
+			fp = await self._run(open, part_file, mode, 0)
+			try:
+				await self._run(fp.seek, start)
+				with DownloadProgress(file_size, start, output_file.split(os.sep)[-1], self.verbose) as progress:
+					async for chunk in self._iter_chunks(resp):
+						# Sem buffer, assim o journal nunca registra bytes que ainda não chegaram ao disco.
+						await self._run(self._write_chunk, fp, chunk, hasher)
+						progress.update(len(chunk))
+						position += len(chunk)
+						journal.add_range(0, position)
+						await self._run(journal.save, False)
+			finally:
+				await self._run(fp.close)
+				journal.add_range(0, position)
+				await self._run(journal.save)
+
+		if (file_size > 0) and (position != file_size):
+			print(f'ERRO ... download incompleto {position} de {file_size} bytes')
+			return False
+		return await self._run(_finish_download, part_file, output_file, journal)
+
+	@staticmethod
+	def _write_chunk(fp, chunk: bytes, hasher) -> None:
+		"""Grava chunk e atualiza o hasher na thread do pool, fora do event loop."""
+		fp.write(chunk)
+		if hasher is not None:
+			hasher.update(chunk)
+
+	async def _iter_chunks(self, resp):
+		"""
+		   Junta os dados recebidos em blocos de AdaptiveChunkSize, para que cada
+		gravação enviada ao pool de threads tenha um tamanho razoável.
+		"""
+		import asyncio
+
+		chunk_size = AdaptiveChunkSize(self.chunk_size)
+		limiters = _get_limiters(self.rate_limit)
+		buffer = bytearray()
+		started = time.monotonic()
+		async for data in resp.content.iter_any():
+			delay = _throttle(limiters, len(data))
+			if delay > 0:
+				await asyncio.sleep(delay)
+			buffer += data
+			if len(buffer) >= chunk_size.size:
+				chunk_size.update(len(buffer), time.monotonic() - started)
+				yield bytes(buffer)
+				buffer.clear()
+				started = time.monotonic()
+		if buffer:
+			yield bytes(buffer)
+
+	async def download_many(self, items: list) -> list:
+		"""
+		   Baixa todos os itens [(url, output_file), ...] ou [(url, output_file, hasher), ...]
+		ao mesmo tempo (respeitando os limites) e retorna a lista de resultados.
+		"""
+		import asyncio
+		return list(await asyncio.gather(*[self.download(*item) for item in items]))
+
+
+def download_files(
+		items: list, max_downloads: int = ASYNC_MAX_DOWNLOADS, max_per_host: int = ASYNC_MAX_PER_HOST,
+		verbose: bool = False, chunk_size: int = None, rate_limit: int = None
+	) -> list:
+	"""
+	   Baixa [(url, output_file), ...] com AsyncDownloader em um novo event loop e
+	retorna a lista de resultados (True/False) na mesma ordem.
+	"""
+	import asyncio
+
+	async def _main() -> list:
+		async with AsyncDownloader(max_downloads, max_per_host, verbose=verbose, chunk_size=chunk_size, rate_limit=rate_limit) as downloader:
+			return await downloader.download_many(items)
+	return asyncio.run(_main())
 
 
 class ByteSize(int):
@@ -196,6 +1834,18 @@ class ByteSize(int):
         return self.__class__(super().__rmul__(other))
 
 
+def parse_byte_size(text: str) -> int:
+    """
+       Converte um tamanho legível para bytes, com sufixos K, M, G ou T
+    (base 1024). Ex: '512M' -> 536870912, '2G' -> 2147483648, '100' -> 100.
+    """
+    text = str(text).strip().upper().rstrip('B').rstrip('I')
+    multipliers = {'K': 1024, 'M': 1024**2, 'G': 1024**3, 'T': 1024**4}
+    if text[-1:] in multipliers:
+        return int(float(text[:-1]) * multipliers[text[-1]])
+    return int(text)
+
+
 class File(object):
     """
        Classe para trabalhar com um arquivo, e obter algumas informações como:
@@ -381,16 +2031,43 @@ class JSON(object):
         #
         # JsonObj = JSON(data)
         #
-        #
-        # 
+        # O json é convertido para dicionário uma única vez, e as buscas usam o
+        # dicionário e um mapa chave -> posição. data_json só é gerado novamente
+        # (a partir do dicionário) quando for lido depois de um append().
+        # to_dict() e values() convertem data_json de novo (json.loads(), mais
+        # rápido que deepcopy) e get_key() copia os valores dict/list, assim
+        # alterar o retorno não muda o dicionário interno.
         #
         self.data_json: str = data_json
 
+    @property
+    def data_json(self) -> str:
+        if self._data_json is None:
+            self._data_json = json.JSONEncoder().encode(self._dict)
+        return self._data_json
+
+    @data_json.setter
+    def data_json(self, new_data_json: str) -> None:
+        self._data_json = new_data_json
+        self._dict: dict = None
+        self._index: dict = None
+
     def __repr__(self) -> str:
         return json.JSONEncoder().encode(self.data_json)
 
     def __str__(self) -> str:
         return self.__repr__()
+
+    def _get_dict(self) -> dict:
+        """Dicionário interno (sem cópia)."""
+        if self._dict is None:
+            self._dict = json.loads(self._data_json)
+        return self._dict
+
+    def _get_index(self) -> dict:
+        if self._index is None:
+            self._index = {key: num for num, key in enumerate(self._get_dict())}
+        return self._index
        
     def to_dict(self) -> dict:
         """Converte os dados em json para um dicionário"""
@@ -398,54 +2075,46 @@ class JSON(object):
 
     def keys(self) -> list:
         """Retorna as keys de um json em forma de lista (list) no python"""
-        return list(self.to_dict().keys())
+        return list(self._get_dict().keys())
 
     def values(self) -> list:
         """
            Retorna os valores de um json em formato de lista (list) python.
         """
-        return list(self.to_dict().values())
+        return list(json.loads(self.data_json).values())
 
     def iskey(self, key) -> bool:
-        for K in self.keys():
-            if key == K:
-                return True
-                break
-        return False
+        return key in self._get_dict()
 
     def get_key(self, key):
         """
            Retorna o valor de uma chave do json se existir, se não retorna None.
         """
-        if not self.iskey(key):
-            return None
-        for _k in self.keys():
-            if _k == key:
-                return self.to_dict()[_k]
-                break
+        value = self._get_dict().get(key)
+        if isinstance(value, (dict, list)):
+            return copy.deepcopy(value)
+        return value
 
     def index(self, key: str) -> int:
         """
             Retorna o número de key no json/dict
         se key não existir no json então retorna -1    
         """
-        for num, value in enumerate(self.keys()):
-            if value == key:
-                return num
-                break
-        return -1
+        return self._get_index().get(key, -1)
 
     def append(self, key: str, value: str) -> None:
         """
             Insere uma chave e valor no Json.
         """
-        _d = self.to_dict()
-        _d.update({key: value})
-        self.data_json = json.JSONEncoder().encode(_d)
+        _d = self._get_dict()
+        if (self._index is not None) and (key not in _d):
+            self._index[key] = len(_d)
+        _d[key] = value
+        self._data_json = None
 
     def format(self):
         """Retorna os dados formatados com ensure_ascii=False e indent=4"""
-        return json.dumps(self.to_dict(), indent=4, ensure_ascii=False)
+        return json.dumps(self._get_dict(), indent=4, ensure_ascii=False)
 
 
 class FileJson(File):
@@ -459,10 +2128,38 @@ class FileJson(File):
 
     - Alterar/Adicionar uma chave.
 
+       Com cached=True o texto do arquivo fica em memória depois da primeira
+    leitura, e o arquivo só é lido novamente se mudar no disco (mtime/tamanho).
+    lines_to_dict() retorna um novo dicionário a partir do texto (json.loads()),
+    que não divide nenhum objeto com o cache. Use transaction() para juntar
+    várias alterações em uma única gravação.
+
+       A gravação é atômica: os dados vão para um arquivo temporário no mesmo
+    diretório, que depois substitui o arquivo com os.replace(). O arquivo
+    temporário recebe o modo e o dono do arquivo atual, e se o arquivo for um
+    link a gravação é feita no destino do link (o link é mantido).
     """
 
-    def __init__(self, file: str):
+    def __init__(self, file: str, cached: bool = False):
         super().__init__(file)
+        self.cached: bool = cached
+        # Texto do arquivo (cached=True) e o dicionário convertido dele, só
+        # para consultas internas (nunca é retornado).
+        self._text: str = None
+        self._content: dict = None
+        self._stamp: tuple = None
+        # Dicionário da transaction() em andamento, quantas estão abertas e se
+        # alguma delas terminou com exceção.
+        self._transaction: dict = None
+        self._transaction_depth: int = 0
+        self._transaction_failed: bool = False
+
+    def _get_stamp(self) -> tuple:
+        try:
+            st = os.stat(self.absolute())
+        except OSError:
+            return None
+        return (st.st_mtime_ns, st.st_size, st.st_ino)
 
     def write_lines(self, new_lines: dict):
         """
@@ -472,13 +2169,86 @@ class FileJson(File):
         if not isinstance(new_lines, dict):
             raise Exception(f'{__class__.__name__} ERRO ... tipo de dados incorreto ... {new_lines}')
 
-        with open(self.absolute(), 'w', encoding='utf8') as jfile:
-            json.dump(new_lines, jfile, ensure_ascii=False, sort_keys=True, indent=4)
+        if self._transaction is not None:
+            # Gravado no fim da transaction().
+            if new_lines is not self._transaction:
+                self._transaction.clear()
+                self._transaction.update(new_lines)
+            return
 
-    def lines_to_dict(self) -> dict:
-        """
-        Ler o conteúdo do arquivo .json e retorna as linhas em forma de um dicionário
-        """
+        path = os.path.realpath(self.absolute())
+        tmp_file = f'{path}.tmp-{os.getpid()}-{threading.get_ident()}'
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            st = None
+
+        text = json.dumps(new_lines, ensure_ascii=False, sort_keys=True, indent=4)
+        try:
+            with open(tmp_file, 'w', encoding='utf8') as jfile:
+                jfile.write(text)
+                if st is not None:
+                    self._copy_owner_mode(jfile.fileno(), tmp_file, st)
+            os.replace(tmp_file, path)
+        except BaseException:
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            raise
+
+        if self.cached:
+            # O dicionário é convertido de novo do texto quando for usado, assim
+            # o cache não divide objetos com new_lines.
+            self._text = text
+            self._content = None
+            self._stamp = self._get_stamp()
+
+    @staticmethod
+    def _copy_owner_mode(fd: int, path: str, st: os.stat_result) -> None:
+        if hasattr(os, 'fchmod'):
+            os.fchmod(fd, stat.S_IMODE(st.st_mode))
+        else:
+            os.chmod(path, stat.S_IMODE(st.st_mode))
+
+        if hasattr(os, 'fchown') and ((st.st_uid, st.st_gid) != (os.geteuid(), os.getegid())):
+            try:
+                os.fchown(fd, st.st_uid, st.st_gid)
+            except PermissionError:
+                # Só o root pode passar o arquivo para outro usuário.
+                pass
+
+    def _read(self) -> dict:
+        """Conteúdo atual (sem cópia), do disco ou da memória."""
+        if self._transaction is not None:
+            return self._transaction
+
+        if not self.cached:
+            return self._load()
+
+        self._update_cache()
+        if self._content is None:
+            self._content = json.loads(self._text)
+        return self._content
+
+    def _update_cache(self) -> None:
+        """Lê o texto do arquivo de novo se ele mudou no disco (cached=True)."""
+        stamp = self._get_stamp()
+        if (self._text is None) or (stamp is None) or (stamp != self._stamp):
+            self._text = self._load_text()
+            self._content = None
+            self._stamp = stamp
+
+    def _load_text(self) -> str:
+        try:
+            with open(self.absolute(), 'rt', encoding='utf8') as jfile:
+                text = jfile.read()
+            json.loads(text)
+        except Exception as e:
+            print(__class__.__name__, e)
+            return '{}'
+        else:
+            return text
+
+    def _load(self) -> dict:
         try:
             with open(self.absolute(), 'rt', encoding='utf8') as jfile:
                 content = json.load(jfile)
@@ -488,36 +2258,76 @@ class FileJson(File):
         else:
             return content
 
+    def _read_copy(self) -> dict:
+        """Novo dicionário com o conteúdo do arquivo, sem objetos em comum com o cache."""
+        if not self.cached:
+            return self._load()
+        self._update_cache()
+        return json.loads(self._text)
+
+    def lines_to_dict(self) -> dict:
+        """
+        Ler o conteúdo do arquivo .json e retorna as linhas em forma de um dicionário
+        """
+        if self._transaction is not None:
+            # Cópia, para que alterações no dicionário retornado não mudem a transação.
+            return copy.deepcopy(self._transaction)
+        return self._read_copy()
+
     def update_key(self, new_key: str, value: str):
         """
           Altera/Cria a chave 'new_key' com o valor 'value'
 
         Se new_key já existir, será modificada, se não será alterada.
         """
-        content = self.lines_to_dict()
-
-        if not new_key in content.keys():
-            content.update({new_key: value})
-        else:
+        with self.transaction() as content:
             content[new_key] = value
 
-        self.write_lines(content)
-
     def is_key(self, key: str) -> bool:
         """Verifica se uma chave/key existe no json"""
-        _keys = self.lines_to_dict().keys()
+        return key in self._read()
 
-        for json_key in self.lines_to_dict().keys():
-            if json_key == key:
-                return True
-                break
-        return False
+    @contextmanager
+    def transaction(self):
+        """
+           Retorna o dicionário com o conteúdo do arquivo, e grava o arquivo uma
+        única vez no fim do bloco (se não houver exceção). Dentro do bloco os
+        outros métodos usam o mesmo dicionário. Ex:
+
+           with file_json.transaction() as content:
+               content['a'] = 1
+               file_json.update_key('b', 2)
+
+        Blocos aninhados usam o mesmo dicionário e só o bloco mais externo grava
+        o arquivo. Se um bloco interno terminar com exceção nada é gravado, mesmo
+        que o bloco externo trate a exceção.
+        """
+        if self._transaction is None:
+            self._transaction = self._read_copy()
+            self._transaction_failed = False
+        self._transaction_depth += 1
+        raised = False
+        try:
+            yield self._transaction
+        except BaseException:
+            raised = True
+            self._transaction_failed = True
+            raise
+        finally:
+            self._transaction_depth -= 1
+            if self._transaction_depth == 0:
+                content, self._transaction = self._transaction, None
+                if not self._transaction_failed:
+                    self.write_lines(content)
+                elif not raised:
+                    # A exceção de um bloco interno foi tratada pelo bloco externo.
+                    print(f'{__class__.__name__} ... alterações descartadas ... {self.absolute()}')
 
     def get_lines(self):
         """
             Retorna as linhas de um arquivo no formato Json.
         """
-        return json.dumps(self.lines_to_dict(), indent=4, ensure_ascii=False)
+        return json.dumps(self._read(), indent=4, ensure_ascii=False)
 
     def get_json(self) -> JSON:
         """
@@ -569,71 +2379,184 @@ class UserDirs(object):
         pass
 
 
-class UserDirsLinux(UserDirs):
-    def __init__(self) -> None:
-        super().__init__()
-        self.user_root = False
-        
-    @property
-    def user_root(self) -> bool:
-        return self._user_root
+# Caminhos já resolvidos, por (classe, appname, user_root, HOME ...). Ver _get_cached_dirs().
+_resolved_dirs: dict = {}
+_resolved_dirs_lock = threading.Lock()
+# Incrementado por invalidate_dirs_cache(), invalida a cópia guardada em cada objeto.
+_resolved_dirs_generation: int = 0
+_euid: int = None
 
-    @user_root.setter
-    def user_root(self, new_user_root: bool):
-        self._user_root = new_user_root
-        if os.geteuid() == 0:
-            self._user_root = True
 
-    def config_dir(self) -> str:
-        if not self.user_root:
-            return get_abspath(os.path.join(get_user_home(), '.config'))
-        return '/etc'
+def get_euid() -> int:
+    """os.geteuid() lido uma única vez (-1 fora de posix). Ver invalidate_dirs_cache()."""
+    global _euid
+    if _euid is None:
+        _euid = os.geteuid() if hasattr(os, 'geteuid') else -1
+    return _euid
 
-    def cache_dir(self) -> str:
-        if not self.user_root:
-            return get_abspath(os.path.join(get_user_home(), '.cache'))
-        return '/var/cache'
 
-    def binary_dir(self) -> str:
-        if not self.user_root:
-            return get_abspath(os.path.join(get_user_home(), '.local', 'bin'))
-        return '/usr/local/bin'
+def invalidate_dirs_cache() -> None:
+    """
+       Descarta os caminhos resolvidos por UserDirsLinux/AppDirsLinux e o euid
+    memorizado. Chame depois de alterar HOME/XDG_* ou o usuário efetivo (os.seteuid()).
+    """
+    global _euid, _resolved_dirs_generation
+    with _resolved_dirs_lock:
+        _resolved_dirs.clear()
+        _resolved_dirs_generation += 1
+        _euid = None
 
-    def lib_dir(self) -> str:
-        if not self.user_root:
-            return get_abspath(os.path.join(get_user_home(), '.local', 'lib'))
-        return '/usr/local/lib'
 
-    def opt_dir(self) -> str:
-        if not self.user_root:
-            return get_abspath(os.path.join(get_user_home(), '.local', 'opt'))
-        return '/opt'
+# Variáveis de ambiente que alteram os diretórios do usuário (não root).
+XDG_VARIABLES = ('HOME', 'XDG_CONFIG_HOME', 'XDG_CACHE_HOME', 'XDG_DATA_HOME', 'XDG_STATE_HOME', 'XDG_BIN_HOME')
 
-    def data_dir(self) -> str:
-        if not self.user_root:
-            return get_abspath(os.path.join(get_user_home(), '.local', 'share'))
-        return '/usr/share'
 
-    def log_dir(self) -> str:
-        return None
+def _get_dirs_env() -> tuple:
+    return tuple(os.environ.get(var) for var in XDG_VARIABLES)
 
-    def hicolor_dir(self) -> str:
-        if not self.user_root:
-            return get_abspath(os.path.join(get_user_home(), '.local', 'share', 'icons', 'hicolor'))
-        return '/usr/share/icons/hicolor'
 
-    def icon_dir(self, resol='128x128') -> str:
+def get_xdg_dir(variable: str, default: str) -> str:
+    """
+       Retorna o valor da variável XDG (ex: XDG_CACHE_HOME), ou default se ela não
+    existir. Como na especificação, valores que não são caminhos absolutos
+    são ignorados.
+    """
+    value = os.environ.get(variable)
+    if (not value) or (not os.path.isabs(value)):
+        return default
+    return get_abspath(value)
+
+
+def makedirs_batch(paths: list) -> bool:
+    """
+       Cria todos os diretórios de paths em uma única passagem. Caminhos None são
+    ignorados, assim como os que são pais de outro da lista (os.makedirs() do
+    filho já os cria).
+    """
+    paths = set(get_abspath(p) for p in paths if p is not None)
+    parents = set()
+    for path in paths:
+        parent = os.path.dirname(path)
+        while (parent not in parents) and (parent != os.path.dirname(parent)):
+            parents.add(parent)
+            parent = os.path.dirname(parent)
+    leaves = sorted(paths - parents)
+
+    ok = True
+    for path in leaves:
+        try:
+            os.makedirs(path, exist_ok=True)
+        except Exception as e:
+            print(__name__, e)
+            ok = False
+    return ok
+
+
+def _get_cached_dirs(key: tuple, resolve) -> dict:
+    """
+       Retorna os caminhos de key, chamando resolve() apenas na primeira vez. Os
+    objetos com a mesma key (ex: vários PackageApp do mesmo appname) dividem
+    o mesmo dicionário, que não deve ser alterado.
+    """
+    dirs = _resolved_dirs.get(key)
+    if dirs is None:
+        dirs = resolve()
+        with _resolved_dirs_lock:
+            _resolved_dirs[key] = dirs
+    return dirs
+
+
+class UserDirsLinux(UserDirs):
+    def __init__(self) -> None:
+        super().__init__()
+        self.user_root = False
+        
+    @property
+    def user_root(self) -> bool:
+        return self._user_root
+
+    @user_root.setter
+    def user_root(self, new_user_root: bool):
+        self._user_root = new_user_root
+        if get_euid() == 0:
+            self._user_root = True
+
+    def _dirs(self) -> dict:
+        # Cópia local válida enquanto user_root e a geração não mudarem.
+        cached = self.__dict__.get('_cached_dirs')
+        if (cached is not None) and (cached[0] == _resolved_dirs_generation) and (cached[1] == self._user_root):
+            return cached[2]
+
+        dirs = _get_cached_dirs((__class__.__name__, self._user_root) + _get_dirs_env(), self._resolve_dirs)
+        self._cached_dirs = (_resolved_dirs_generation, self._user_root, dirs)
+        return dirs
+
+    def _resolve_dirs(self) -> dict:
+        if self.user_root:
+            return {
+                'config': '/etc',
+                'cache': '/var/cache',
+                'binary': '/usr/local/bin',
+                'lib': '/usr/local/lib',
+                'opt': '/opt',
+                'data': '/usr/share',
+                'state': '/var/lib',
+                'hicolor': '/usr/share/icons/hicolor',
+                'themes': '/usr/share/themes',
+                'desktop_entry': '/usr/share/applications',
+            }
+
+        # XDG Base Directory: https://specifications.freedesktop.org/basedir-spec/
+        home = get_user_home()
+        data_dir = get_xdg_dir('XDG_DATA_HOME', get_abspath(os.path.join(home, '.local', 'share')))
+        return {
+            'config': get_xdg_dir('XDG_CONFIG_HOME', get_abspath(os.path.join(home, '.config'))),
+            'cache': get_xdg_dir('XDG_CACHE_HOME', get_abspath(os.path.join(home, '.cache'))),
+            'binary': get_xdg_dir('XDG_BIN_HOME', get_abspath(os.path.join(home, '.local', 'bin'))),
+            'lib': get_abspath(os.path.join(home, '.local', 'lib')),
+            'opt': get_abspath(os.path.join(home, '.local', 'opt')),
+            'data': data_dir,
+            'state': get_xdg_dir('XDG_STATE_HOME', get_abspath(os.path.join(home, '.local', 'state'))),
+            'hicolor': os.path.join(data_dir, 'icons', 'hicolor'),
+            'themes': os.path.join(data_dir, 'themes'),
+            'desktop_entry': os.path.join(data_dir, 'applications'),
+        }
+
+    def config_dir(self) -> str:
+        return self._dirs()['config']
+
+    def cache_dir(self) -> str:
+        return self._dirs()['cache']
+
+    def binary_dir(self) -> str:
+        return self._dirs()['binary']
+
+    def lib_dir(self) -> str:
+        return self._dirs()['lib']
+
+    def opt_dir(self) -> str:
+        return self._dirs()['opt']
+
+    def data_dir(self) -> str:
+        return self._dirs()['data']
+
+    def log_dir(self) -> str:
+        return None
+
+    def state_dir(self) -> str:
+        return self._dirs()['state']
+
+    def hicolor_dir(self) -> str:
+        return self._dirs()['hicolor']
+
+    def icon_dir(self, resol='128x128') -> str:
         return Path(os.path.join(self.hicolor_dir(), resol, 'apps'))
 
     def themes_dir(self) -> str:
-        if not self.user_root:
-            return get_abspath(os.path.join(get_user_home(), '.local', 'share', 'themes'))
-        return '/usr/share/themes'
+        return self._dirs()['themes']
 
     def desktop_entry_dir(self) -> str:
-        if not self.user_root:
-            return get_abspath(os.path.join(get_user_home(), '.local', 'share', 'applications'))
-        return '/usr/share/applications'        
+        return self._dirs()['desktop_entry']
 
 
 
@@ -735,10 +2658,11 @@ class AppDirsLinux(AppDirs):
     def user_root(self, new_user_root: bool):
         self._user_root = new_user_root
         
-        if os.geteuid() == 0:
+        if get_euid() == 0:
             self._user_root = True
         
-        self.user_dirs: UserDirsLinux = UserDirsLinux()
+        if not isinstance(getattr(self, 'user_dirs', None), UserDirsLinux):
+            self.user_dirs: UserDirsLinux = UserDirsLinux()
         self.user_dirs.user_root = self._user_root
 
     @property
@@ -756,20 +2680,43 @@ class AppDirsLinux(AppDirs):
             'APP_DIR_CONFIG': self.app_config_dir(),
         }
 
+    def _dirs(self) -> dict:
+        # Cópia local válida enquanto appname, user_root e a geração não mudarem.
+        key = (_resolved_dirs_generation, self._appname, self.user_dirs._user_root)
+        cached = self.__dict__.get('_cached_dirs')
+        if (cached is not None) and (cached[0] == key):
+            return cached[1]
+
+        dirs = _get_cached_dirs(
+            (__class__.__name__, self._appname, self.user_dirs._user_root) + _get_dirs_env(), self._resolve_dirs
+        )
+        self._cached_dirs = (key, dirs)
+        return dirs
+
+    def _resolve_dirs(self) -> dict:
+        config_dir = os.path.join(self.user_dirs.config_dir(), self.appname)
+        return {
+            'cache': os.path.join(self.user_dirs.cache_dir(), self.appname),
+            'config': config_dir,
+            'appdir': os.path.join(self.user_dirs.opt_dir(), self.appname),
+            'file_conf': os.path.join(config_dir, f'{self.appname}.conf'),
+            'script': get_abspath(os.path.join(self.user_dirs.binary_dir(), self.appname)),
+        }
+
     def app_cache_dir(self) -> str:
-        return os.path.join(self.user_dirs.cache_dir(), self.appname)
+        return self._dirs()['cache']
 
     def app_config_dir(self) -> str:
-        return os.path.join(self.user_dirs.config_dir(), self.appname)
+        return self._dirs()['config']
 
     def appdir(self) -> str:
-        return os.path.join(self.user_dirs.opt_dir(), self.appname)
+        return self._dirs()['appdir']
 
     def app_file_conf(self) -> str:
-        return os.path.join(self.app_config_dir(), f'{self.appname}.conf')
+        return self._dirs()['file_conf']
 
     def app_script(self) -> str:
-        return get_abspath(os.path.join(self.user_dirs.binary_dir(), self.appname))
+        return self._dirs()['script']
 
     def app_icon(self, file_icon: str) -> str:
         """
@@ -791,9 +2738,16 @@ class AppDirsLinux(AppDirs):
 
     def create_dirs(self) -> bool:
         """
-         Cria os diretórios de configuração.
+         Cria os diretórios de configuração, cache e os diretórios onde appdir()
+        e app_script() serão instalados, em uma única passagem (makedirs_batch).
+        O próprio appdir() não é criado.
         """
-        pass
+        return makedirs_batch([
+            self.app_config_dir(),
+            self.app_cache_dir(),
+            os.path.dirname(self.appdir()),
+            os.path.dirname(self.app_script()),
+        ])
 
 
 class AppDirsWindows(AppDirs):
@@ -840,9 +2794,19 @@ class AppDirsWindows(AppDirs):
 
     def create_dirs(self) -> bool:
         """
-         Cria os diretórios de configuração.
+         Cria os diretórios de configuração, cache e os diretórios onde appdir()
+        e app_script() serão instalados, em uma única passagem (makedirs_batch).
+        O próprio appdir() não é criado.
         """
-        pass
+        paths = [
+            self.app_config_dir(),
+            self.app_cache_dir(),
+            os.path.dirname(self.app_script()),
+        ]
+        # UserDirsWindows.opt_dir() ainda não é definido (None).
+        if self.user_dirs.opt_dir() is not None:
+            paths.append(os.path.dirname(self.appdir()))
+        return makedirs_batch(paths)
 
 
 
@@ -857,7 +2821,7 @@ class BuilderUserDirs(object):
     def build_user_root(self, user_root: bool):
         if os.name == 'nt':
             self._user_root = False
-        elif os.name == 'posix' and os.geteuid() == 0:
+        elif os.name == 'posix' and get_euid() == 0:
             self._user_root = True
         else:
             self._user_root = user_root
@@ -894,7 +2858,7 @@ class BuilderAppDirs(object):
     def build_user_root(self, user_root: bool):
         if os.name != 'posix':
             return self
-        if os.geteuid() == 0:
+        if get_euid() == 0:
             self._user_root = True
         else:
             self._user_root = user_root
@@ -916,6 +2880,627 @@ class BuilderAppDirs(object):
         return app_dirs
 
 
+#================================================================================#
+# Catálogo
+#================================================================================#
+
+class CatalogEntry(object):
+    """
+       Um arquivo do catálogo: versão x idioma x plataforma de um aplicativo.
+
+    app_data são os campos do aplicativo no catálogo. Se o item não tiver
+    dir_package_files ele é gerado a partir do modelo do aplicativo, ex:
+    "dir_package_files": "tor-browser_{locale}" ({version} também é aceito).
+    """
+
+    def __init__(self, appname: str, version: str, locale: str, platform: str, data: dict, app_data: dict = None) -> None:
+        self.appname: str = appname
+        self.version: str = version
+        self.locale: str = locale
+        self.platform: str = platform
+        self.url: str = data['url']
+        self.appfile: str = data.get('file') or self.url.split('/')[-1]
+        self.hash: str = data['sha256']
+        self.size: int = data.get('size') # None se não informado.
+        # Diretório raiz dentro do pacote (ex: tor-browser_pt-BR), se houver.
+        self.dir_package_files: str = data.get('dir_package_files')
+        if (self.dir_package_files is None) and (app_data or {}).get('dir_package_files'):
+            self.dir_package_files = app_data['dir_package_files'].format(version=version, locale=locale)
+        # Outras urls com o mesmo arquivo.
+        self.mirrors: list = list(data.get('mirrors', []))
+
+    def __repr__(self) -> str:
+        return f'{self.appname} {self.version} {self.platform} {self.locale}'
+
+
+class PackageCatalog(object):
+    """
+       Catálogo (json lido com FileJson) com os arquivos de cada aplicativo por
+    versão, plataforma e idioma:
+
+    {
+        "torbrowser": {
+            "default_version": "11.0.14",
+            "default_locale": "pt-BR",
+            "dir_package_files": "tor-browser_{locale}",
+            "releases": {
+                "11.0.14": {
+                    "Linux": {
+                        "pt-BR": {"url": "...", "file": "...", "size": null, "sha256": "..."}
+                    }
+                }
+            }
+        }
+    }
+
+       Com cache_dir o catálogo é lido por inteiro só quando muda (mtime/tamanho),
+    e um índice é gravado em cache_dir/index com um item por linha. get() procura
+    a linha do item pedido (str.find) e converte apenas ela com json.loads(),
+    assim o tempo de get() quase não depende do tamanho do catálogo. Sem
+    cache_dir, ou se o índice não puder ser gravado, o catálogo é lido por
+    inteiro no primeiro uso. O índice fica em um subdiretório para não ser
+    tratado como pacote pelo CacheManager.
+    """
+
+    SUBDIR = 'index'
+    INDEX_VERSION = 1
+
+    def __init__(self, file: str, cache_dir: str = None) -> None:
+        self.file_json: FileJson = FileJson(file)
+        self.index_dir: str = None if cache_dir is None else os.path.join(cache_dir, self.SUBDIR)
+        self._content: dict = None
+        # (campos dos aplicativos, texto do índice) lidos do arquivo de índice.
+        self._index: tuple = None
+
+    def _apps(self) -> dict:
+        if self._content is None:
+            if not self.file_json.exists():
+                raise Exception(f'{__class__.__name__} ERRO ... catálogo não encontrado ... {self.file_json.absolute()}')
+            self._content = self.file_json.lines_to_dict()
+        return self._content
+
+    def _releases(self, appname: str) -> dict:
+        return self._apps().get(appname, {}).get('releases', {})
+
+    def _app_data(self, appname: str) -> dict:
+        """Campos do aplicativo, sem 'releases'."""
+        return {k: v for k, v in self._apps().get(appname, {}).items() if k != 'releases'}
+
+    def _index_file(self) -> str:
+        name = hashlib.sha256(self.file_json.absolute().encode('utf8')).hexdigest()
+        return os.path.join(self.index_dir, f'catalog-{name}.index')
+
+    @staticmethod
+    def _index_key(appname: str, version: str, platform: str, locale: str) -> str:
+        # json.dumps() não deixa quebras de linha nem tabs literais na linha.
+        return json.dumps([appname, version, platform, locale], ensure_ascii=False)
+
+    def _get_index(self) -> tuple:
+        """
+           Retorna (campos dos aplicativos, texto do índice), recriando o índice
+        se o catálogo mudou. Retorna None sem index_dir ou se o índice não puder
+        ser gravado.
+        """
+        if (self._index is not None) or (self.index_dir is None):
+            return self._index
+
+        try:
+            st = os.stat(self.file_json.absolute())
+        except OSError:
+            return None
+        header = {
+            'version': self.INDEX_VERSION,
+            'catalog': self.file_json.absolute(),
+            'stamp': [st.st_mtime_ns, st.st_size],
+        }
+
+        index_file = self._index_file()
+        try:
+            with open(index_file, 'rt', encoding='utf8') as fp:
+                text = fp.read()
+            first_line = json.loads(text[:text.index('\n')])
+            if all(first_line.get(k) == v for k, v in header.items()):
+                self._index = (first_line['apps'], text)
+                return self._index
+        except (OSError, ValueError):
+            pass
+
+        # Catálogo novo ou alterado: ler tudo uma vez e gravar o índice.
+        apps = {appname: self._app_data(appname) for appname in self._apps()}
+        lines = [json.dumps(dict(header, apps=apps), ensure_ascii=False)]
+        for appname in self._apps():
+            for version, platforms in self._releases(appname).items():
+                for platform, locales in platforms.items():
+                    for locale, data in locales.items():
+                        key = self._index_key(appname, version, platform, locale)
+                        lines.append(f'{key}\t{json.dumps(data, ensure_ascii=False)}')
+        text = '\n'.join(lines) + '\n'
+
+        tmp_file = f'{index_file}.tmp-{os.getpid()}'
+        try:
+            mkdir(self.index_dir)
+            with open(tmp_file, 'wt', encoding='utf8') as fp:
+                fp.write(text)
+            os.replace(tmp_file, index_file)
+        except OSError as e:
+            print(__class__.__name__, e)
+            if os.path.exists(tmp_file):
+                os.remove(tmp_file)
+            return None
+
+        self._index = (apps, text)
+        return self._index
+
+    def apps(self) -> list:
+        index = self._get_index()
+        if index is not None:
+            return list(index[0].keys())
+        return list(self._apps().keys())
+
+    def versions(self, appname: str) -> list:
+        return list(self._releases(appname).keys())
+
+    def locales(self, appname: str, version: str, platform: str = KERNEL_TYPE) -> list:
+        return list(self._releases(appname).get(version, {}).get(platform, {}).keys())
+
+    def _get_app_data(self, appname: str) -> dict:
+        index = self._get_index()
+        if index is not None:
+            return index[0].get(appname, {})
+        return self._app_data(appname)
+
+    def default_version(self, appname: str) -> str:
+        return self._get_app_data(appname).get('default_version')
+
+    def default_locale(self, appname: str) -> str:
+        return self._get_app_data(appname).get('default_locale')
+
+    def _get_data(self, appname: str, version: str, platform: str, locale: str) -> dict:
+        index = self._get_index()
+        if index is None:
+            return self._releases(appname).get(version, {}).get(platform, {}).get(locale)
+
+        text = index[1]
+        prefix = f'\n{self._index_key(appname, version, platform, locale)}\t'
+        start = text.find(prefix)
+        if start == -1:
+            return None
+        start += len(prefix)
+        return json.loads(text[start:text.index('\n', start)])
+
+    def get(self, appname: str, version: str = None, locale: str = None, platform: str = KERNEL_TYPE) -> CatalogEntry:
+        """
+           Retorna o CatalogEntry pedido, ou None se não existir no catálogo.
+        version/locale None usam os valores padrão do aplicativo.
+        """
+        version = version or self.default_version(appname)
+        locale = locale or self.default_locale(appname)
+        data = self._get_data(appname, version, platform, locale)
+        if data is None:
+            return None
+        return CatalogEntry(appname, version, locale, platform, data, self._get_app_data(appname))
+
+
+
+#================================================================================#
+# Cache
+#================================================================================#
+
+class ContentStore(object):
+    """
+       Armazena arquivos pelo sha256 do conteúdo, em <root_dir>/sha256/ab/cdef...
+
+    Um arquivo só entra no store depois que o hash é conferido, e pode ser usado
+    sem um novo download, mesmo que tenha sido baixado com outro nome ou por
+    outro usuário/job do mesmo host. Como o store pode ser compartilhado, quem
+    usa um arquivo do store deve conferir o hash novamente (ver remove()).
+    """
+
+    SUBDIR = 'sha256'
+
+    def __init__(self, root_dir: str) -> None:
+        self.root_dir: str = root_dir
+
+    def path(self, sha256: str) -> str:
+        """Retorna o caminho do arquivo com o hash sha256 no store."""
+        sha256 = sha256.lower()
+        return os.path.join(self.root_dir, self.SUBDIR, sha256[0:2], sha256[2:])
+
+    def contains(self, sha256: str) -> bool:
+        if (sha256 is None) or (len(sha256) != 64):
+            return False
+        return os.path.isfile(self.path(sha256))
+
+    def add(self, file: str, sha256: str = None) -> str:
+        """
+           Adiciona file ao store (hardlink quando possível) e retorna o caminho
+        no store. Se sha256 não for informado o hash é calculado. O arquivo no
+        store fica somente leitura.
+        """
+        if sha256 is None:
+            sha256 = get_file_hash(file)
+        store_file = self.path(sha256)
+        if os.path.isfile(store_file):
+            return store_file
+
+        mkdir(os.path.dirname(store_file))
+        link_file(file, store_file)
+        os.chmod(store_file, 0o444)
+        return store_file
+
+    def get(self, sha256: str, output_file: str) -> bool:
+        """
+           Cria output_file (hardlink/reflink/cópia) a partir do arquivo com o hash
+        sha256 no store. Retorna False se o hash não estiver no store.
+        """
+        if not self.contains(sha256):
+            return False
+
+        store_file = self.path(sha256)
+        if os.path.exists(output_file) and os.path.samefile(store_file, output_file):
+            return True
+
+        mkdir(os.path.dirname(output_file))
+        link_file(store_file, output_file)
+        return True
+
+    def remove(self, sha256: str) -> None:
+        """Remove o arquivo com o hash sha256 do store (ex: conteúdo corrompido)."""
+        store_file = self.path(sha256)
+        if os.path.isfile(store_file):
+            os.remove(store_file)
+
+
+class TreeCache(object):
+    """
+       Cache de pacotes já descompactados, um diretório por sha256 do pacote em
+    <root_dir>/trees/<sha256>. Com a árvore no cache, uma nova instalação da
+    mesma versão é feita com clone_tree() (reflink/hardlink) sem descompactar.
+
+    Com hardlinks a árvore do cache e a instalação são os mesmos arquivos, e uma
+    alteração feita no lugar na instalação também altera o cache. Por isso a
+    árvore é conferida com o TreeManifest (check()) antes de ser usada.
+    """
+
+    SUBDIR = 'trees'
+
+    def __init__(self, root_dir: str) -> None:
+        self.root_dir: str = root_dir
+
+    def path(self, sha256: str) -> str:
+        return os.path.join(self.root_dir, self.SUBDIR, sha256.lower())
+
+    def contains(self, sha256: str) -> bool:
+        if (sha256 is None) or (len(sha256) != 64):
+            return False
+        return os.path.isdir(self.path(sha256))
+
+    def add(self, sha256: str, unpack) -> bool:
+        """
+           Chama unpack(diretório) para descompactar o pacote em um diretório
+        temporário dentro do cache, que é movido para path(sha256) com
+        os.rename() se unpack não retornar False.
+        """
+        tree_dir = self.path(sha256)
+        staging_dir = get_staging_dir(tree_dir)
+        mkdir(os.path.dirname(tree_dir))
+        try:
+            if unpack(staging_dir) is False:
+                return False
+            if not os.path.isdir(tree_dir):
+                os.rename(staging_dir, tree_dir)
+        finally:
+            rmdir(staging_dir)
+        return True
+
+    def add_tree(self, sha256: str, src_dir: str, hardlink: bool = False) -> bool:
+        """
+           Adiciona ao cache a árvore já descompactada em src_dir, apenas com
+        reflink (ou hardlink, se hardlink=True). Retorna False, sem copiar os
+        dados, se o sistema de arquivos não permitir.
+        """
+        tree_dir = self.path(sha256)
+        if os.path.isdir(tree_dir):
+            return True
+
+        staging_dir = get_staging_dir(tree_dir)
+        mkdir(os.path.dirname(tree_dir))
+        try:
+            clone_tree(src_dir, staging_dir, hardlink, copy=False)
+            os.rename(staging_dir, tree_dir)
+        except OSError:
+            return False
+        finally:
+            rmdir(staging_dir)
+        return True
+
+    def check(self, sha256: str) -> bool:
+        """
+           Confere a árvore sha256 com o TreeManifest gravado nela (stat, e sha256
+        só dos arquivos com mtime alterado). Retorna False se faltar o manifest
+        ou algum arquivo estiver ausente ou alterado.
+        """
+        tree_dir = self.path(sha256)
+        manifest = TreeManifest.load(tree_dir)
+        if manifest is None:
+            return False
+        result = manifest.check(tree_dir)
+        return (result['missing'] == []) and (result['modified'] == [])
+
+    def remove(self, sha256: str) -> None:
+        rmdir(self.path(sha256))
+
+    def materialize(self, sha256: str, target_dir: str, hardlink: bool = False) -> str:
+        """
+           Cria target_dir (que não deve existir) com o conteúdo da árvore sha256.
+        Retorna o método usado por clone_tree().
+        """
+        return clone_tree(self.path(sha256), target_dir, hardlink)
+
+
+def is_https_url(url: str) -> bool:
+    return url.lower().startswith('https://')
+
+
+class HttpMetadataCache(object):
+    """
+       Cache em disco de arquivos pequenos baixados por HTTP (catálogos, listas de
+    sha256, assinaturas). Cada resposta é gravada com o ETag/Last-Modified e a
+    próxima requisição envia If-None-Match/If-Modified-Since, se o servidor
+    responder 304 o conteúdo é lido do disco, sem baixar o arquivo novamente.
+
+    Estes arquivos dizem qual sha256 é o correto, então só urls https são
+    aceitas (inclusive depois de redirecionamentos).
+    """
+
+    SUBDIR = 'http-metadata'
+
+    def __init__(self, cache_dir: str) -> None:
+        self.root_dir: str = os.path.join(cache_dir, self.SUBDIR)
+
+    def path(self, url: str) -> str:
+        """Caminho do conteúdo de url no cache (existindo ou não)."""
+        return os.path.join(self.root_dir, hashlib.sha256(url.encode('utf8')).hexdigest())
+
+    def _meta(self, url: str) -> FileJson:
+        return FileJson(f'{self.path(url)}.json')
+
+    def get_file(self, url: str) -> str:
+        """
+           Atualiza o cache de url (requisição condicional) e retorna o caminho do
+        arquivo com o conteúdo. Se o servidor não responder, usa a cópia do cache
+        quando existir.
+        """
+        if not is_https_url(url):
+            raise ValueError(f'{__class__.__name__} ERRO ... apenas urls https são aceitas ... {url}')
+
+        file = self.path(url)
+        meta_json = self._meta(url)
+        meta = meta_json.lines_to_dict() if (meta_json.exists() and os.path.isfile(file)) else {}
+
+        headers = {}
+        if meta.get('etag') is not None:
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified') is not None:
+            headers['If-Modified-Since'] = meta['last_modified']
+
+        try:
+            req: Response = get_http_session().get(url, headers=headers, timeout=HTTP_TIMEOUT)
+        except Exception as e:
+            if meta == {}:
+                raise
+            print(f'{__class__.__name__} {e} ... usando o cache {url}')
+            return file
+
+        if not is_https_url(req.url):
+            req.close()
+            raise ValueError(f'{__class__.__name__} ERRO ... redirecionado para uma url sem https ... {req.url}')
+        if (req.status_code == 304) and (meta != {}):
+            return file
+        if req.status_code >= 400:
+            if meta == {}:
+                req.raise_for_status()
+            print(f'{__class__.__name__} ERRO {req.status_code} ... usando o cache {url}')
+            return file
+
+        mkdir(self.root_dir)
+        tmp_file = f'{file}.tmp-{os.getpid()}'
+        with open(tmp_file, 'wb') as fp:
+            fp.write(req.content)
+        os.replace(tmp_file, file)
+        meta_json.write_lines({
+            'url': url,
+            'etag': req.headers.get('ETag'),
+            'last_modified': req.headers.get('Last-Modified'),
+        })
+        return file
+
+    def get(self, url: str) -> bytes:
+        """Igual a get_file(), mas retorna o conteúdo."""
+        with open(self.get_file(url), 'rb') as fp:
+            return fp.read()
+
+
+# Tamanho máximo padrão de um diretório de cache controlado por CacheManager.
+CACHE_MAX_BYTES = 2 * 1024**3
+
+
+class CacheManager(object):
+    """
+       Mantém o tamanho de um diretório de cache dentro de um limite.
+
+    O último acesso de cada arquivo é registrado com touch() em um índice json
+    dentro do próprio cache (o atime do sistema de arquivos não é confiável
+    com noatime/relatime). gc() remove primeiro os arquivos usados há mais
+    tempo (LRU) até o total ficar abaixo de max_bytes, e também os arquivos
+    sem uso há mais de max_age segundos. Hardlinks do mesmo arquivo (ex: o
+    pacote e sua cópia no ContentStore) são contados e removidos juntos, e cada
+    árvore do TreeCache (trees/<sha256>) é uma única entrada.
+
+    Só pacotes completos entram no gc: os arquivos na raiz do cache, os arquivos
+    do ContentStore (sha256/ab/cdef...) e as árvores do TreeCache. Downloads em
+    andamento (.part/.part.json), arquivos json (índice, mirrors.json), arquivos
+    temporários, diretórios de staging e outros subdiretórios (ex: http-metadata,
+    index) nunca são removidos. O índice é alterado com uma trava (flock) entre processos.
+    """
+
+    INDEX_FILE = 'cache-index.json'
+    # Arquivos da raiz do cache que não são pacotes.
+    SKIP_SUFFIXES = ('.part', '.json', '.lock')
+
+    def __init__(self, cache_dir: str, max_bytes: int = CACHE_MAX_BYTES, max_age: float = None) -> None:
+        self.cache_dir: str = cache_dir
+        self.max_bytes: int = max_bytes
+        self.max_age: float = max_age
+        self.index: FileJson = FileJson(os.path.join(cache_dir, self.INDEX_FILE), cached=True)
+
+    def _load_index(self) -> dict:
+        if not self.index.exists():
+            return {}
+        return self.index.lines_to_dict()
+
+    @contextmanager
+    def _lock_index(self):
+        """Trava o índice (flock) para ler e gravar sem perder o touch() de outro processo."""
+        mkdir(self.cache_dir)
+        try:
+            import fcntl
+        except ImportError:
+            yield
+            return
+
+        with open(f'{self.index.absolute()}.lock', 'a') as fp:
+            fcntl.flock(fp.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fp.fileno(), fcntl.LOCK_UN)
+
+    def touch(self, *files: str) -> None:
+        """Registra o acesso atual aos arquivos informados."""
+        now = time.time()
+        with self._lock_index():
+            content = self._load_index()
+            for file in files:
+                rel_path = os.path.relpath(get_abspath(file), self.cache_dir)
+                if not rel_path.startswith('..'):
+                    content[rel_path] = now
+            self.index.write_lines(content)
+
+    def _is_package_file(self, name: str) -> bool:
+        return not (name.endswith(self.SKIP_SUFFIXES) or ('.tmp' in name) or ('.staging-' in name))
+
+    def _package_files(self):
+        """Retorna os caminhos dos pacotes completos: raiz do cache e ContentStore."""
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file(follow_symlinks=False) and self._is_package_file(entry.name):
+                    yield entry.path
+
+        store_dir = os.path.join(self.cache_dir, ContentStore.SUBDIR)
+        for root, dirs, files in os.walk(store_dir):
+            for name in files:
+                if self._is_package_file(name):
+                    yield os.path.join(root, name)
+
+    def _trees(self):
+        """Retorna os diretórios trees/<sha256> (sem os de staging)."""
+        trees_dir = os.path.join(self.cache_dir, TreeCache.SUBDIR)
+        if not os.path.isdir(trees_dir):
+            return
+        for name in os.listdir(trees_dir):
+            path = os.path.join(trees_dir, name)
+            if (len(name) == 64) and os.path.isdir(path) and not os.path.islink(path):
+                yield path
+
+    def entries(self) -> list:
+        """
+           Retorna os arquivos do cache agrupados por inode, do acesso mais antigo
+        para o mais recente: [{'paths': [...], 'size': int, 'last_access': float}, ...]
+        """
+        if not os.path.isdir(self.cache_dir):
+            return []
+
+        index = self._load_index()
+        groups = {}
+        for path in self._trees():
+            rel_path = os.path.relpath(path, self.cache_dir)
+            groups[rel_path] = {
+                'paths': [rel_path],
+                'size': self._tree_size(path),
+                'last_access': index.get(rel_path, os.lstat(path).st_mtime),
+            }
+
+        for path in self._package_files():
+            st = os.lstat(path)
+            if not stat.S_ISREG(st.st_mode):
+                continue
+
+            rel_path = os.path.relpath(path, self.cache_dir)
+            group = groups.setdefault((st.st_dev, st.st_ino), {'paths': [], 'size': st.st_size, 'last_access': 0})
+            group['paths'].append(rel_path)
+            group['last_access'] = max(group['last_access'], index.get(rel_path, st.st_mtime))
+
+        return sorted(groups.values(), key=lambda group: group['last_access'])
+
+    def _tree_size(self, tree_dir: str) -> int:
+        total = 0
+        for root, dirs, files in os.walk(tree_dir):
+            for name in files:
+                total += os.lstat(os.path.join(root, name)).st_size
+        return total
+
+    def size(self) -> int:
+        """Total de bytes usados pelo cache."""
+        return sum(group['size'] for group in self.entries())
+
+    def gc(self) -> tuple:
+        """
+           Remove os arquivos menos usados até respeitar max_bytes/max_age.
+        Retorna (arquivos removidos, bytes liberados).
+        """
+        entries = self.entries()
+        total = sum(group['size'] for group in entries)
+        now = time.time()
+        removed = 0
+        freed = 0
+
+        for group in entries:
+            expired = (self.max_age is not None) and (now - group['last_access'] > self.max_age)
+            if (not expired) and (total <= self.max_bytes):
+                # As próximas entradas são mais recentes, nada mais para remover.
+                break
+
+            for rel_path in group['paths']:
+                path = os.path.join(self.cache_dir, rel_path)
+                try:
+                    if os.path.isdir(path) and not os.path.islink(path):
+                        rmtree(path)
+                    else:
+                        os.remove(path)
+                except OSError as e:
+                    print(__class__.__name__, e)
+                else:
+                    removed += 1
+            total -= group['size']
+            freed += group['size']
+
+        self._remove_empty_dirs()
+        if self.index.exists():
+            with self._lock_index():
+                self.index.write_lines({
+                    k: v for k, v in self._load_index().items() if os.path.exists(os.path.join(self.cache_dir, k))
+                })
+        return (removed, freed)
+
+    def _remove_empty_dirs(self) -> None:
+        """Remove os diretórios vazios do ContentStore (sha256/ab)."""
+        store_dir = os.path.join(self.cache_dir, ContentStore.SUBDIR)
+        for root, dirs, files in os.walk(store_dir, topdown=False):
+            if os.listdir(root) == []:
+                os.rmdir(root)
+
+
 class PackageApp(object):
     def __init__(self, appname: str, appfile: str, save_dir: str) -> None:
         super().__init__()
@@ -926,6 +3511,21 @@ class PackageApp(object):
         self.save_dir: str = save_dir # Diretório onde o pacote deve ser baixado.
         self.url = None
         self.hash = None
+        self.size: int = None # Tamanho do pacote em bytes, conferido em verify() se informado.
+        self.connections: int = 1 # Conexões paralelas usadas no download.
+        self.verbose: bool = True # Mostrar a barra de progresso do download.
+        self.content_store: ContentStore = None # Store consultado antes de baixar.
+        self.cache_manager: CacheManager = None # Registra o uso do pacote no cache.
+        self.pipeline: bool = False # Baixar e instalar sem gravar o pacote no disco.
+        self.tree_cache: TreeCache = None # Cache do pacote já descompactado.
+        self.hardlink: bool = False # Permitir hardlinks a partir do tree_cache.
+        self.use_asyncio: bool = False # Baixar com AsyncDownloader.
+        self.mirrors: list = [] # Outras urls com o mesmo pacote.
+        self.mirror_ranking: MirrorRanking = None # Ordena url/mirrors antes de baixar.
+        self.rate_limit: int = None # Limite de vazão (bytes/s) do download.
+
+        # (sha256, tamanho, mtime_ns) calculado durante o último download.
+        self._download_digest: tuple = None
 
     @property
     def hash(self):
@@ -951,7 +3551,38 @@ class PackageApp(object):
             print(f'ERRO ... {__class__.__name__} sha256 não pode ser None')
             return False
         #print(f'[CHECANDO] ... {self.pkg_file().absolute()}')
-        return ShaSum(self.pkg_file().absolute()).check_sha256(self.hash)
+        if not os.path.isfile(self.pkg_file().absolute()):
+            print(f'ERRO ... {self.pkg_file().absolute()} não encontrado')
+            return False
+        if (self.size is not None) and (os.path.getsize(self.pkg_file().absolute()) != self.size):
+            print(f'ERRO ... {self.pkg_file().absolute()} não tem o tamanho do catálogo ({self.size} bytes)')
+            return False
+        digest = self._get_download_digest()
+        if digest is not None:
+            return digest == self.hash.lower()
+
+        if not ShaSum(self.pkg_file().absolute()).check_sha256(self.hash.lower()):
+            return False
+        self._add_to_store(self.hash.lower())
+        return True
+
+    def _get_download_digest(self) -> str:
+        """
+           Retorna o sha256 calculado durante o download, se o arquivo não
+        foi alterado desde então (mesmo tamanho e mtime), se não retorna None.
+        """
+        if self._download_digest is None:
+            return None
+
+        digest, size, mtime_ns = self._download_digest
+        try:
+            st = os.stat(self.pkg_file().absolute())
+        except OSError:
+            return None
+
+        if (st.st_size != size) or (st.st_mtime_ns != mtime_ns):
+            return None
+        return digest
 
     def pkg_file(self) -> File:
         pass
@@ -963,7 +3594,140 @@ class PackageApp(object):
         pass
 
     def download(self):
-        return download_file(self.url, self.pkg_file().absolute())
+        if self.use_asyncio:
+            return download_packages([self], verbose=self.verbose, rate_limit=self.rate_limit)[0]
+
+        output_file = self.pkg_file().absolute()
+        if self._get_from_store(output_file):
+            print(f'[CACHE] ... {output_file}')
+            self._touch_cache()
+            return True
+
+        if os.path.isfile(output_file):
+            self._touch_cache()
+            return download_file(self.url, output_file, self.verbose)
+
+        urls = self.urls()
+        hasher = hashlib.sha256()
+        if not download_file(
+                urls[0], output_file, self.verbose, hasher=hasher, connections=self.connections, mirrors=urls[1:],
+                rate_limit=self.rate_limit
+            ):
+            return False
+
+        self._downloaded(hasher.hexdigest())
+        return True
+
+    def urls(self) -> list:
+        """url e mirrors, do mais rápido para o mais lento se houver mirror_ranking."""
+        urls = [self.url] + [url for url in self.mirrors if url != self.url]
+        if (self.mirror_ranking is None) or (len(urls) < 2):
+            return urls
+        return self.mirror_ranking.rank(urls)
+
+    async def async_download(self, downloader: AsyncDownloader) -> bool:
+        """
+           Igual a download(), mas baixa com o AsyncDownloader informado, assim
+        vários pacotes podem ser baixados no mesmo event loop (download_packages()).
+        """
+        import asyncio
+
+        output_file = str(self.pkg_file().absolute())
+        loop = asyncio.get_running_loop()
+        if await loop.run_in_executor(None, self._get_from_store, output_file):
+            print(f'[CACHE] ... {output_file}')
+            await loop.run_in_executor(None, self._touch_cache)
+            return True
+
+        if os.path.isfile(output_file):
+            await loop.run_in_executor(None, self._touch_cache)
+            return await downloader.download(self.url, output_file)
+
+        hasher = hashlib.sha256()
+        if not await downloader.download(self.url, output_file, hasher):
+            return False
+
+        await loop.run_in_executor(None, self._downloaded, hasher.hexdigest())
+        return True
+
+    def _downloaded(self, digest: str) -> None:
+        """Registra o pacote recém baixado (sha256 calculado no download)."""
+        self._set_download_digest(digest)
+        self._add_to_store(digest)
+        self._touch_cache()
+
+    def is_cached(self) -> bool:
+        """Verifica se o pacote já está disponível localmente (save_dir ou store)."""
+        if self.pkg_file().exists():
+            return True
+        return (self.content_store is not None) and self.content_store.contains(self.hash)
+
+    def _touch_cache(self) -> None:
+        """Registra o uso do pacote (e da cópia no store) no CacheManager."""
+        if self.cache_manager is None:
+            return
+
+        files = [self.pkg_file().absolute()]
+        if (self.content_store is not None) and self.content_store.contains(self.hash):
+            files.append(self.content_store.path(self.hash))
+        try:
+            self.cache_manager.touch(*files)
+        except Exception as e:
+            print(__class__.__name__, e)
+
+    def _set_download_digest(self, digest: str) -> None:
+        st = os.stat(self.pkg_file().absolute())
+        self._download_digest = (digest, st.st_size, st.st_mtime_ns)
+
+    def _get_from_store(self, output_file: str) -> bool:
+        """
+           Cria o pacote a partir do store, se o hash esperado estiver nele,
+        substituindo qualquer arquivo com o mesmo nome.
+        """
+        if (self.content_store is None) or (not self.content_store.contains(self.hash)):
+            return False
+
+        try:
+            self.content_store.get(self.hash, output_file)
+            # O store pode ser compartilhado (--store-dir), o conteúdo só foi
+            # conferido quando foi adicionado.
+            digest = get_file_hash(output_file)
+            if digest != self.hash.lower():
+                print(f'ERRO ... {self.content_store.path(self.hash)} não confere com o sha256, removendo do store')
+                os.remove(output_file)
+                self.content_store.remove(self.hash)
+                return False
+        except Exception as e:
+            print(__class__.__name__, e)
+            return False
+        self._set_download_digest(digest)
+        return True
+
+    def _add_to_store(self, digest: str) -> None:
+        if (self.content_store is None) or (self.hash is None) or (digest != self.hash.lower()):
+            return
+
+        try:
+            self.content_store.add(self.pkg_file().absolute(), digest)
+        except Exception as e:
+            print(__class__.__name__, e)
+
+
+def download_packages(
+        apps: list, max_downloads: int = ASYNC_MAX_DOWNLOADS, max_per_host: int = ASYNC_MAX_PER_HOST,
+        verbose: bool = False, rate_limit: int = None
+    ) -> list:
+    """
+       Baixa todos os pacotes (PackageApp) no mesmo event loop, ex: os arquivos
+    de todas as plataformas/idiomas de uma versão, e retorna os resultados na
+    mesma ordem.
+    """
+    import asyncio
+
+    async def _main() -> list:
+        async with AsyncDownloader(max_downloads, max_per_host, verbose=verbose, rate_limit=rate_limit) as downloader:
+            return list(await asyncio.gather(*[app.async_download(downloader) for app in apps]))
+    return asyncio.run(_main())
 
 
 class PackageTarGz(PackageApp):
@@ -973,13 +3737,170 @@ class PackageTarGz(PackageApp):
         # Nome do diretório após a descompressão do pacote tar.gz
         self.dir_package_files: str = None
 
-    def unpack(self):
-        print(f'Descompactando ... {self.appfile} em ... {self.app_dirs.get_temp_dir()}', end=' ')
-        mkdir(self.app_dirs.get_temp_dir())
+    def unpack(self, extract_dir: str = None, extractor: TarExtractor = None):
+        """
+           Descompacta o pacote em extract_dir (padrão: diretório temporário),
+        lendo o tar em modo stream.
+        """
+        if extract_dir is None:
+            extract_dir = self.app_dirs.get_temp_dir()
+
+        print(f'Descompactando ... {self.appfile} em ... {extract_dir}', end=' ')
+        mkdir(extract_dir)
         sys.stdout.flush()
-        unpack_archive(self.pkg_file().absolute(), extract_dir=self.app_dirs.get_temp_dir(), format='tar')
+        extract_tar_stream(self.pkg_file().absolute(), extract_dir, extractor)
         print('OK')
 
+    def _unpack_any(self, extract_dir: str) -> bool:
+        """
+           Descompacta o conteúdo de dir_package_files na raiz de extract_dir, a
+        partir do arquivo ou da url (self.pipeline), e grava o TreeManifest. Se
+        falhar (download, sha256 ou extração) extract_dir é removido.
+        """
+        manifest = TreeManifest()
+        extractor = TarExtractor(strip=self.dir_package_files, manifest=manifest)
+        try:
+            if self.pipeline:
+                if not self.unpack_from_url(extract_dir, extractor):
+                    rmdir(extract_dir)
+                    return False
+            else:
+                self.unpack(extract_dir, extractor)
+        except BaseException:
+            rmdir(extract_dir)
+            raise
+
+        manifest.save(extract_dir)
+        return True
+
+    def unpack_to(self, target_dir: str) -> bool:
+        """
+           Cria target_dir (que não deve existir) com o conteúdo do diretório
+        dir_package_files do pacote.
+
+        Com tree_cache, a primeira vez o pacote é descompactado direto em
+        target_dir e depois adicionado ao cache com reflink/hardlink (se o sistema
+        de arquivos não permitir o cache não é usado, os dados nunca são copiados).
+        Nas próximas vezes target_dir é criado a partir do cache com clone_tree(),
+        se a árvore do cache conferir com o manifest (TreeCache.check()). Uma
+        árvore alterada é removida do cache e o pacote é descompactado de novo
+        (baixado antes, se não estiver no disco).
+        """
+        if (self.tree_cache is None) or (self.hash is None):
+            return self._unpack_any(target_dir)
+
+        if self.tree_cache.contains(self.hash) and not self.tree_cache.check(self.hash):
+            print(f'{__class__.__name__} árvore do cache alterada, removendo ... {self.tree_cache.path(self.hash)}')
+            self.tree_cache.remove(self.hash)
+
+        if not self.tree_cache.contains(self.hash):
+            if (not self.pipeline) and (not self.pkg_file().exists()):
+                # Instalação a partir do cache (o pacote não foi baixado).
+                if not (self.download() and self.verify()):
+                    return False
+            if self._unpack_any(target_dir) is False:
+                return False
+            if self.tree_cache.add_tree(self.hash, target_dir, self.hardlink) and (self.cache_manager is not None):
+                self.cache_manager.touch(self.tree_cache.path(self.hash))
+            return True
+
+        print(f'Criando ... {target_dir} a partir do cache', end=' ')
+        sys.stdout.flush()
+        method = self.tree_cache.materialize(self.hash, target_dir, self.hardlink)
+        print(f'OK ({method})')
+
+        if self.cache_manager is not None:
+            self.cache_manager.touch(self.tree_cache.path(self.hash))
+        return True
+
+    def upgrade_to(self, installed_dir: str, target_dir: str) -> bool:
+        """
+           Cria target_dir (que não deve existir) com a nova versão do pacote a
+        partir da instalação atual em installed_dir, gravando apenas os arquivos
+        novos ou alterados:
+
+        - installed_dir é clonado em target_dir (reflink/hardlink, sem copiar dados).
+        - Cada arquivo do pacote é comparado (tamanho, modo e sha256) com o arquivo
+          instalado, os iguais são mantidos e os outros são gravados como novos
+          arquivos (o clone nunca é alterado no lugar).
+        - Arquivos que estavam no manifest da versão instalada e não existem na
+          nova versão são removidos. Sem manifest nada é removido, assim arquivos
+          criados pelo usuário (ex: perfil do navegador) nunca são apagados.
+        """
+        old_manifest = TreeManifest.load(installed_dir)
+        old_files = {} if old_manifest is None else old_manifest.files
+        stats = {'kept': 0, 'removed': 0}
+
+        def _unchanged(rel_path: str, member: tarfile.TarInfo, sha256: str) -> bool:
+            path = os.path.join(target_dir, rel_path)
+            try:
+                st = os.lstat(path)
+            except OSError:
+                return False
+            if (not stat.S_ISREG(st.st_mode)) or (st.st_size != member.size):
+                return False
+            if stat.S_IMODE(st.st_mode) != member.mode:
+                return False
+
+            entry = old_files.get(rel_path)
+            if (entry is not None) and (entry[0] == st.st_size) and (entry[1] == st.st_mtime_ns):
+                installed_hash = entry[2]
+            else:
+                installed_hash = get_file_hash(path)
+
+            kept = installed_hash == sha256
+            if kept:
+                stats['kept'] += 1
+            return kept
+
+        print(f'Atualizando ... {installed_dir}', end=' ')
+        sys.stdout.flush()
+        clone_tree(installed_dir, target_dir, hardlink=True)
+
+        manifest = TreeManifest()
+        extractor = TarExtractor(strip=self.dir_package_files, manifest=manifest, unchanged=_unchanged)
+        extract_tar_stream(self.pkg_file().absolute(), target_dir, extractor)
+
+        if old_manifest is not None:
+            for rel_path in old_manifest.paths() - manifest.paths():
+                path = os.path.join(target_dir, rel_path)
+                if os.path.lexists(path):
+                    os.remove(path)
+                    stats['removed'] += 1
+                # Remover os diretórios que ficaram vazios.
+                parent = os.path.dirname(path)
+                while (parent != target_dir) and os.path.isdir(parent) and (os.listdir(parent) == []):
+                    os.rmdir(parent)
+                    parent = os.path.dirname(parent)
+
+        manifest.save(target_dir)
+        print(f"OK ({stats['kept']} mantidos, {len(manifest.files) - stats['kept']} gravados, {stats['removed']} removidos)")
+        return True
+
+    def unpack_from_url(self, extract_dir: str, extractor: TarExtractor = None) -> bool:
+        """
+           Baixa e descompacta o pacote ao mesmo tempo (download_and_extract), sem
+        gravar o arquivo .tar no disco. Retorna False se o download falhar ou se
+        o sha256 não for igual a self.hash, e neste caso o conteúdo de extract_dir
+        não deve ser usado.
+        """
+        if self.hash is None:
+            print(f'ERRO ... {__class__.__name__} sha256 não pode ser None')
+            return False
+
+        print(f'Baixando e descompactando ... {self.appfile} em ... {extract_dir}')
+        hasher = _CountingHasher(hashlib.sha256())
+        if not download_and_extract(self.url, extract_dir, hasher, self.verbose, extractor=extractor, rate_limit=self.rate_limit):
+            return False
+
+        if (self.size is not None) and (hasher.count != self.size):
+            print(f'{__class__.__name__} FALHA ... {hasher.count} bytes baixados, o catálogo informa {self.size} bytes')
+            return False
+        if hasher.hasher.hexdigest() != self.hash.lower():
+            print(f'{__class__.__name__} FALHA ... sha256 não confere')
+            return False
+        return True
+
     def pkg_file(self) -> File:
         return File(os.path.join(self.save_dir, self.appfile))
 
@@ -1048,30 +3969,23 @@ class ShaSum(object):
     def __init__(self, data) -> None:
         super().__init__()
         self.data = data # data = arquivo/string/bytes
-        self.__bytes = None
 
-    def _get_bytes(self) -> bytes:
+    def _get_hash(self, algorithm: str) -> str:
         """
-        converte self.data para bytes e retorna bytes.
-        """
-        if self.__bytes is not None:
-            return self.__bytes
+           Calcula o hash de self.data usando o algoritmo 'algorithm'.
 
+        Arquivos são lidos em blocos por get_file_hash(), assim o uso de memória
+        é constante independente do tamanho do arquivo.
+        """
         if isinstance(self.data, bytes):
-            return self.data
+            return hashlib.new(algorithm, self.data).hexdigest()
 
         if isinstance(self.data, str):
             # Verificar se data é um texto ou um arquivo.
-
             if os.path.isfile(self.data):
-                try:
-                    with open(self.data, 'rb') as file:
-                        self.__bytes = file.read()
-                except Exception as e:
-                    print(e)
-            else:
-                self.__bytes = str.encode(self.data)
-            return self.__bytes
+                return get_file_hash(self.data, algorithm)
+            return hashlib.new(algorithm, str.encode(self.data)).hexdigest()
+        return None
 
     def check_md5(self, md5_string: str) -> bool:
         if len(md5_string) != 32:
@@ -1119,24 +4033,16 @@ class ShaSum(object):
 
 
     def getmd5(self) -> str:
-        if self._get_bytes() is None:
-            return None
-        return hashlib.md5(self._get_bytes()).hexdigest()
+        return self._get_hash('md5')
 
     def getsha1(self) -> str:
-        if self._get_bytes() is None:
-            return None
-        return hashlib.sha1(self._get_bytes()).hexdigest()
+        return self._get_hash('sha1')
 
     def getsha256(self) -> str:
-        if self._get_bytes() is None:
-            return None
-        return hashlib.sha256(self._get_bytes()).hexdigest()
+        return self._get_hash('sha256')
 
     def getsha512(self) -> str:
-        if self._get_bytes() is None:
-            return None
-        return hashlib.sha512(self._get_bytes()).hexdigest()
+        return self._get_hash('sha512')
 
 
 def main():
@@ -1,9 +1,10 @@
 #!/usr/bin/env python3
 
 import os
-import shutil
 import sys
+import time
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 from argparse import ArgumentParser
 
 __version__ = '1.1'
@@ -20,10 +21,24 @@ from conflib import (
     get_user_home,
     mkdir,
     rmdir,
+    get_staging_dir,
+    replace_dir,
     download_file,
+    configure_http_session,
+    configure_rate_limit,
     File,
     FileReader,
     FileJson,
+    ContentStore,
+    MirrorRanking,
+    HttpMetadataCache,
+    CatalogEntry,
+    PackageCatalog,
+    CacheManager,
+    TreeCache,
+    TreeManifest,
+    ByteSize,
+    parse_byte_size,
     BuilderAppDirs,
     BuilderUserDirs,
     UserDirs, 
@@ -33,8 +48,25 @@ from conflib import (
     PackageWinExe,
 )
 
-user_dirs: UserDirs = BuilderUserDirs().build_user_root(False).build()
-tor_installer_app_dirs: AppDirs = BuilderAppDirs().build_user_root(False).build_appname(__appname__).build()
+CONFIG_FILE = f'{__appname__}.json'
+
+# Criados no primeiro uso, ver get_user_dirs() e get_tor_installer_app_dirs().
+_user_dirs: UserDirs = None
+_tor_installer_app_dirs: AppDirs = None
+
+
+def get_user_dirs() -> UserDirs:
+    global _user_dirs
+    if _user_dirs is None:
+        _user_dirs = BuilderUserDirs().build_user_root(False).build()
+    return _user_dirs
+
+
+def get_tor_installer_app_dirs() -> AppDirs:
+    global _tor_installer_app_dirs
+    if _tor_installer_app_dirs is None:
+        _tor_installer_app_dirs = BuilderAppDirs().build_user_root(False).build_appname(__appname__).build()
+    return _tor_installer_app_dirs
 
 
 
@@ -48,18 +80,53 @@ class TorBrowserLinux(PackageTarGz):
             print(f'Remova a instalação atual do {self.app_dirs.appname} em ... {self.app_dirs.appdir()}')
             return False
 
-        self.unpack()
-        os.chdir(self.app_dirs.get_temp_dir())
-        
-        print(f'Copiando arquivos para ... {self.app_dirs.appdir()}')
-        shutil.copytree(self.dir_package_files, self.app_dirs.appdir())
-        os.chdir(self.app_dirs.appdir())
-        os.system('chmod +x ./start-tor-browser.desktop')
-        os.system('./start-tor-browser.desktop --register-app')
+        # Preparar ao lado de appdir() (mesmo sistema de arquivos) e depois mover
+        # com os.rename(), sem cópia e sem deixar appdir() incompleto.
+        staging_dir = get_staging_dir(self.app_dirs.appdir())
+        try:
+            if not self.unpack_to(staging_dir):
+                return False
+            replace_dir(staging_dir, self.app_dirs.appdir())
+        finally:
+            rmdir(staging_dir)
+
+        return self.register_app()
+
+    def upgrade(self):
+        """
+           Atualiza a instalação atual gravando apenas os arquivos que mudaram, em
+        um diretório ao lado de appdir() que depois substitui appdir().
+        """
+        if not Path(self.app_dirs.appdir()).exists():
+            return self.install()
+
+        staging_dir = get_staging_dir(self.app_dirs.appdir())
+        try:
+            if not self.upgrade_to(self.app_dirs.appdir(), staging_dir):
+                return False
+            replace_dir(staging_dir, self.app_dirs.appdir())
+        finally:
+            rmdir(staging_dir)
+
+        return self.register_app()
+
+    def register_app(self) -> bool:
+        """
+           Registra o atalho do Tor Browser no menu. Usa o caminho absoluto, sem
+        os.chdir(), porque os comandos podem rodar em threads (ExecuteCommands).
+        """
+        import subprocess
+
+        desktop_file = os.path.join(self.app_dirs.appdir(), 'start-tor-browser.desktop')
+        os.chmod(desktop_file, os.stat(desktop_file).st_mode | 0o111)
+        return subprocess.run([desktop_file, '--register-app'], cwd=self.app_dirs.appdir()).returncode == 0
 
     def uninstall(self):
         #print(f'Desinstalando ... {self.app_dirs.appname}')
-        rmdir(self.app_dirs.appdir())
+        if not Path(self.app_dirs.appdir()).exists():
+            print(f'{self.app_dirs.appname} não está instalado em ... {self.app_dirs.appdir()}')
+            return False
+        return rmdir(self.app_dirs.appdir())
         
 
 
@@ -72,18 +139,14 @@ class TorBrowserWindows(PackageWinExe):
 
 class BuilderTorBrowser(object):
     def __init__(self) -> None:
-        self._save_dir = tor_installer_app_dirs.app_cache_dir() 
+        self._save_dir = get_tor_installer_app_dirs().app_cache_dir() 
+        self._store_dir = get_tor_installer_app_dirs().app_cache_dir()
         self._appname = 'torbrowser'
-
-        if KERNEL_TYPE == 'Linux':
-            self._url = 'https://www.torproject.org/dist/torbrowser/11.0.14/tor-browser-linux64-11.0.14_pt-BR.tar.xz'
-            self._appfile = 'tor-browser-linux64-11.0.14_pt-BR.tar.xz'
-            self._hash = '380bd310e55ca10622fb9aac2e013d7cc38c1619201780b761919f32fe0e7486'
-            self._dir_project_files = 'tor-browser_pt-BR'
-        elif KERNEL_TYPE == 'Windows':
-            self._url = 'https://www.torproject.org/dist/torbrowser/11.0.14/torbrowser-install-win64-11.0.14_pt-BR.exe'
-            self._appfile = 'torbrowser-install-win64-11.0.14_pt-BR.exe'
-            self._hash = '3f2f67525d964ee86b42d78eec23baa05afc628d0610ad68027cf6a0f9a52a3d'
+        self._catalog_file = os.path.join(dir_of_project, 'catalog.json')
+        self._version = None # None usa a versão padrão do catálogo.
+        self._locale = None # None usa o idioma padrão do catálogo.
+        self._hash = None # Substitui o sha256 do catálogo.
+        self._tree_cache = False # Guardar o pacote descompactado (TreeCache).
    
     def build_save_dir(self, save_dir):
         self._save_dir = save_dir
@@ -93,31 +156,85 @@ class BuilderTorBrowser(object):
         self._hash = hash
         return self
 
+    def build_store_dir(self, store_dir):
+        self._store_dir = store_dir
+        return self
+
+    def build_tree_cache(self, tree_cache: bool):
+        self._tree_cache = tree_cache
+        return self
+
+    def build_catalog_file(self, catalog_file):
+        self._catalog_file = catalog_file
+        return self
+
+    def build_version(self, version):
+        self._version = version
+        return self
+
+    def build_locale(self, locale):
+        self._locale = locale
+        return self
+
     def build(self) -> PackageApp:
+        try:
+            catalog_file = self._catalog_file
+            if catalog_file.startswith(('http://', 'https://')):
+                # Baixado apenas quando mudar no servidor (ETag/Last-Modified).
+                catalog_file = HttpMetadataCache(self._save_dir).get_file(catalog_file)
+            entry: CatalogEntry = PackageCatalog(catalog_file, self._save_dir).get(self._appname, self._version, self._locale)
+        except Exception as e:
+            print(e)
+            sys.exit(1)
+        if entry is None:
+            print(f'{__class__.__name__} ERRO {self._appname} {self._version or ""} {self._locale or ""} não encontrado no catálogo ... {self._catalog_file}')
+            sys.exit(1)
         
         if KERNEL_TYPE == 'Linux':
-            tb: PackageTarGz = TorBrowserLinux(self._appname, self._appfile, self._save_dir)
-            tb.dir_package_files = self._dir_project_files
+            if entry.dir_package_files is None:
+                print(f'{__class__.__name__} ERRO {entry} sem dir_package_files no catálogo ... {self._catalog_file}')
+                sys.exit(1)
+            tb: PackageTarGz = TorBrowserLinux(self._appname, entry.appfile, self._save_dir)
+            tb.dir_package_files = entry.dir_package_files
         elif KERNEL_TYPE == 'Windows':
-            tb: PackageWinExe = PackageWinExe(self._appname, self._appfile, self._save_dir)
+            tb: PackageWinExe = PackageWinExe(self._appname, entry.appfile, self._save_dir)
         else:
             print(f'{__class__.__name__} ERRO sistema não suportado')
             sys.exit(1)
         
-        tb.hash = self._hash
-        tb.url = self._url
+        tb.version = entry.version
+        tb.size = entry.size
+        tb.hash = self._hash or entry.hash
+        tb.url = entry.url
+        tb.mirrors = entry.mirrors
+        tb.mirror_ranking = MirrorRanking(os.path.join(self._save_dir, 'mirrors.json'))
+        tb.content_store = ContentStore(self._store_dir)
+        tb.cache_manager = CacheManager(self._save_dir)
+        if self._tree_cache and isinstance(tb, PackageTarGz):
+            tb.tree_cache = TreeCache(self._save_dir)
         return tb
 
 
 class CommandApp(object):
+    # Recurso usado pelo comando, ver ExecuteCommands.
+    resource: str = 'cpu'
+
     def __init__(self) -> None:
         pass
 
+    def name(self) -> str:
+        app = getattr(self, 'app', None)
+        if app is None:
+            return self.__class__.__name__
+        return f'{self.__class__.__name__}({app.app_dirs.appname})'
+
     def execute(self):
         pass
 
 
 class CommandDownloadApp(CommandApp):
+    resource: str = 'net'
+
     def __init__(self, app: PackageApp) -> None:
         super().__init__()
         self.app: PackageApp = app
@@ -127,7 +244,10 @@ class CommandDownloadApp(CommandApp):
         return self.app.download()
 
 
-class CommandInstallApp(CommandApp):
+class CommandVerifyApp(CommandApp):
+    """Confere o sha256 do pacote baixado."""
+    resource: str = 'cpu'
+
     def __init__(self, app: PackageApp) -> None:
         super().__init__()
         self.app: PackageApp = app
@@ -138,12 +258,112 @@ class CommandInstallApp(CommandApp):
         if not self.app.verify():
             print(f'FALHA')
             return False
-        print('OK') 
+        print('OK')
+        return True
+
+
+class CommandInstallApp(CommandApp):
+    """Instala o pacote, deve depender de CommandVerifyApp."""
+    resource: str = 'cpu'
+
+    def __init__(self, app: PackageApp) -> None:
+        super().__init__()
+        self.app: PackageApp = app
+
+    def execute(self):
         #print(f'[INSTALANDO] ... {self.app.app_dirs.appname}')
         return self.app.install()
 
 
+class CommandPipelineInstallApp(CommandApp):
+    """
+       Baixa, confere e instala o pacote em uma única passagem (PackageApp.pipeline),
+    sem gravar o arquivo do pacote no disco.
+    """
+    resource: str = 'net'
+
+    def __init__(self, app: PackageApp) -> None:
+        super().__init__()
+        self.app: PackageApp = app
+
+    def execute(self):
+        self.app.pipeline = True
+        return self.app.install()
+
+
+class CommandUpgradeApp(CommandApp):
+    """Atualiza a instalação atual, deve depender de CommandVerifyApp."""
+    resource: str = 'cpu'
+
+    def __init__(self, app: PackageApp) -> None:
+        super().__init__()
+        self.app: PackageApp = app
+
+    def execute(self):
+        return self.app.upgrade()
+
+
+class CommandInstallTreeApp(CommandApp):
+    """
+       Instala a partir da árvore já descompactada no TreeCache. O pacote não é
+    baixado nem conferido, a árvore só entra no cache depois do sha256 conferido.
+    Se a árvore do cache tiver sido alterada, o pacote é baixado e conferido
+    (ver PackageTarGz.unpack_to()).
+    """
+    resource: str = 'disk'
+
+    def __init__(self, app: PackageApp) -> None:
+        super().__init__()
+        self.app: PackageApp = app
+
+    def execute(self):
+        return self.app.install()
+
+
+class CommandCheckInstalledApp(CommandApp):
+    """
+       Confere os arquivos instalados em appdir() com o manifest gravado na
+    instalação, relendo apenas os arquivos com tamanho/mtime alterados.
+    """
+    resource: str = 'cpu'
+
+    def __init__(self, app: PackageApp, workers: int = 1, full: bool = False) -> None:
+        super().__init__()
+        self.app: PackageApp = app
+        self.workers: int = workers
+        self.full: bool = full
+
+    def execute(self):
+        appdir = self.app.app_dirs.appdir()
+        print(f'[CHECANDO INSTALAÇÃO] ... {appdir}', end=' ')
+        sys.stdout.flush()
+
+        manifest: TreeManifest = TreeManifest.load(appdir)
+        if manifest is None:
+            print('FALHA ... manifest não encontrado, reinstale o pacote')
+            return False
+
+        result = manifest.check(appdir, self.workers, self.full)
+        # Arquivos fora do pacote (ex: perfil do navegador) são apenas contados.
+        extra = len(result['extra'])
+        if (result['missing'] == []) and (result['modified'] == []):
+            print(f"OK ({result['ok']} arquivos, {extra} fora do pacote)")
+            return True
+
+        print(
+            f"FALHA ({result['ok']} OK, {len(result['missing'])} ausentes, "
+            f"{len(result['modified'])} alterados, {extra} fora do pacote)"
+        )
+        for rel_path in result['missing']:
+            print(f'  [AUSENTE] ... {rel_path}')
+        for rel_path in result['modified']:
+            print(f'  [ALTERADO] ... {rel_path}')
+        return False
+
+
 class CommandUninstallApp(CommandApp):
+    resource: str = 'disk'
+
     def __init__(self, app: PackageApp) -> None:
         super().__init__()
         self.app: PackageApp = app
@@ -153,18 +373,157 @@ class CommandUninstallApp(CommandApp):
         return self.app.uninstall()
 
 
-class ExecuteCommands(object):
-    def __init__(self) -> None:
-        self._commands: list = []
+class CommandCacheGc(CommandApp):
+    resource: str = 'disk'
 
-    def add_command(self, command: CommandApp):
-        self._commands.append(command)
+    def __init__(self, cache_manager: CacheManager) -> None:
+        super().__init__()
+        self.cache_manager: CacheManager = cache_manager
+
+    def execute(self):
+        print(f'[LIMPANDO CACHE] ... {self.cache_manager.cache_dir}', end=' ')
+        sys.stdout.flush()
+        removed, freed = self.cache_manager.gc()
+        print(f'{removed} arquivo(s) removido(s), {ByteSize(freed) if freed > 0 else "0 B"} liberado(s)')
+        return True
 
-    def run(self):
-        command: CommandApp = None
-        for command in self._commands:
-            command.execute()
 
+class ExecuteCommands(object):
+    """
+       Executa os comandos respeitando as dependências declaradas em add_command()
+    (ex: baixar -> conferir -> instalar de cada pacote). Comandos independentes
+    rodam ao mesmo tempo, limitados por recurso (CommandApp.resource):
+
+       'net'  - rede, em threads.
+       'cpu'  - sha256/descompressão. Rodam em threads porque hashlib, lzma e o
+                processo xz liberam o GIL e os comandos alteram o PackageApp.
+       'disk' - gravação/remoção em disco.
+
+    Quando só um comando pode rodar (ex: uma sequência baixar -> conferir ->
+    instalar) ele é executado na thread atual, sem pool de threads. Se um
+    comando retornar False, os que dependem dele não são executados.
+    """
+    DEFAULT_LIMITS: dict = {
+        'net': 4,
+        'cpu': os.cpu_count() or 1,
+        'disk': 1,
+    }
+
+    def __init__(self, limits: dict = None) -> None:
+        self._commands: list = []
+        self._depends: dict = {}
+        self.limits: dict = dict(self.DEFAULT_LIMITS)
+        if limits is not None:
+            self.limits.update(limits)
+        # [(comando, segundos, resultado)], na ordem em que terminaram.
+        self.timings: list = []
+
+    def add_command(self, command: CommandApp, depends: list = None) -> CommandApp:
+        self._commands.append(command)
+        self._depends[command] = list(depends or [])
+        return command
+
+    def run(self) -> bool:
+        """Retorna False se algum comando falhou ou não foi executado."""
+        pending: list = list(self._commands)
+        done: dict = {}
+        running: dict = {}
+        busy: dict = {}
+        ok = True
+        error = None
+        thread_pool = None
+
+        def _finish(command: CommandApp, start: float, result) -> None:
+            nonlocal ok
+            done[command] = (result is not False)
+            ok = ok and done[command]
+            self.timings.append((command, time.perf_counter() - start, done[command]))
+
+        try:
+            while pending or running:
+                ready = []
+                for command in list(pending):
+                    if error is not None:
+                        break
+                    depends = self._depends[command]
+                    if any(done.get(dep) is False for dep in depends):
+                        # Uma dependência falhou.
+                        pending.remove(command)
+                        done[command] = False
+                        ok = False
+                        continue
+                    if not all(dep in done for dep in depends):
+                        continue
+                    resource = command.resource
+                    if busy.get(resource, 0) >= self.limits.get(resource, 1):
+                        continue
+
+                    pending.remove(command)
+                    busy[resource] = busy.get(resource, 0) + 1
+                    ready.append(command)
+
+                if (len(ready) == 1) and (not running):
+                    # Nada para rodar em paralelo, executar na thread atual.
+                    command = ready[0]
+                    busy[command.resource] -= 1
+                    start = time.perf_counter()
+                    try:
+                        result = command.execute()
+                    except Exception as err:
+                        result = False
+                        error = err
+                    _finish(command, start, result)
+                    continue
+
+                for command in ready:
+                    if thread_pool is None:
+                        thread_pool = ThreadPoolExecutor(max_workers=max(1, sum(self.limits.values())))
+                    running[thread_pool.submit(command.execute)] = (command, time.perf_counter())
+
+                if (error is not None) or (not running):
+                    # Erro, ou dependências que nunca vão terminar (não adicionadas).
+                    ok = ok and not pending
+                    pending.clear()
+                if not running:
+                    continue
+
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    command, start = running.pop(future)
+                    busy[command.resource] -= 1
+                    try:
+                        result = future.result()
+                    except Exception as err:
+                        result = False
+                        if error is None:
+                            error = err
+                    _finish(command, start, result)
+        except KeyboardInterrupt:
+            # Não esperar os comandos que ainda não começaram.
+            if thread_pool is not None:
+                thread_pool.shutdown(wait=False, cancel_futures=True)
+                thread_pool = None
+            raise
+        finally:
+            if thread_pool is not None:
+                thread_pool.shutdown()
+
+        if error is not None:
+            raise error
+        return ok
+
+    def print_timings(self):
+        for command, seconds, result in self.timings:
+            print(f'[TEMPO] ... {command.name()} {seconds:.2f}s {"OK" if result else "FALHA"}')
+
+
+
+def get_config() -> dict:
+    """Conteúdo do arquivo de configuração (json) do tor-installer, se existir."""
+    config_file: FileJson = get_tor_installer_app_dirs().app_json_conf(CONFIG_FILE)
+    if not config_file.exists():
+        return {}
+    return config_file.lines_to_dict()
 
 
 def main():
@@ -191,28 +550,232 @@ def main():
         help='Desinstalar o Navegador Tor.'
     )
 
+    parser.add_argument(
+        '--upgrade',
+        action='store_true',
+        dest='upgrade_tor',
+        help='Atualizar o Navegador Tor instalado, gravando apenas os arquivos alterados.'
+    )
+
+    parser.add_argument(
+        '--check-installed',
+        action='store_true',
+        dest='check_installed',
+        help='Conferir os arquivos instalados com o manifest gravado na instalação.'
+    )
+
+    parser.add_argument(
+        '--full',
+        action='store_true',
+        dest='full_check',
+        help='Com --check-installed, reler todos os arquivos e não só os alterados.'
+    )
+
+    parser.add_argument(
+        '-j', '--jobs',
+        type=int,
+        default=1,
+        dest='jobs',
+        help='Número de processos usados para calcular o sha256 em --check-installed.'
+    )
+
+    parser.add_argument(
+        '--timings',
+        action='store_true',
+        dest='timings',
+        help='Mostrar o tempo de cada etapa executada.'
+    )
+
+    parser.add_argument(
+        '--cache-gc',
+        action='store_true',
+        dest='cache_gc',
+        help='Remover pacotes antigos do cache até respeitar --cache-max-size/--cache-max-age.'
+    )
+
+    parser.add_argument(
+        '--cache-max-size',
+        dest='cache_max_size',
+        default='2G',
+        help='Tamanho máximo do cache de pacotes, ex: 500M, 2G (padrão 2G).'
+    )
+
+    parser.add_argument(
+        '--cache-max-age',
+        type=float,
+        dest='cache_max_age',
+        default=None,
+        help='Remover do cache pacotes sem uso há mais de N dias.'
+    )
+
+    parser.add_argument(
+        '-c', '--connections',
+        type=int,
+        default=1,
+        dest='connections',
+        help='Número de conexões paralelas usadas no download (padrão 1).'
+    )
+
+    parser.add_argument(
+        '--app-version',
+        dest='app_version',
+        help='Versão do Navegador Tor (do catálogo), o padrão é a versão padrão do catálogo.'
+    )
+
+    parser.add_argument(
+        '--locale',
+        dest='locale',
+        help='Idioma do Navegador Tor (do catálogo), ex: pt-BR, en-US.'
+    )
+
+    parser.add_argument(
+        '--catalog',
+        dest='catalog',
+        help='Usar outro arquivo de catálogo (json), local ou uma url http(s).'
+    )
+
+    parser.add_argument(
+        '--asyncio',
+        action='store_true',
+        dest='use_asyncio',
+        help='Baixar com o backend asyncio (usa o aiohttp se estiver instalado).'
+    )
+
+    parser.add_argument(
+        '--pipeline',
+        action='store_true',
+        dest='pipeline',
+        help='Baixar, conferir e descompactar ao mesmo tempo, sem gravar o pacote no disco.'
+    )
+
+    parser.add_argument(
+        '--tree-cache',
+        action='store_true',
+        dest='tree_cache',
+        help='Guardar o pacote descompactado no cache (com reflink/hardlink) para reinstalar sem descompactar.'
+    )
+
+    parser.add_argument(
+        '--hardlink',
+        action='store_true',
+        dest='hardlink',
+        help='Instalar com hardlinks a partir do cache quando reflink não for suportado.'
+    )
+
+    parser.add_argument(
+        '--store-dir',
+        dest='store_dir',
+        default=None,
+        help='Diretório do cache de pacotes por sha256, pode ser compartilhado entre usuários.'
+    )
+
+    parser.add_argument(
+        '--limit-rate',
+        dest='limit_rate',
+        default=None,
+        help=f'Vazão máxima somada de todos os downloads, ex: 2M (bytes/s). Também pode ser definida em "limit_rate" no arquivo de configuração ({CONFIG_FILE}).'
+    )
+
+    parser.add_argument(
+        '--limit-rate-per-download',
+        dest='limit_rate_per_download',
+        default=None,
+        help='Vazão máxima de cada download, ex: 500K (bytes/s). Também pode ser definida em "limit_rate_per_download" no arquivo de configuração.'
+    )
+
+    parser.add_argument(
+        '-q', '--quiet',
+        action='store_true',
+        dest='quiet',
+        help='Não mostrar a barra de progresso do download.'
+    )
+
 
     args = parser.parse_args()
      
-    tor_app: PackageApp = BuilderTorBrowser().build()
+    builder_tor = BuilderTorBrowser()
+    if args.store_dir is not None:
+        builder_tor.build_store_dir(get_abspath(args.store_dir))
+    if args.catalog is not None:
+        if args.catalog.startswith(('http://', 'https://')):
+            builder_tor.build_catalog_file(args.catalog)
+        else:
+            builder_tor.build_catalog_file(get_abspath(args.catalog))
+    builder_tor.build_version(args.app_version).build_locale(args.locale).build_tree_cache(args.tree_cache)
+
+    tor_app: PackageApp = builder_tor.build()
+    tor_app.connections = max(1, args.connections)
+    configure_http_session(pool_size=max(10, tor_app.connections))
+    tor_app.verbose = not args.quiet
+    tor_app.hardlink = args.hardlink
+    tor_app.use_asyncio = args.use_asyncio
+
+    # Limites de vazão: a linha de comando tem prioridade sobre o arquivo de configuração.
+    config = get_config()
+    limit_rate = args.limit_rate or config.get('limit_rate')
+    limit_rate_per_download = args.limit_rate_per_download or config.get('limit_rate_per_download')
+    configure_rate_limit(parse_byte_size(limit_rate) if limit_rate else None)
+    tor_app.rate_limit = parse_byte_size(limit_rate_per_download) if limit_rate_per_download else None
     execute_commands = ExecuteCommands()
+    ok = True
+
+    if args.upgrade_tor and isinstance(tor_app, TorBrowserLinux):
+        mkdir(tor_app.save_dir)
+        cmd_download = execute_commands.add_command(CommandDownloadApp(tor_app))
+        cmd_verify = execute_commands.add_command(CommandVerifyApp(tor_app), [cmd_download])
+        execute_commands.add_command(CommandUpgradeApp(tor_app), [cmd_verify])
+        ok = execute_commands.run()
+
+    elif args.install_tor and isinstance(tor_app, PackageTarGz) and (tor_app.tree_cache is not None) and tor_app.tree_cache.contains(tor_app.hash):
+        execute_commands.add_command(CommandInstallTreeApp(tor_app))
+        ok = execute_commands.run()
+
+    elif args.install_tor and args.pipeline and isinstance(tor_app, PackageTarGz) and not tor_app.is_cached():
+        execute_commands.add_command(CommandPipelineInstallApp(tor_app))
+        ok = execute_commands.run()
 
-    if args.install_tor:
+    elif args.install_tor:
         mkdir(tor_app.save_dir)
 
         cmd_download = CommandDownloadApp(tor_app)
+        cmd_verify = CommandVerifyApp(tor_app)
         cmd_install = CommandInstallApp(tor_app)
         
         execute_commands.add_command(cmd_download)
-        execute_commands.add_command(cmd_install)
-        execute_commands.run()
+        execute_commands.add_command(cmd_verify, [cmd_download])
+        execute_commands.add_command(cmd_install, [cmd_verify])
+        ok = execute_commands.run()
             
     elif args.uninstall_tor:
         cmd_uninstall = CommandUninstallApp(tor_app)
         execute_commands.add_command(cmd_uninstall)
-        execute_commands.run()
+        ok = execute_commands.run()
+
+    elif args.check_installed:
+        execute_commands.add_command(CommandCheckInstalledApp(tor_app, max(1, args.jobs), args.full_check))
+        ok = execute_commands.run()
+
+    if args.timings:
+        execute_commands.print_timings()
+
+    if args.cache_gc:
+        execute_commands = ExecuteCommands()
+        max_age = None if args.cache_max_age is None else args.cache_max_age * 86400
+        cache_dirs = [tor_app.save_dir]
+        if tor_app.content_store.root_dir not in cache_dirs:
+            cache_dirs.append(tor_app.content_store.root_dir)
+
+        for cache_dir in cache_dirs:
+            cache_manager = CacheManager(cache_dir, parse_byte_size(args.cache_max_size), max_age)
+            execute_commands.add_command(CommandCacheGc(cache_manager))
+        ok = execute_commands.run() and ok
+        if args.timings:
+            execute_commands.print_timings()
+
+    # Código de saída 1 se algum comando falhou (ex: --check-installed com arquivos alterados).
+    return 0 if ok else 1
 
    
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
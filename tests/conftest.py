@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+#
+import os
+import re
+import threading
+import time
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from conflib.common import configure_http_session
+
+
+class _RangeHandler(BaseHTTPRequestHandler):
+    """Serve os arquivos de 'root', com HTTP Range (se 'ranges'), ETag e Last-Modified."""
+    protocol_version = 'HTTP/1.1'
+    root: str = None
+    ranges: bool = True
+    delay: float = 0.0
+    requests: list = None
+
+    def log_message(self, *args) -> None:
+        pass
+
+    def _send(self, body: bool) -> None:
+        self.requests.append((self.command, self.path, self.headers.get('Range')))
+        if self.delay > 0:
+            time.sleep(self.delay)
+        path = os.path.join(self.root, self.path.lstrip('/').split('?')[0])
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+
+        size = os.path.getsize(path)
+        start, end, code = 0, size - 1, 200
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range') or '')
+        if match and self.ranges:
+            start = int(match.group(1))
+            end = min(int(match.group(2)) if match.group(2) else size - 1, size - 1)
+            code = 206
+
+        mtime = int(os.path.getmtime(path))
+        etag = f'"{size}-{mtime}"'
+        if self.headers.get('If-None-Match') is not None:
+            not_modified = self.headers.get('If-None-Match') == etag
+        elif self.headers.get('If-Modified-Since') is not None:
+            not_modified = parsedate_to_datetime(self.headers.get('If-Modified-Since')).timestamp() >= mtime
+        else:
+            not_modified = False
+        if not_modified:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(code)
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', formatdate(mtime, usegmt=True))
+        if self.ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        if code == 206:
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        self.end_headers()
+        if not body:
+            return
+
+        with open(path, 'rb') as fp:
+            fp.seek(start)
+            self.wfile.write(fp.read(end - start + 1))
+
+    def do_GET(self) -> None:
+        self._send(True)
+
+    def do_HEAD(self) -> None:
+        self._send(False)
+
+
+def _serve(root):
+    """Inicia um servidor servindo root, retorna o handler (handler.server é o servidor)."""
+    root.mkdir()
+    handler = type('Handler', (_RangeHandler,), {'root': str(root), 'requests': []})
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    handler.url = f'http://127.0.0.1:{server.server_address[1]}'
+    handler.server = server
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return handler
+
+
+def _stop(handler) -> None:
+    if handler.server is not None:
+        handler.server.shutdown()
+        handler.server.server_close()
+        handler.server = None
+
+
+@pytest.fixture
+def http_server(tmp_path):
+    """
+       Servidor HTTP local servindo tmp_path/www. Retorna o handler, com
+    handler.root (diretório), handler.url (url base), handler.ranges,
+    handler.delay (espera antes de cada resposta) e handler.requests (lista de
+    (método, caminho, Range)).
+    """
+    handler = _serve(tmp_path / 'www')
+    yield handler
+    _stop(handler)
+
+
+@pytest.fixture
+def http_server2(tmp_path):
+    """Segundo servidor, igual a http_server, servindo tmp_path/www2. Use stop() para desligá-lo."""
+    handler = _serve(tmp_path / 'www2')
+    handler.stop = lambda: _stop(handler)
+    yield handler
+    _stop(handler)
+
+
+@pytest.fixture
+def no_retries():
+    """Sessão HTTP sem novas tentativas, para os erros de conexão falharem na hora."""
+    configure_http_session(retries=0)
+    yield
+    configure_http_session()
@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+#
+import os
+import threading
+
+from conflib.common import CacheManager, ContentStore, TreeCache, get_file_hash
+
+
+def _write(path: str, size: int, mtime: float = None) -> str:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as fp:
+        fp.write(b'x' * size)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def test_gc_removes_only_packages(tmp_path):
+    cache_dir = str(tmp_path)
+    old = 1_000_000
+    package = _write(os.path.join(cache_dir, 'tb.tar.xz'), 1000, old)
+    ContentStore(cache_dir).add(package)
+    tree = os.path.join(cache_dir, TreeCache.SUBDIR, get_file_hash(package))
+    _write(os.path.join(tree, 'Browser', 'firefox'), 1000, old)
+    os.utime(tree, (old, old))
+
+    keep = [
+        _write(os.path.join(cache_dir, 'novo.tar.xz.part'), 1000, old),
+        _write(os.path.join(cache_dir, 'novo.tar.xz.part.json'), 10, old),
+        _write(os.path.join(cache_dir, 'mirrors.json'), 10, old),
+        _write(os.path.join(cache_dir, 'http-metadata', 'ab12'), 1000, old),
+        _write(os.path.join(cache_dir, TreeCache.SUBDIR, f'{"0" * 64}.staging-1', 'arquivo'), 1000, old),
+    ]
+
+    cache_manager = CacheManager(cache_dir, max_bytes=0)
+    assert sorted(p for group in cache_manager.entries() for p in group['paths']) == sorted([
+        'tb.tar.xz',
+        os.path.relpath(ContentStore(cache_dir).path(get_file_hash(package)), cache_dir),
+        os.path.relpath(tree, cache_dir),
+    ])
+
+    removed, freed = cache_manager.gc()
+    assert (removed, freed) == (3, 2000)
+    assert all(os.path.exists(path) for path in keep)
+    assert not os.path.exists(package)
+    assert not os.path.exists(tree)
+
+
+def test_gc_keeps_recent_packages(tmp_path):
+    cache_dir = str(tmp_path)
+    old_package = _write(os.path.join(cache_dir, 'old.tar.xz'), 1000, 1_000_000)
+    new_package = _write(os.path.join(cache_dir, 'new.tar.xz'), 1000)
+    cache_manager = CacheManager(cache_dir, max_bytes=1500)
+    cache_manager.touch(new_package)
+
+    assert cache_manager.gc() == (1, 1000)
+    assert not os.path.exists(old_package)
+    assert os.path.exists(new_package)
+
+
+def test_touch_concurrent_keeps_all_entries(tmp_path):
+    cache_dir = str(tmp_path)
+    files = [_write(os.path.join(cache_dir, f'pkg{i}.tar.xz'), 10) for i in range(20)]
+
+    # Um CacheManager por thread, como processos diferentes usando o mesmo cache.
+    threads = [threading.Thread(target=CacheManager(cache_dir).touch, args=(file,)) for file in files]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    index = CacheManager(cache_dir)._load_index()
+    assert sorted(index) == sorted(os.path.basename(file) for file in files)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+#
+import json
+import os
+import time
+
+from conflib.common import CacheManager, PackageCatalog, PackageTarGz, get_file_hash
+
+
+def _write_catalog(path: str, versions: int = 1, locales: tuple = ('pt-BR', 'en-US')) -> None:
+    releases = {}
+    for num in range(versions):
+        version = f'11.0.{num}'
+        releases[version] = {
+            'Linux': {
+                locale: {
+                    'url': f'https://dist.torproject.org/torbrowser/{version}/tb-{version}_{locale}.tar.xz',
+                    'sha256': f'{num:064x}',
+                    'size': 1000 + num,
+                    'mirrors': [],
+                }
+                for locale in locales
+            }
+        }
+    if 'pt-BR' in locales:
+        releases['11.0.0']['Linux']['pt-BR']['dir_package_files'] = 'tor-browser'
+
+    catalog = {
+        'torbrowser': {
+            'default_version': '11.0.0',
+            'default_locale': 'pt-BR',
+            'dir_package_files': 'tor-browser_{locale}',
+            'releases': releases,
+        }
+    }
+    with open(path, 'w', encoding='utf8') as fp:
+        json.dump(catalog, fp)
+
+
+def test_get_entry_and_dir_package_files(tmp_path):
+    catalog_file = str(tmp_path / 'catalog.json')
+    _write_catalog(catalog_file, versions=2)
+    catalog = PackageCatalog(catalog_file)
+
+    entry = catalog.get('torbrowser', platform='Linux')
+    assert (entry.version, entry.locale, entry.size) == ('11.0.0', 'pt-BR', 1000)
+    # dir_package_files do próprio item tem prioridade sobre o modelo.
+    assert entry.dir_package_files == 'tor-browser'
+
+    entry = catalog.get('torbrowser', '11.0.1', 'en-US', 'Linux')
+    assert entry.dir_package_files == 'tor-browser_en-US'
+    assert entry.appfile == 'tb-11.0.1_en-US.tar.xz'
+
+    assert catalog.get('torbrowser', '9.0', 'en-US', 'Linux') is None
+    assert catalog.get('outro', platform='Linux') is None
+
+
+def test_index_reads_only_the_entry(tmp_path):
+    catalog_file = str(tmp_path / 'catalog.json')
+    index_dir = str(tmp_path / 'cache')
+    _write_catalog(catalog_file, versions=5000)
+
+    first = PackageCatalog(catalog_file, index_dir)
+    assert first.get('torbrowser', '11.0.4999', 'en-US', 'Linux').size == 5999
+
+    # Com o índice gravado o catálogo não é lido de novo.
+    catalog = PackageCatalog(catalog_file, index_dir)
+    start = time.perf_counter()
+    entry = catalog.get('torbrowser', '11.0.4321', 'en-US', 'Linux')
+    elapsed = time.perf_counter() - start
+    assert catalog._content is None
+    assert (entry.size, entry.dir_package_files) == (5321, 'tor-browser_en-US')
+    assert catalog.get('torbrowser', platform='Linux').version == '11.0.0'
+    assert catalog.get('torbrowser', '11.0.9999', 'en-US', 'Linux') is None
+    print(f'\nget() com índice (10000 itens): {elapsed * 1000:.2f} ms')
+
+
+def test_index_rebuilt_when_catalog_changes(tmp_path):
+    catalog_file = str(tmp_path / 'catalog.json')
+    index_dir = str(tmp_path / 'cache')
+    _write_catalog(catalog_file, versions=2)
+    assert PackageCatalog(catalog_file, index_dir).get('torbrowser', '11.0.1', 'pt-BR', 'Linux') is not None
+
+    _write_catalog(catalog_file, versions=3, locales=('es-ES',))
+    os.utime(catalog_file, ns=(0, 10**18))
+    catalog = PackageCatalog(catalog_file, index_dir)
+    assert catalog.get('torbrowser', '11.0.1', 'pt-BR', 'Linux') is None
+    assert catalog.get('torbrowser', '11.0.2', 'es-ES', 'Linux').size == 1002
+
+
+def test_verify_checks_catalog_size(tmp_path):
+    package = tmp_path / 'tb.tar.xz'
+    package.write_bytes(b'pacote')
+    app = PackageTarGz('torbrowser', 'tb.tar.xz', str(tmp_path))
+    app.hash = get_file_hash(str(package))
+
+    app.size = len(b'pacote') + 1
+    assert not app.verify()
+
+    app.size = len(b'pacote')
+    assert app.verify()
+
+
+def test_verify_missing_package(tmp_path):
+    app = PackageTarGz('torbrowser', 'tb.tar.xz', str(tmp_path))
+    app.hash = '0' * 64
+    app.size = 10
+    assert not app.verify()
+
+
+def test_gc_keeps_catalog_index(tmp_path):
+    catalog_file = str(tmp_path / 'catalog.json')
+    cache_dir = tmp_path / 'cache'
+    _write_catalog(catalog_file)
+    assert PackageCatalog(catalog_file, str(cache_dir)).get('torbrowser', platform='Linux') is not None
+
+    package = cache_dir / 'tb.tar.xz'
+    package.write_bytes(b'x' * 100)
+    index_files = os.listdir(cache_dir / PackageCatalog.SUBDIR)
+    assert len(index_files) == 1
+
+    CacheManager(str(cache_dir), max_bytes=0).gc()
+    assert not package.exists()
+    assert os.listdir(cache_dir / PackageCatalog.SUBDIR) == index_files
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+#
+import os
+import time
+
+import pytest
+
+from conflib.common import (
+    AppDirsLinux,
+    AppDirsWindows,
+    BuilderAppDirs,
+    get_euid,
+    invalidate_dirs_cache,
+    makedirs_batch,
+)
+
+
+@pytest.fixture
+def user_env(monkeypatch, tmp_path):
+    """Usuário comum (euid 1000) com HOME em tmp_path e sem variáveis XDG."""
+    monkeypatch.setattr(os, 'geteuid', lambda: 1000)
+    monkeypatch.setenv('HOME', str(tmp_path / 'home1'))
+    for var in ('XDG_CONFIG_HOME', 'XDG_CACHE_HOME', 'XDG_DATA_HOME', 'XDG_STATE_HOME', 'XDG_BIN_HOME'):
+        monkeypatch.delenv(var, raising=False)
+    invalidate_dirs_cache()
+    yield tmp_path
+    monkeypatch.undo()
+    invalidate_dirs_cache()
+
+
+def _app_dirs() -> AppDirsLinux:
+    return BuilderAppDirs().build_appname('tor-installer').build_user_root(False).build()
+
+
+def test_invalidate_resets_memoized_paths(user_env, monkeypatch):
+    app_dirs = _app_dirs()
+    assert app_dirs.app_cache_dir() == str(user_env / 'home1' / '.cache' / 'tor-installer')
+
+    # O objeto guarda os caminhos já resolvidos até invalidate_dirs_cache().
+    monkeypatch.setenv('HOME', str(user_env / 'home2'))
+    assert app_dirs.app_cache_dir() == str(user_env / 'home1' / '.cache' / 'tor-installer')
+
+    invalidate_dirs_cache()
+    assert app_dirs.app_cache_dir() == str(user_env / 'home2' / '.cache' / 'tor-installer')
+    assert app_dirs.appdir() == str(user_env / 'home2' / '.local' / 'opt' / 'tor-installer')
+
+
+def test_new_objects_follow_environment(user_env, monkeypatch):
+    assert _app_dirs().app_config_dir() == str(user_env / 'home1' / '.config' / 'tor-installer')
+
+    monkeypatch.setenv('XDG_CONFIG_HOME', str(user_env / 'config'))
+    assert _app_dirs().app_config_dir() == str(user_env / 'config' / 'tor-installer')
+
+
+def test_invalidate_resets_euid(user_env, monkeypatch):
+    assert get_euid() == 1000
+    assert not _app_dirs().user_root
+
+    monkeypatch.setattr(os, 'geteuid', lambda: 0)
+    assert get_euid() == 1000
+
+    invalidate_dirs_cache()
+    assert get_euid() == 0
+    assert _app_dirs().user_root
+    assert _app_dirs().app_cache_dir() == '/var/cache/tor-installer'
+
+
+def test_xdg_variables_override_home(user_env, monkeypatch):
+    for var, name in (('XDG_CONFIG_HOME', 'config'), ('XDG_CACHE_HOME', 'cache'), ('XDG_BIN_HOME', 'bin')):
+        monkeypatch.setenv(var, str(user_env / name))
+    # Valores relativos são ignorados, como na especificação.
+    monkeypatch.setenv('XDG_DATA_HOME', 'relativo/share')
+
+    app_dirs = _app_dirs()
+    assert app_dirs.app_config_dir() == str(user_env / 'config' / 'tor-installer')
+    assert app_dirs.app_cache_dir() == str(user_env / 'cache' / 'tor-installer')
+    assert app_dirs.app_script() == str(user_env / 'bin' / 'tor-installer')
+    assert app_dirs.user_dirs.data_dir() == str(user_env / 'home1' / '.local' / 'share')
+    assert app_dirs.appdir() == str(user_env / 'home1' / '.local' / 'opt' / 'tor-installer')
+
+
+def test_dirs_are_memoized(user_env):
+    first, second = _app_dirs(), _app_dirs()
+    assert first._dirs() is second._dirs()
+    assert first.user_dirs._dirs() is second.user_dirs._dirs()
+
+    # Outro appname tem seus próprios caminhos.
+    other = BuilderAppDirs().build_appname('outro').build_user_root(False).build()
+    assert other._dirs() is not first._dirs()
+    assert other.app_cache_dir() == str(user_env / 'home1' / '.cache' / 'outro')
+
+
+def test_create_dirs_linux(user_env):
+    app_dirs = _app_dirs()
+    assert app_dirs.create_dirs()
+    for path in (app_dirs.app_config_dir(), app_dirs.app_cache_dir(), os.path.dirname(app_dirs.appdir()),
+                 os.path.dirname(app_dirs.app_script())):
+        assert os.path.isdir(path)
+    assert not os.path.exists(app_dirs.appdir())
+
+
+def test_create_dirs_windows(user_env):
+    app_dirs = AppDirsWindows('tor-installer')
+    # UserDirsWindows.opt_dir() é None: appdir() não entra na lista.
+    assert app_dirs.create_dirs()
+    assert os.path.isdir(app_dirs.app_config_dir())
+    assert os.path.isdir(app_dirs.app_cache_dir())
+    assert os.path.isdir(os.path.dirname(app_dirs.app_script()))
+
+
+def test_makedirs_batch_skips_parents_and_none(tmp_path, monkeypatch):
+    created = []
+    monkeypatch.setattr(os, 'makedirs', lambda path, exist_ok=False: created.append(path))
+    paths = [
+        str(tmp_path / 'a'),
+        str(tmp_path / 'a' / 'b'),
+        str(tmp_path / 'a-x'),
+        str(tmp_path / 'a' / 'b' / 'c'),
+        None,
+    ]
+    assert makedirs_batch(paths)
+    assert sorted(created) == sorted([str(tmp_path / 'a' / 'b' / 'c'), str(tmp_path / 'a-x')])
+
+
+def test_benchmark_memoized_dirs(user_env):
+    app_dirs = _app_dirs()
+    calls = 2000
+
+    def _accessors() -> None:
+        app_dirs.appdir()
+        app_dirs.app_cache_dir()
+        app_dirs.app_config_dir()
+        app_dirs.app_script()
+
+    start = time.perf_counter()
+    for _ in range(calls):
+        _accessors()
+    memoized = time.perf_counter() - start
+
+    # Sem memoização: os caminhos são resolvidos de novo a cada chamada.
+    start = time.perf_counter()
+    for _ in range(calls):
+        invalidate_dirs_cache()
+        _accessors()
+    resolved = time.perf_counter() - start
+
+    print(f'\n{calls} x 4 acessos: memoizado {memoized * 1000:.1f} ms, resolvendo {resolved * 1000:.1f} ms')
+    assert memoized * 3 < resolved
@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+#
+import hashlib
+import io
+import os
+import socket
+import threading
+import time
+
+from conflib.common import (
+    DOWNLOAD_CHUNK_MAX,
+    DOWNLOAD_CHUNK_MIN,
+    AdaptiveChunkSize,
+    DownloadJournal,
+    DownloadProgress,
+    PackageTarGz,
+    _iter_content,
+    download_file,
+    download_files,
+    download_packages,
+    get_file_hash,
+)
+
+
+def _dead_url() -> str:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return f'http://127.0.0.1:{port}/pkg.bin'
+
+
+def _write_package(http_server, size: int = 512 * 1024) -> bytes:
+    data = os.urandom(size)
+    with open(os.path.join(http_server.root, 'pkg.bin'), 'wb') as fp:
+        fp.write(data)
+    return data
+
+
+def test_download_mirror_when_primary_is_down(http_server, tmp_path, no_retries):
+    data = _write_package(http_server)
+
+    output_file = str(tmp_path / 'pkg.bin')
+    hasher = hashlib.sha256()
+    assert download_file(_dead_url(), output_file, False, hasher, mirrors=[f'{http_server.url}/pkg.bin'])
+    assert hasher.hexdigest() == hashlib.sha256(data).hexdigest()
+    assert not os.path.exists(f'{output_file}.part')
+
+
+def test_download_all_urls_down(tmp_path, no_retries):
+    output_file = str(tmp_path / 'pkg.bin')
+    assert not download_file(_dead_url(), output_file, False, mirrors=[_dead_url()])
+    assert not os.path.exists(output_file)
+
+
+def test_download_segments(http_server, tmp_path):
+    _write_package(http_server, 3 * 1024 * 1024 + 7)
+
+    output_file = str(tmp_path / 'pkg.bin')
+    hasher = hashlib.sha256()
+    assert download_file(f'{http_server.url}/pkg.bin', output_file, False, hasher, connections=4)
+
+    ranges = [rng for method, path, rng in http_server.requests if method == 'GET']
+    assert len(ranges) == 4 and all(rng is not None for rng in ranges)
+    assert get_file_hash(output_file) == get_file_hash(os.path.join(http_server.root, 'pkg.bin'))
+    assert hasher.hexdigest() == get_file_hash(output_file)
+    assert not os.path.exists(f'{output_file}.part.json')
+
+
+def test_download_segments_fallback_without_ranges(http_server, tmp_path):
+    _write_package(http_server)
+    http_server.ranges = False
+
+    output_file = str(tmp_path / 'pkg.bin')
+    hasher = hashlib.sha256()
+    assert download_file(f'{http_server.url}/pkg.bin', output_file, False, hasher, connections=4)
+
+    assert [rng for method, path, rng in http_server.requests if method == 'GET'] == [None]
+    assert hasher.hexdigest() == get_file_hash(output_file)
+    assert get_file_hash(output_file) == get_file_hash(os.path.join(http_server.root, 'pkg.bin'))
+
+
+def test_adaptive_chunk_size_bounds():
+    chunk_size = AdaptiveChunkSize()
+    assert chunk_size.size == DOWNLOAD_CHUNK_MIN
+
+    # Rede rápida: o bloco cresce até o máximo.
+    for _ in range(20):
+        chunk_size.update(chunk_size.size, 0.001)
+    assert chunk_size.size == DOWNLOAD_CHUNK_MAX
+
+    # Rede lenta: volta ao mínimo.
+    for _ in range(20):
+        chunk_size.update(chunk_size.size, 10.0)
+    assert chunk_size.size == DOWNLOAD_CHUNK_MIN
+
+    fixed = AdaptiveChunkSize(1024)
+    fixed.update(10 * 1024 * 1024, 0.001)
+    assert fixed.size == 1024
+
+
+def test_progress_quiet_does_not_use_tqdm():
+    with DownloadProgress(100, verbose=False) as progress:
+        progress.update(100)
+    assert progress._bar is None
+
+
+def test_download_stream_hash_matches_file(http_server, tmp_path):
+    _write_package(http_server, 5 * 1024 * 1024 + 3)
+
+    output_file = str(tmp_path / 'pkg.bin')
+    hasher = hashlib.sha256()
+    assert download_file(f'{http_server.url}/pkg.bin', output_file, False, hasher)
+    assert hasher.hexdigest() == get_file_hash(output_file)
+    assert get_file_hash(output_file) == get_file_hash(os.path.join(http_server.root, 'pkg.bin'))
+
+
+class _ThreadHasher(object):
+    """sha256 que registra as threads que chamaram update()."""
+
+    def __init__(self) -> None:
+        self._hash = hashlib.sha256()
+        self.threads: set = set()
+
+    def update(self, data: bytes) -> None:
+        self.threads.add(threading.get_ident())
+        self._hash.update(data)
+
+    def hexdigest(self) -> str:
+        return self._hash.hexdigest()
+
+
+def test_async_download_files(http_server, tmp_path):
+    data = {}
+    for name in ('a.bin', 'b.bin'):
+        data[name] = os.urandom(2 * 1024 * 1024 + 11)
+        with open(os.path.join(http_server.root, name), 'wb') as fp:
+            fp.write(data[name])
+
+    hashers = {name: _ThreadHasher() for name in data}
+    items = [(f'{http_server.url}/{name}', str(tmp_path / name), hashers[name]) for name in data]
+    assert download_files(items, chunk_size=64 * 1024) == [True, True]
+
+    for name, content in data.items():
+        assert (tmp_path / name).read_bytes() == content
+        assert hashers[name].hexdigest() == hashlib.sha256(content).hexdigest()
+        # O hash é calculado no pool de threads, não no event loop (thread principal).
+        assert threading.get_ident() not in hashers[name].threads
+        assert not os.path.exists(tmp_path / f'{name}.part')
+        assert not os.path.exists(tmp_path / f'{name}.part.json')
+
+
+def test_download_packages(http_server, tmp_path):
+    apps = []
+    for name in ('tb-linux.tar.xz', 'tb-windows.tar.xz'):
+        content = os.urandom(256 * 1024)
+        with open(os.path.join(http_server.root, name), 'wb') as fp:
+            fp.write(content)
+        app = PackageTarGz('torbrowser', name, str(tmp_path / 'cache'))
+        app.url = f'{http_server.url}/{name}'
+        app.hash = hashlib.sha256(content).hexdigest()
+        app.verbose = False
+        apps.append(app)
+
+    os.makedirs(tmp_path / 'cache')
+    assert download_packages(apps) == [True, True]
+    for app in apps:
+        # verify() usa o sha256 calculado durante o download.
+        assert app._download_digest[0] == app.hash
+        assert app.verify()
+
+
+def _write_partial(http_server, output_file: str, prefix: bytes, size: int) -> None:
+    """Cria output_file.part com prefix e o journal de um download interrompido."""
+    with open(f'{output_file}.part', 'wb') as fp:
+        fp.write(prefix)
+    path = os.path.join(http_server.root, 'pkg.bin')
+    journal = DownloadJournal(f'{output_file}.part.json')
+    journal.reset(f'{http_server.url}/pkg.bin', size, f'"{size}-{int(os.path.getmtime(path))}"')
+    journal.add_range(0, len(prefix))
+    journal.save()
+
+
+def test_download_resumes_part_file(http_server, tmp_path):
+    data = _write_package(http_server, 1024 * 1024 + 5)
+    output_file = str(tmp_path / 'pkg.bin')
+    half = len(data) // 2
+    _write_partial(http_server, output_file, data[:half], len(data))
+
+    hasher = hashlib.sha256()
+    assert download_file(f'{http_server.url}/pkg.bin', output_file, False, hasher)
+    assert [rng for method, path, rng in http_server.requests if method == 'GET'] == [f'bytes={half}-']
+    assert (tmp_path / 'pkg.bin').read_bytes() == data
+    # O hasher também recebe o trecho que já estava no .part.
+    assert hasher.hexdigest() == hashlib.sha256(data).hexdigest()
+    assert not os.path.exists(f'{output_file}.part')
+    assert not os.path.exists(f'{output_file}.part.json')
+
+
+def test_download_resumes_missing_segments(http_server, tmp_path):
+    data = _write_package(http_server, 2 * 1024 * 1024 + 5)
+    output_file = str(tmp_path / 'pkg.bin')
+    half = len(data) // 2
+    _write_partial(http_server, output_file, data[:half], len(data))
+
+    assert download_file(f'{http_server.url}/pkg.bin', output_file, False, connections=4)
+    ranges = [rng for method, path, rng in http_server.requests if method == 'GET']
+    assert ranges and all(int(rng[len('bytes='):].split('-')[0]) >= half for rng in ranges)
+    assert (tmp_path / 'pkg.bin').read_bytes() == data
+
+
+def test_download_restarts_when_server_ignores_range(http_server, tmp_path):
+    data = _write_package(http_server, 1024 * 1024 + 5)
+    http_server.ranges = False
+    output_file = str(tmp_path / 'pkg.bin')
+    # O trecho no .part não é usado: o servidor responde 200 com o arquivo inteiro.
+    _write_partial(http_server, output_file, b'\0' * (len(data) // 2), len(data))
+
+    hasher = hashlib.sha256()
+    assert download_file(f'{http_server.url}/pkg.bin', output_file, False, hasher)
+    assert [rng for method, path, rng in http_server.requests if method == 'GET'] == [f'bytes={len(data) // 2}-']
+    assert (tmp_path / 'pkg.bin').read_bytes() == data
+    assert hasher.hexdigest() == hashlib.sha256(data).hexdigest()
+    assert not os.path.exists(f'{output_file}.part.json')
+
+
+class _RawBody(io.BytesIO):
+    """Corpo de resposta em memória, com a assinatura de urllib3 (decode_content)."""
+
+    def read(self, size: int = -1, decode_content: bool = True) -> bytes:
+        return super().read(size)
+
+
+class _Response(object):
+    def __init__(self, data: bytes) -> None:
+        self.raw = _RawBody(data)
+
+
+def _chunk_loop_cpu(data: bytes, chunk_size: AdaptiveChunkSize) -> float:
+    """Tempo de CPU do laço de download (leitura, hash, gravação e progresso)."""
+    hasher = hashlib.sha256()
+    start = time.process_time()
+    with open(os.devnull, 'wb') as fp, DownloadProgress(len(data), verbose=False) as progress:
+        for chunk in _iter_content(_Response(data), chunk_size):
+            fp.write(chunk)
+            hasher.update(chunk)
+            progress.update(len(chunk))
+    elapsed = time.process_time() - start
+    assert hasher.hexdigest() == hashlib.sha256(data).hexdigest()
+    return elapsed
+
+
+def test_benchmark_download_chunk_loop():
+    data = os.urandom(64 * 1024 * 1024)
+    gb = len(data) / 1024**3
+    # Antes: blocos fixos de 1 KiB.
+    before = _chunk_loop_cpu(data, AdaptiveChunkSize(1024))
+    after = _chunk_loop_cpu(data, AdaptiveChunkSize())
+    print(f'\nCPU por GB: blocos de 1 KiB {before / gb:.2f} s, adaptativo {after / gb:.2f} s')
+    # O sha256 é o mesmo nos dois, a diferença é o custo por bloco.
+    assert after < before * 0.8
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+#
+import hashlib
+import io
+import os
+import tarfile
+import threading
+
+import pytest
+
+from conflib.common import PackageTarGz, QueueReader, TreeManifest, download_and_extract
+
+
+def _write_tar(http_server, name: str = 'tb.tar.xz', files: int = 50) -> bytes:
+    """Grava um tar.xz com tor-browser/dir*/file* em http_server.root e retorna o conteúdo."""
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode='w:xz', preset=0) as tar:
+        for num in range(files):
+            data = f'arquivo {num}\n'.encode() * 1000
+            info = tarfile.TarInfo(f'tor-browser/dir{num % 5}/file{num}')
+            info.size = len(data)
+            info.mode = 0o644
+            tar.addfile(info, io.BytesIO(data))
+    content = buffer.getvalue()
+    with open(os.path.join(http_server.root, name), 'wb') as fp:
+        fp.write(content)
+    return content
+
+
+def _package(http_server, tmp_path, content: bytes, sha256: str = None) -> PackageTarGz:
+    app = PackageTarGz('torbrowser', 'tb.tar.xz', str(tmp_path / 'cache'))
+    app.url = f'{http_server.url}/tb.tar.xz'
+    app.hash = sha256 or hashlib.sha256(content).hexdigest()
+    app.size = len(content)
+    app.dir_package_files = 'tor-browser'
+    app.pipeline = True
+    app.verbose = False
+    return app
+
+
+def test_queue_reader():
+    reader = QueueReader(2)
+    reader.put(b'abc')
+    reader.put(b'de')
+    assert reader.read(2) == b'ab'
+    assert reader.read() == b'c'
+    assert reader.read(10) == b'de'
+    reader.put(OSError('falha na rede'))
+    with pytest.raises(OSError):
+        reader.read()
+
+    # abort() libera quem espera em put() com a fila cheia.
+    reader = QueueReader(1)
+    reader.put(b'a')
+    result = []
+    producer = threading.Thread(target=lambda: result.append(reader.put(b'b')))
+    producer.start()
+    reader.abort()
+    producer.join(5)
+    assert result == [False]
+
+
+def test_download_and_extract(http_server, tmp_path):
+    content = _write_tar(http_server)
+    extract_dir = str(tmp_path / 'dest')
+    hasher = hashlib.sha256()
+    assert download_and_extract(f'{http_server.url}/tb.tar.xz', extract_dir, hasher, verbose=False, chunk_size=4096)
+    assert hasher.hexdigest() == hashlib.sha256(content).hexdigest()
+    assert (tmp_path / 'dest' / 'tor-browser' / 'dir3' / 'file8').read_bytes() == b'arquivo 8\n' * 1000
+
+
+def test_download_error_leaves_no_tree(http_server, tmp_path, no_retries):
+    extract_dir = str(tmp_path / 'dest')
+    assert not download_and_extract(f'{http_server.url}/nada.tar.xz', extract_dir, verbose=False)
+    assert not os.path.exists(extract_dir)
+
+
+def test_corrupt_download_leaves_no_tree(http_server, tmp_path):
+    content = bytearray(_write_tar(http_server))
+    # Erro de descompressão depois de alguns arquivos já extraídos.
+    for pos in range(len(content) // 2, len(content) // 2 + 64):
+        content[pos] ^= 0xff
+    with open(os.path.join(http_server.root, 'tb.tar.xz'), 'wb') as fp:
+        fp.write(content)
+
+    extract_dir = str(tmp_path / 'dest')
+    assert not download_and_extract(f'{http_server.url}/tb.tar.xz', extract_dir, verbose=False, chunk_size=1024)
+    assert not os.path.exists(extract_dir)
+
+
+def test_pipeline_unpack_to(http_server, tmp_path):
+    content = _write_tar(http_server)
+    target_dir = str(tmp_path / 'app')
+    assert _package(http_server, tmp_path, content).unpack_to(target_dir)
+    assert (tmp_path / 'app' / 'dir0' / 'file0').read_bytes() == b'arquivo 0\n' * 1000
+    assert len(TreeManifest.load(target_dir).files) == 50
+
+
+def test_pipeline_hash_mismatch_leaves_no_tree(http_server, tmp_path):
+    content = _write_tar(http_server)
+    target_dir = str(tmp_path / 'app')
+    assert not _package(http_server, tmp_path, content, '0' * 64).unpack_to(target_dir)
+    assert not os.path.exists(target_dir)
+
+
+def test_pipeline_download_error_leaves_no_tree(http_server, tmp_path, no_retries):
+    content = _write_tar(http_server)
+    app = _package(http_server, tmp_path, content)
+    app.url = f'{http_server.url}/nada.tar.xz'
+    target_dir = str(tmp_path / 'app')
+    assert not app.unpack_to(target_dir)
+    assert not os.path.exists(target_dir)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+#
+import threading
+
+from main import CommandApp, ExecuteCommands
+
+
+class _Command(CommandApp):
+    def __init__(self, name: str, log: list, result=True, resource: str = 'cpu', barrier=None) -> None:
+        super().__init__()
+        self._name = name
+        self.log = log
+        self.result = result
+        self.resource = resource
+        self.barrier = barrier
+        self.thread = None
+
+    def name(self) -> str:
+        return self._name
+
+    def execute(self):
+        self.thread = threading.current_thread()
+        if self.barrier is not None:
+            self.barrier.wait(timeout=5)
+        self.log.append(self._name)
+        return self.result
+
+
+def test_sequence_runs_inline():
+    log = []
+    execute_commands = ExecuteCommands()
+    download = execute_commands.add_command(_Command('download', log, resource='net'))
+    verify = execute_commands.add_command(_Command('verify', log), [download])
+    install = execute_commands.add_command(_Command('install', log), [verify])
+
+    assert execute_commands.run()
+    assert log == ['download', 'verify', 'install']
+    assert all(cmd.thread is threading.main_thread() for cmd in (download, verify, install))
+
+
+def test_failed_dependency_skips_command():
+    log = []
+    execute_commands = ExecuteCommands()
+    download = execute_commands.add_command(_Command('download', log, resource='net'))
+    verify = execute_commands.add_command(_Command('verify', log, result=False), [download])
+    execute_commands.add_command(_Command('install', log), [verify])
+
+    assert not execute_commands.run()
+    assert log == ['download', 'verify']
+
+
+def test_independent_commands_run_in_parallel():
+    # Os dois comandos só terminam se rodarem ao mesmo tempo.
+    log = []
+    barrier = threading.Barrier(2)
+    execute_commands = ExecuteCommands()
+    first = execute_commands.add_command(_Command('a', log, resource='net', barrier=barrier))
+    second = execute_commands.add_command(_Command('b', log, resource='net', barrier=barrier))
+
+    assert execute_commands.run()
+    assert sorted(log) == ['a', 'b']
+    assert first.thread is not threading.main_thread()
+    assert second.thread is not threading.main_thread()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+#
+import os
+
+import pytest
+import requests
+
+from conflib.common import HttpMetadataCache
+
+
+@pytest.mark.parametrize('url', [
+    'http://dist.torproject.org/catalog.json',
+    'ftp://dist.torproject.org/catalog.json',
+    'catalog.json',
+])
+def test_reject_non_https(tmp_path, url):
+    with pytest.raises(ValueError):
+        HttpMetadataCache(str(tmp_path)).get_file(url)
+
+
+def test_reject_redirect_to_http(http_server, tmp_path, monkeypatch):
+    # Simula uma url https redirecionada para http (o servidor local não tem TLS).
+    (tmp_path / 'www' / 'catalog.json').write_text('{}')
+    real_get = requests.Session.get
+
+    def _get(session, url, **kwargs):
+        return real_get(session, url.replace('https://local', http_server.url), **kwargs)
+
+    monkeypatch.setattr(requests.Session, 'get', _get)
+    with pytest.raises(ValueError):
+        HttpMetadataCache(str(tmp_path)).get_file('https://local/catalog.json')
+    assert not (tmp_path / HttpMetadataCache.SUBDIR).exists()
+
+
+@pytest.fixture
+def https_local(http_server, monkeypatch):
+    """
+       Redireciona https://local para o servidor local (sem TLS), mantendo a url
+    https na resposta. Retorna a lista de (headers enviados, status).
+    """
+    calls = []
+    real_get = requests.Session.get
+
+    def _get(session, url, headers=None, **kwargs):
+        resp = real_get(session, url.replace('https://local', http_server.url), headers=headers, **kwargs)
+        resp.url = url
+        calls.append((dict(headers or {}), resp.status_code))
+        return resp
+
+    monkeypatch.setattr(requests.Session, 'get', _get)
+    return calls
+
+
+def test_conditional_request_uses_disk_copy(http_server, https_local, tmp_path):
+    catalog = tmp_path / 'www' / 'catalog.json'
+    catalog.write_text('{"versao": 1}')
+    cache = HttpMetadataCache(str(tmp_path / 'cache'))
+
+    file = cache.get_file('https://local/catalog.json')
+    assert https_local[-1] == ({}, 200)
+
+    # Segunda requisição: condicional, o servidor responde 304 e o arquivo do disco é usado.
+    assert cache.get_file('https://local/catalog.json') == file
+    headers, status = https_local[-1]
+    assert status == 304
+    assert headers['If-None-Match'] == f'"{os.path.getsize(catalog)}-{int(os.path.getmtime(catalog))}"'
+    assert 'If-Modified-Since' in headers
+    assert cache.get('https://local/catalog.json') == b'{"versao": 1}'
+
+
+def test_if_modified_since_without_etag(http_server, https_local, tmp_path):
+    (tmp_path / 'www' / 'catalog.json').write_text('{"versao": 1}')
+    cache = HttpMetadataCache(str(tmp_path / 'cache'))
+    cache.get_file('https://local/catalog.json')
+
+    meta = cache._meta('https://local/catalog.json')
+    meta.write_lines(dict(meta.lines_to_dict(), etag=None))
+    assert cache.get('https://local/catalog.json') == b'{"versao": 1}'
+    headers, status = https_local[-1]
+    assert ('If-None-Match' not in headers) and ('If-Modified-Since' in headers)
+    assert status == 304
+
+
+def test_changed_file_replaces_disk_copy(http_server, https_local, tmp_path):
+    catalog = tmp_path / 'www' / 'catalog.json'
+    catalog.write_text('{"versao": 1}')
+    cache = HttpMetadataCache(str(tmp_path / 'cache'))
+    cache.get_file('https://local/catalog.json')
+    old_etag = cache._meta('https://local/catalog.json').lines_to_dict()['etag']
+
+    catalog.write_text('{"versao": 2, "novo": true}')
+    os.utime(catalog, (os.path.getmtime(catalog) + 10,) * 2)
+    assert cache.get('https://local/catalog.json') == b'{"versao": 2, "novo": true}'
+    assert https_local[-1][1] == 200
+    assert cache._meta('https://local/catalog.json').lines_to_dict()['etag'] != old_etag
+    assert sorted(os.listdir(cache.root_dir)) == sorted([
+        os.path.basename(cache.path('https://local/catalog.json')),
+        os.path.basename(cache.path('https://local/catalog.json')) + '.json',
+    ])
+
+
+def test_server_down_uses_disk_copy(http_server, https_local, tmp_path, monkeypatch):
+    (tmp_path / 'www' / 'catalog.json').write_text('{"versao": 1}')
+    cache = HttpMetadataCache(str(tmp_path / 'cache'))
+    cache.get_file('https://local/catalog.json')
+
+    def _down(session, url, **kwargs):
+        raise requests.ConnectionError('servidor fora do ar')
+
+    monkeypatch.setattr(requests.Session, 'get', _down)
+    assert cache.get('https://local/catalog.json') == b'{"versao": 1}'
+    with pytest.raises(requests.ConnectionError):
+        cache.get('https://local/outro.json')
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+#
+import json
+import os
+import stat
+import time
+
+import pytest
+
+from conflib.common import JSON, FileJson
+
+
+def _write_external(path: str, content: dict) -> None:
+    # Gravação no mesmo inode, como um editor ou outro programa.
+    with open(path, 'w', encoding='utf8') as fp:
+        json.dump(content, fp)
+
+
+def test_json_lookups():
+    data = JSON(json.dumps({f'key{i}': i for i in range(1000)}))
+    assert data.get_key('key500') == 500
+    assert data.index('key500') == 500
+    assert data.iskey('key999')
+    assert data.get_key('nada') is None
+    assert data.index('nada') == -1
+
+    data.append('novo', 'valor')
+    assert data.index('novo') == 1000
+    assert json.loads(data.data_json)['novo'] == 'valor'
+
+    data.data_json = '{"a": 1}'
+    assert data.get_key('a') == 1
+    assert data.index('key500') == -1
+
+
+def _best(func, repeat: int = 5) -> float:
+    """Menor tempo (segundos) de repeat chamadas de func()."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def test_benchmark_json_lookups():
+    content = {f'key{i}': {'mirrors': [f'https://m{i}'], 'size': i} for i in range(10000)}
+    data = JSON(json.dumps(content))
+    data.get_key('key0')
+
+    def _lookups() -> None:
+        for num in range(10000):
+            assert data.index(f'key{num}') == num
+            assert data.iskey(f'key{num}')
+
+    def _copies() -> None:
+        assert len(data.to_dict()) == 10000
+        assert len(data.values()) == 10000
+
+    lookups = _best(_lookups)
+    copies = _best(_copies)
+    baseline = _best(lambda: json.loads(data.data_json))
+    print(f'\nJSON 10000 chaves: buscas {lookups * 1000:.1f} ms, '
+          f'to_dict()+values() {copies * 1000:.1f} ms, json.loads() {baseline * 1000:.1f} ms')
+    assert data.to_dict() == content
+    # to_dict() e values() são dois json.loads(), sem deepcopy.
+    assert copies <= baseline * 4
+
+
+def test_file_json_cached_sees_external_write(tmp_path):
+    path = str(tmp_path / 'config.json')
+    file_json = FileJson(path, cached=True)
+    file_json.write_lines({'limit_rate': '1M'})
+    assert file_json.lines_to_dict()['limit_rate'] == '1M'
+
+    _write_external(path, {'limit_rate': '20M', 'novo': True})
+    assert file_json.lines_to_dict()['limit_rate'] == '20M'
+    assert file_json.is_key('novo')
+    assert file_json.get_json().get_key('limit_rate') == '20M'
+
+
+def test_file_json_get_key_after_update(tmp_path):
+    path = str(tmp_path / 'config.json')
+    writer = FileJson(path)
+    reader = FileJson(path, cached=True)
+    writer.write_lines({'a': 1})
+    assert reader.get_json().get_key('a') == 1
+
+    writer.update_key('a', 2)
+    assert reader.lines_to_dict()['a'] == 2
+    assert reader.get_json().get_key('a') == 2
+
+
+def test_file_json_keeps_mode_and_symlink(tmp_path):
+    real_file = tmp_path / 'real.json'
+    link = tmp_path / 'link.json'
+    real_file.write_text('{}')
+    os.chmod(real_file, 0o600)
+    os.symlink(real_file, link)
+
+    FileJson(str(link)).write_lines({'a': 1})
+    assert os.path.islink(link)
+    assert stat.S_IMODE(os.stat(real_file).st_mode) == 0o600
+    assert json.loads(real_file.read_text()) == {'a': 1}
+    assert sorted(os.listdir(tmp_path)) == ['link.json', 'real.json']
+
+
+def test_file_json_nested_transaction(tmp_path):
+    path = str(tmp_path / 'config.json')
+    file_json = FileJson(path)
+    file_json.write_lines({'a': 1})
+    stamp = os.stat(path).st_mtime_ns
+
+    with file_json.transaction() as content:
+        content['b'] = 2
+        with file_json.transaction() as inner:
+            inner['c'] = 3
+        # O bloco interno não grava o arquivo.
+        assert os.stat(path).st_mtime_ns == stamp
+    assert FileJson(path).lines_to_dict() == {'a': 1, 'b': 2, 'c': 3}
+
+    # Exceção no bloco interno, tratada no externo: nada é gravado.
+    with file_json.transaction() as content:
+        content['d'] = 4
+        try:
+            with file_json.transaction() as inner:
+                inner['e'] = 5
+                raise RuntimeError('falha')
+        except RuntimeError:
+            pass
+    assert FileJson(path).lines_to_dict() == {'a': 1, 'b': 2, 'c': 3}
+
+    with file_json.transaction() as content:
+        content['f'] = 6
+    assert FileJson(path).lines_to_dict() == {'a': 1, 'b': 2, 'c': 3, 'f': 6}
+
+
+@pytest.mark.skipif(not hasattr(os, 'geteuid') or os.geteuid() != 0, reason='precisa de root para chown')
+def test_file_json_keeps_owner(tmp_path):
+    path = tmp_path / 'config.json'
+    path.write_text('{}')
+    os.chown(path, 1000, 1000)
+
+    FileJson(str(path)).write_lines({'a': 1})
+    assert (os.stat(path).st_uid, os.stat(path).st_gid) == (1000, 1000)
+
+
+def test_json_returns_copies():
+    data = JSON(json.dumps({'mirrors': ['a', 'b'], 'info': {'size': 1}, 'name': 'tb'}))
+
+    data.get_key('mirrors').append('c')
+    data.to_dict()['info']['size'] = 2
+    data.values()[0].clear()
+    assert data.get_key('mirrors') == ['a', 'b']
+    assert data.get_key('info') == {'size': 1}
+    assert json.loads(data.data_json) == {'mirrors': ['a', 'b'], 'info': {'size': 1}, 'name': 'tb'}
+
+
+def test_file_json_write_lines_does_not_share_objects(tmp_path):
+    path = str(tmp_path / 'config.json')
+    file_json = FileJson(path, cached=True)
+    content = {'mirrors': ['a'], 'info': {'size': 1}}
+    file_json.write_lines(content)
+
+    content['mirrors'].append('b')
+    content['info']['size'] = 2
+    assert file_json.lines_to_dict() == {'mirrors': ['a'], 'info': {'size': 1}}
+
+    with file_json.transaction() as data:
+        data['mirrors'].append('c')
+    assert file_json.lines_to_dict()['mirrors'] == ['a', 'c']
+
+
+def test_benchmark_file_json_cached_read(tmp_path):
+    path = str(tmp_path / 'config.json')
+    content = {f'key{i}': {'mirrors': [f'https://m{i}'], 'size': i} for i in range(10000)}
+    FileJson(path).write_lines(content)
+    cached = FileJson(path, cached=True)
+    uncached = FileJson(path)
+
+    cached_time = _best(lambda: cached.lines_to_dict())
+    uncached_time = _best(lambda: uncached.lines_to_dict())
+    assert cached.lines_to_dict() == content
+    print(f'\nlines_to_dict() 10000 chaves: cache {cached_time * 1000:.1f} ms, sem cache {uncached_time * 1000:.1f} ms')
+    # Com cache não há leitura do disco nem cópia profunda (antes era 2,5x mais lento).
+    assert cached_time <= uncached_time * 2
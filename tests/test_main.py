@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+#
+import json
+import os
+import subprocess
+import sys
+import time
+
+from conflib.common import TreeManifest
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'main.py')
+
+# Módulos que só devem ser importados quando a rede/barra de progresso for usada.
+HEAVY_MODULES = ('requests', 'urllib3', 'tqdm', 'aiohttp', 'asyncio')
+
+# Tempo máximo (segundos) de 'main.py --help' além da inicialização do python.
+COLD_START_BUDGET = 1.0
+
+
+def _run(code: str) -> str:
+    return subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+
+
+def _run_main_as_user(home: str, *args: str) -> subprocess.CompletedProcess:
+    """Executa main.py como usuário comum (euid 1000) com HOME=home."""
+    code = (
+        'import os, runpy, sys\n'
+        'os.geteuid = lambda: 1000\n'
+        f'sys.argv = [{MAIN!r}] + {list(args)!r}\n'
+        f'runpy.run_path({MAIN!r}, run_name="__main__")\n'
+    )
+    env = dict(os.environ, HOME=home)
+    for var in ('XDG_CONFIG_HOME', 'XDG_CACHE_HOME', 'XDG_DATA_HOME', 'XDG_STATE_HOME', 'XDG_BIN_HOME'):
+        env.pop(var, None)
+    return subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env)
+
+
+def test_help_does_not_import_heavy_modules():
+    code = (
+        'import runpy, sys\n'
+        f'sys.argv = [{MAIN!r}, "--help"]\n'
+        'try:\n'
+        f'    runpy.run_path({MAIN!r}, run_name="__main__")\n'
+        'except SystemExit:\n'
+        '    pass\n'
+        f'print(",".join(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n'
+    )
+    assert _run(code).splitlines()[-1] == ''
+
+
+def test_help_does_not_resolve_app_dirs():
+    # --help não deve criar get_tor_installer_app_dirs() (nem ler HOME/XDG_*).
+    code = (
+        'import runpy, sys\n'
+        'import conflib.common as common\n'
+        'created = []\n'
+        'init = common.AppDirsLinux.__init__\n'
+        'common.AppDirsLinux.__init__ = lambda self, *a: (created.append(a), init(self, *a))[1]\n'
+        f'sys.argv = [{MAIN!r}, "--help"]\n'
+        'try:\n'
+        f'    runpy.run_path({MAIN!r}, run_name="__main__")\n'
+        'except SystemExit:\n'
+        '    pass\n'
+        'print(len(created))\n'
+    )
+    assert _run(code).splitlines()[-1] == '0'
+
+
+def test_version():
+    result = subprocess.run([sys.executable, MAIN, '--version'], check=True, capture_output=True, text=True)
+    assert result.stdout.strip() == '1.1'
+
+
+def test_check_installed(tmp_path):
+    home = str(tmp_path / 'home')
+    catalog_file = str(tmp_path / 'catalog.json')
+    with open(catalog_file, 'w', encoding='utf8') as fp:
+        json.dump({
+            'torbrowser': {
+                'default_version': '11.0.0',
+                'default_locale': 'pt-BR',
+                'dir_package_files': 'tor-browser_{locale}',
+                'releases': {'11.0.0': {'Linux': {'pt-BR': {
+                    'url': 'https://dist.torproject.org/torbrowser/11.0.0/tb.tar.xz',
+                    'sha256': '0' * 64,
+                    'size': 1,
+                    'mirrors': [],
+                }}}},
+            }
+        }, fp)
+
+    # Não instalado: sem manifest, código de saída 1.
+    result = _run_main_as_user(home, '--catalog', catalog_file, '--check-installed')
+    assert result.returncode == 1, result.stdout + result.stderr
+    assert 'manifest não encontrado' in result.stdout
+
+    appdir = tmp_path / 'home' / '.local' / 'opt' / 'torbrowser'
+    appdir.mkdir(parents=True)
+    (appdir / 'firefox').write_bytes(b'binario')
+    manifest = TreeManifest()
+    st = os.stat(appdir / 'firefox')
+    manifest.add_file('firefox', st.st_size, st.st_mtime_ns, '0' * 64)
+    manifest.save(str(appdir))
+
+    # O sha256 só é conferido com --full (o mtime não mudou).
+    result = _run_main_as_user(home, '--catalog', catalog_file, '--check-installed')
+    assert result.returncode == 0, result.stdout + result.stderr
+    result = _run_main_as_user(home, '--catalog', catalog_file, '--check-installed', '--full')
+    assert result.returncode == 1
+    assert '[ALTERADO] ... firefox' in result.stdout
+
+
+def test_help_cold_start_time():
+    def _best(args: list) -> float:
+        best = None
+        for _ in range(3):
+            start = time.perf_counter()
+            subprocess.run([sys.executable] + args, check=True, capture_output=True)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    assert _best([MAIN, '--help']) - _best(['-c', 'pass']) < COLD_START_BUDGET
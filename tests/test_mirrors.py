@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+#
+import hashlib
+import os
+import socket
+
+from conflib.common import FileJson, MirrorRanking, PackageTarGz, probe_mirror
+
+
+def _dead_url() -> str:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return f'http://127.0.0.1:{port}/pkg.bin'
+
+
+def _write_package(*servers, size: int = 512 * 1024) -> bytes:
+    data = os.urandom(size)
+    for server in servers:
+        with open(os.path.join(server.root, 'pkg.bin'), 'wb') as fp:
+            fp.write(data)
+    return data
+
+
+def _gets(server) -> int:
+    return len([method for method, path, rng in server.requests if method == 'GET'])
+
+
+def test_probe_mirror(http_server):
+    _write_package(http_server)
+    result = probe_mirror(f'{http_server.url}/pkg.bin', 64 * 1024)
+    assert result['ok'] and result['ranges']
+    assert result['size'] == 512 * 1024
+    assert (result['ttfb'] >= 0) and (result['throughput'] > 0)
+    assert http_server.requests[-1] == ('GET', '/pkg.bin', f'bytes=0-{64 * 1024 - 1}')
+
+    assert not probe_mirror(_dead_url())['ok']
+    assert not probe_mirror(f'{http_server.url}/nada.bin')['ok']
+
+
+def test_rank_order(http_server, http_server2, tmp_path):
+    _write_package(http_server, http_server2)
+    http_server.delay = 0.3
+    slow, fast, dead = f'{http_server.url}/pkg.bin', f'{http_server2.url}/pkg.bin', _dead_url()
+
+    ranking = MirrorRanking(str(tmp_path / 'mirrors.json'), probe_size=64 * 1024)
+    # Os que falharam ficam no fim, os outros do mais rápido para o mais lento.
+    assert ranking.rank([dead, slow, fast]) == [fast, slow, dead]
+
+
+def test_rank_ttl(http_server, http_server2, tmp_path):
+    _write_package(http_server, http_server2)
+    urls = [f'{http_server.url}/pkg.bin', f'{http_server2.url}/pkg.bin']
+    ranking_file = str(tmp_path / 'mirrors.json')
+
+    MirrorRanking(ranking_file, ttl=60).rank(urls)
+    assert (_gets(http_server), _gets(http_server2)) == (1, 1)
+
+    # Dentro do ttl o resultado gravado é usado, sem novas requisições.
+    MirrorRanking(ranking_file, ttl=60).rank(urls)
+    assert (_gets(http_server), _gets(http_server2)) == (1, 1)
+
+    # Resultado de http_server vencido: só ele é testado de novo.
+    results = FileJson(ranking_file).lines_to_dict()
+    results[urls[0]]['time'] -= 120
+    FileJson(ranking_file).write_lines(results)
+    MirrorRanking(ranking_file, ttl=60).rank(urls)
+    assert (_gets(http_server), _gets(http_server2)) == (2, 1)
+
+
+def test_failover_to_next_mirror(http_server, http_server2, tmp_path, no_retries):
+    data = _write_package(http_server, http_server2)
+    http_server.delay = 0.3
+    ranking = MirrorRanking(str(tmp_path / 'mirrors.json'), probe_size=64 * 1024)
+
+    app = PackageTarGz('torbrowser', 'pkg.bin', str(tmp_path))
+    app.url = f'{http_server.url}/pkg.bin'
+    app.mirrors = [f'{http_server2.url}/pkg.bin']
+    app.hash = hashlib.sha256(data).hexdigest()
+    app.mirror_ranking = ranking
+    app.verbose = False
+    assert app.urls() == [app.mirrors[0], app.url]
+
+    # O mais rápido cai depois do teste: o download continua no próximo da lista.
+    http_server2.stop()
+    gets = _gets(http_server)
+    assert app.download()
+    assert _gets(http_server) == gets + 1
+    assert app.verify()
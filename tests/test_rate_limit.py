@@ -0,0 +1,55 @@
+#!/usr/bin/env python3
+#
+import os
+import threading
+import time
+
+import pytest
+
+from conflib.common import RateLimiter, download_file, get_file_hash
+
+
+def _throughput(limiter: RateLimiter, total: int, threads: int, chunk: int) -> float:
+    """Consome total bytes em blocos de chunk com várias threads, retorna bytes/s."""
+    def _consume() -> None:
+        for _ in range(total // threads // chunk):
+            limiter.consume(chunk)
+
+    workers = [threading.Thread(target=_consume) for _ in range(threads)]
+    start = time.monotonic()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    # O burst inicial é liberado sem espera.
+    return (total - limiter.burst) / (time.monotonic() - start)
+
+
+@pytest.mark.parametrize('threads', [1, 4])
+def test_rate_limiter_throughput(threads):
+    rate = 4 * 1024 * 1024
+    limiter = RateLimiter(rate)
+    throughput = _throughput(limiter, rate, threads, 64 * 1024)
+    assert throughput <= rate * 1.03
+    assert throughput >= rate * 0.80
+
+
+def test_rate_limiter_invalid_rate():
+    with pytest.raises(ValueError):
+        RateLimiter(0)
+
+
+def test_download_rate_limit(http_server, tmp_path):
+    size = 1024 * 1024
+    with open(os.path.join(http_server.root, 'pkg.bin'), 'wb') as fp:
+        fp.write(os.urandom(size))
+
+    rate = 1024 * 1024
+    output_file = str(tmp_path / 'pkg.bin')
+    start = time.monotonic()
+    assert download_file(f'{http_server.url}/pkg.bin', output_file, False, connections=2, rate_limit=rate)
+    elapsed = time.monotonic() - start
+
+    # O primeiro burst (rate / 10) não espera.
+    assert (size - rate / 10) / elapsed <= rate * 1.03
+    assert get_file_hash(output_file) == get_file_hash(os.path.join(http_server.root, 'pkg.bin'))
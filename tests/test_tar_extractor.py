@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+#
+import hashlib
+import io
+import os
+import tarfile
+import time
+
+import pytest
+
+from conflib.common import TarExtractor, TreeManifest, extract_tar_stream
+
+
+def _add_file(tar: tarfile.TarFile, name: str, data: bytes = b'data', mode: int = 0o644) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mode = mode
+    info.mtime = 1_600_000_000
+    tar.addfile(info, io.BytesIO(data))
+
+
+def _add_link(tar: tarfile.TarFile, name: str, linkname: str, link_type=tarfile.SYMTYPE) -> None:
+    info = tarfile.TarInfo(name)
+    info.type = link_type
+    info.linkname = linkname
+    tar.addfile(info)
+
+
+def _make_tar(path: str, build, mode: str = 'w', **kwargs) -> str:
+    with tarfile.open(path, mode, **kwargs) as tar:
+        build(tar)
+    return path
+
+
+def _list_tree(root: str) -> dict:
+    tree = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        for name in dirnames + filenames:
+            path = os.path.join(dirpath, name)
+            rel = os.path.relpath(path, root)
+            if os.path.islink(path):
+                tree[rel] = ('link', os.readlink(path))
+            elif os.path.isfile(path):
+                with open(path, 'rb') as fp:
+                    tree[rel] = ('file', fp.read(), os.stat(path).st_mode & 0o7777)
+            else:
+                tree[rel] = ('dir',)
+    return tree
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    outside = tmp_path / 'outside'
+    outside.mkdir()
+    (outside / 'secret').write_bytes(b'secret')
+    dest = tmp_path / 'dest'
+    return str(dest), str(outside)
+
+
+def test_extract_strip_and_manifest(tmp_path):
+    def build(tar):
+        _add_file(tar, 'tor-browser_pt-BR/Browser/start', b'#!/bin/sh\n', 0o755)
+        _add_file(tar, 'tor-browser_pt-BR/Browser/big', os.urandom(TarExtractor.MAX_BUFFERED_FILE + 1))
+        _add_link(tar, 'tor-browser_pt-BR/start-tor-browser', 'Browser/start')
+        _add_link(tar, 'tor-browser_pt-BR/Browser/start2', 'tor-browser_pt-BR/Browser/start', tarfile.LNKTYPE)
+        _add_file(tar, 'outro/arquivo')
+
+    archive = _make_tar(str(tmp_path / 'tb.tar.xz'), build, 'w:xz', preset=0)
+    dest = str(tmp_path / 'dest')
+    manifest = TreeManifest()
+    extract_tar_stream(archive, dest, TarExtractor(strip='tor-browser_pt-BR', manifest=manifest))
+
+    tree = _list_tree(dest)
+    assert tree['Browser/start'] == ('file', b'#!/bin/sh\n', 0o755)
+    assert tree['start-tor-browser'] == ('link', 'Browser/start')
+    assert os.path.samefile(os.path.join(dest, 'Browser/start'), os.path.join(dest, 'Browser/start2'))
+    assert 'outro' not in tree
+    assert set(manifest.files) == {'Browser/start', 'Browser/start2', 'Browser/big'}
+
+
+@pytest.mark.parametrize('build', [
+    # Caminhos e links fora do destino só pelo nome.
+    lambda tar: _add_file(tar, '../evil'),
+    lambda tar: _add_link(tar, 'evil', '/etc/passwd'),
+    lambda tar: _add_link(tar, 'evil', '../outside'),
+    # 'a -> .' faz 'a/b -> ..' apontar para o diretório acima do destino.
+    lambda tar: (_add_link(tar, 'a', '.'), _add_link(tar, 'a/b', '..')),
+    # 'x -> .' muda o destino de um link criado antes.
+    lambda tar: (_add_link(tar, 's', 'x/../outside'), _add_link(tar, 'x', '.')),
+])
+def test_reject_links_outside(dirs, tmp_path, build):
+    dest, outside = dirs
+    archive = _make_tar(str(tmp_path / 'evil.tar'), build)
+
+    with pytest.raises(tarfile.TarError):
+        extract_tar_stream(archive, dest)
+    assert os.listdir(outside) == ['secret']
+
+
+def test_reject_link_chain_writes(dirs, tmp_path):
+    dest, outside = dirs
+
+    def build(tar):
+        _add_link(tar, 'a', '.')
+        _add_link(tar, 'a/b', '..')
+        _add_link(tar, 'a/b/outside/escape', 'x')
+        _add_link(tar, 'h', 'a/b/outside/secret', tarfile.LNKTYPE)
+
+    archive = _make_tar(str(tmp_path / 'evil.tar'), build)
+    with pytest.raises((tarfile.TarError, OSError)):
+        extract_tar_stream(archive, dest)
+    assert os.listdir(outside) == ['secret']
+    assert not os.path.exists(os.path.join(dest, 'h'))
+
+
+def test_reject_through_existing_link(dirs, tmp_path):
+    # extract_dir já tem um link para fora (ex: extração sobre uma árvore existente).
+    dest, outside = dirs
+    os.makedirs(dest)
+    os.symlink(outside, os.path.join(dest, 'evil'))
+
+    file_archive = _make_tar(str(tmp_path / 'file.tar'), lambda tar: _add_file(tar, 'evil/new'))
+    with pytest.raises(tarfile.TarError):
+        extract_tar_stream(file_archive, dest)
+
+    link_archive = _make_tar(
+        str(tmp_path / 'hardlink.tar'), lambda tar: _add_link(tar, 'h', 'evil/secret', tarfile.LNKTYPE)
+    )
+    with pytest.raises(tarfile.TarError):
+        extract_tar_stream(link_archive, dest)
+
+    assert os.listdir(outside) == ['secret']
+    assert not os.path.exists(os.path.join(dest, 'h'))
+
+
+def test_filter_modes_and_devices(tmp_path):
+    def build(tar):
+        _add_file(tar, 'setuid', b'x', 0o6777)
+        fifo = tarfile.TarInfo('fifo')
+        fifo.type = tarfile.FIFOTYPE
+        tar.addfile(fifo)
+
+    archive = _make_tar(str(tmp_path / 'modes.tar'), build)
+    dest = str(tmp_path / 'dest')
+    extract_tar_stream(archive, dest)
+
+    assert _list_tree(dest) == {'setuid': ('file', b'x', 0o755)}
+
+
+class _SlowExtractor(TarExtractor):
+    """Demora para começar a gravar os arquivos com o conteúdo slow_data."""
+    slow_data: bytes = None
+
+    def _write_file(self, path: str, data, mode: int, mtime: float, hasher=None) -> None:
+        if data == self.slow_data:
+            time.sleep(0.05)
+        super()._write_file(path, data, mode, mtime, hasher)
+
+
+@pytest.mark.parametrize('last_size', [10, 256 * 1024])
+def test_duplicate_members_last_wins(tmp_path, last_size):
+    # O último é pequeno (também gravado no pool) ou maior que MAX_BUFFERED_FILE
+    # (gravado na thread atual), enquanto o primeiro ainda não foi gravado.
+    first, last = b'1' * 1000, b'2' * last_size
+
+    def build(tar):
+        for num in range(5):
+            _add_file(tar, f'dup{num}', first)
+            _add_file(tar, f'outro{num}', b'x')
+            _add_file(tar, f'dup{num}', last)
+
+    archive = _make_tar(str(tmp_path / 'dup.tar'), build)
+    dest = str(tmp_path / 'dest')
+    manifest = TreeManifest()
+    extractor = _SlowExtractor(workers=4, manifest=manifest)
+    extractor.slow_data = first
+    extractor.MAX_BUFFERED_FILE = 128 * 1024
+    extract_tar_stream(archive, dest, extractor)
+
+    for num in range(5):
+        with open(os.path.join(dest, f'dup{num}'), 'rb') as fp:
+            assert fp.read() == last
+        assert manifest.files[f'dup{num}'][2] == hashlib.sha256(last).hexdigest()
+    assert len(os.listdir(dest)) == 10
+
+
+def test_benchmark_extract(tmp_path):
+    """Compara TarExtractor com tarfile.extractall() em um tar.xz sintético."""
+    def build(tar):
+        for i in range(2000):
+            _add_file(tar, f'tb/d{i % 50}/f{i}', f'{i:08d}'.encode() * (256 + (i % 7) * 512))
+        _add_file(tar, 'tb/libxul.so', os.urandom(1024 * 1024) * 16)
+
+    archive = _make_tar(str(tmp_path / 'synthetic.tar.xz'), build, 'w:xz', preset=0)
+
+    start = time.perf_counter()
+    with tarfile.open(archive) as tar:
+        tar.extractall(str(tmp_path / 'ref'))
+    ref_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    extract_tar_stream(archive, str(tmp_path / 'new'))
+    new_time = time.perf_counter() - start
+
+    print(f'\ntarfile.extractall: {ref_time:.2f}s TarExtractor: {new_time:.2f}s')
+    ref = _list_tree(str(tmp_path / 'ref'))
+    new = _list_tree(str(tmp_path / 'new'))
+    assert ref.keys() == new.keys()
+    assert all(ref[name][:2] == new[name][:2] for name in ref)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+#
+import hashlib
+import io
+import os
+import tarfile
+
+import pytest
+
+from conflib.common import PackageTarGz, TreeCache
+
+
+def _package(tmp_path, files: dict) -> PackageTarGz:
+    save_dir = tmp_path / 'cache'
+    save_dir.mkdir(exist_ok=True)
+    with tarfile.open(save_dir / 'tb.tar.gz', 'w:gz') as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(f'tor-browser/{name}')
+            info.size = len(data)
+            info.mode = 0o644
+            info.mtime = 1_600_000_000
+            tar.addfile(info, io.BytesIO(data))
+
+    app = PackageTarGz('torbrowser', 'tb.tar.gz', str(save_dir))
+    app.dir_package_files = 'tor-browser'
+    app.hash = hashlib.sha256((save_dir / 'tb.tar.gz').read_bytes()).hexdigest()
+    app.tree_cache = TreeCache(str(save_dir))
+    app.hardlink = True
+    app.verbose = False
+    return app
+
+
+def test_materialize_from_cache(tmp_path):
+    app = _package(tmp_path, {'firefox': b'binario', 'lib/libxul.so': b'biblioteca'})
+    assert app.unpack_to(str(tmp_path / 'app1'))
+    assert app.tree_cache.contains(app.hash) and app.tree_cache.check(app.hash)
+
+    # Sem o pacote: a segunda instalação usa apenas o cache.
+    os.remove(app.pkg_file().absolute())
+    assert app.unpack_to(str(tmp_path / 'app2'))
+    assert (tmp_path / 'app2' / 'lib' / 'libxul.so').read_bytes() == b'biblioteca'
+
+
+def test_changed_tree_is_not_materialized(tmp_path):
+    app = _package(tmp_path, {'firefox': b'binario', 'lib/libxul.so': b'biblioteca'})
+    installed = tmp_path / 'app1'
+    assert app.unpack_to(str(installed))
+
+    # Alteração no lugar na instalação: com hardlink o cache também muda.
+    with open(installed / 'firefox', 'r+b') as fp:
+        fp.write(b'B')
+    st = os.stat(os.path.join(app.tree_cache.path(app.hash), 'firefox'))
+    if st.st_ino != os.stat(installed / 'firefox').st_ino:
+        pytest.skip('sem hardlink neste sistema de arquivos')
+    assert not app.tree_cache.check(app.hash)
+
+    assert app.unpack_to(str(tmp_path / 'app2'))
+    assert (tmp_path / 'app2' / 'firefox').read_bytes() == b'binario'
+    # A árvore foi recriada a partir do pacote.
+    assert app.tree_cache.check(app.hash)
+
+
+def test_changed_tree_downloads_package(http_server, tmp_path):
+    app = _package(tmp_path, {'firefox': b'binario'})
+    os.replace(app.pkg_file().absolute(), os.path.join(http_server.root, 'tb.tar.gz'))
+    app.url = f'{http_server.url}/tb.tar.gz'
+    app.pipeline = True
+    assert app.unpack_to(str(tmp_path / 'app1'))
+
+    os.remove(os.path.join(app.tree_cache.path(app.hash), 'firefox'))
+    app.pipeline = False
+    assert app.unpack_to(str(tmp_path / 'app2'))
+    assert (tmp_path / 'app2' / 'firefox').read_bytes() == b'binario'
+    assert app.pkg_file().exists()
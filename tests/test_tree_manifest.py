@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+#
+import io
+import os
+import tarfile
+
+import pytest
+
+from conflib.common import TarExtractor, TreeManifest, extract_tar_stream
+
+
+@pytest.fixture
+def tree(tmp_path):
+    """Árvore extraída de um tar com TreeManifest gravado, retorna o diretório."""
+    archive = str(tmp_path / 'pkg.tar')
+    with tarfile.open(archive, 'w') as tar:
+        for name in ('a.txt', 'b.txt', 'c.txt', 'sub/d.txt'):
+            data = f'conteúdo de {name}'.encode()
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mode = 0o644
+            info.mtime = 1_600_000_000
+            tar.addfile(info, io.BytesIO(data))
+        info = tarfile.TarInfo('link')
+        info.type = tarfile.SYMTYPE
+        info.linkname = 'a.txt'
+        tar.addfile(info)
+
+    tree_dir = str(tmp_path / 'tree')
+    manifest = TreeManifest()
+    extract_tar_stream(archive, tree_dir, TarExtractor(manifest=manifest))
+    manifest.save(tree_dir)
+    return tree_dir
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_check_clean_tree(tree, workers):
+    result = TreeManifest.load(tree).check(tree, workers, full=True)
+    assert result == {'ok': 5, 'missing': [], 'modified': [], 'extra': []}
+
+
+def test_check_detects_changes(tree):
+    # Mesmo tamanho, outro conteúdo e outro mtime: relido com sha256.
+    with open(os.path.join(tree, 'a.txt'), 'r+b') as fp:
+        fp.write(b'C')
+    # Outro tamanho.
+    with open(os.path.join(tree, 'sub', 'd.txt'), 'ab') as fp:
+        fp.write(b'!')
+    os.remove(os.path.join(tree, 'b.txt'))
+    os.remove(os.path.join(tree, 'link'))
+    os.symlink('c.txt', os.path.join(tree, 'link'))
+    with open(os.path.join(tree, 'sub', 'novo.txt'), 'wb') as fp:
+        fp.write(b'do usuario')
+
+    result = TreeManifest.load(tree).check(tree)
+    assert result == {
+        'ok': 1,
+        'missing': ['b.txt'],
+        'modified': ['a.txt', 'link', 'sub/d.txt'],
+        'extra': ['sub/novo.txt'],
+    }
+
+
+def test_check_full_rereads_same_mtime(tree):
+    path = os.path.join(tree, 'c.txt')
+    st = os.stat(path)
+    with open(path, 'r+b') as fp:
+        fp.write(b'X')
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    manifest = TreeManifest.load(tree)
+    # Sem full, o mesmo tamanho e mtime bastam.
+    assert manifest.check(tree)['modified'] == []
+    assert manifest.check(tree, full=True)['modified'] == ['c.txt']
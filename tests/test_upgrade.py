@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+#
+import io
+import os
+import tarfile
+
+from conflib.common import PackageTarGz, TreeManifest
+
+
+def _write_package(save_dir, appfile: str, files: dict) -> PackageTarGz:
+    """Grava save_dir/appfile com tor-browser/<nome> para cada item de files."""
+    with tarfile.open(os.path.join(save_dir, appfile), 'w:gz') as tar:
+        for name, data in files.items():
+            info = tarfile.TarInfo(f'tor-browser/{name}')
+            info.size = len(data)
+            info.mode = 0o644
+            info.mtime = 1_600_000_000
+            tar.addfile(info, io.BytesIO(data))
+
+    app = PackageTarGz('torbrowser', appfile, str(save_dir))
+    app.dir_package_files = 'tor-browser'
+    return app
+
+
+def test_upgrade_keeps_unchanged_and_removes_old_files(tmp_path):
+    installed_dir = str(tmp_path / 'installed')
+    target_dir = str(tmp_path / 'target')
+    old = _write_package(tmp_path, 'tb-1.tar.gz', {
+        'igual.txt': b'mesmo conteudo',
+        'alterado.txt': b'versao 1',
+        'sub/removido.txt': b'so na versao 1',
+    })
+    assert old.unpack_to(installed_dir)
+    # Criado pelo usuário, não está no manifest.
+    (tmp_path / 'installed' / 'perfil.txt').write_bytes(b'usuario')
+
+    new = _write_package(tmp_path, 'tb-2.tar.gz', {
+        'igual.txt': b'mesmo conteudo',
+        'alterado.txt': b'versao 2',
+        'novo.txt': b'so na versao 2',
+    })
+    assert new.upgrade_to(installed_dir, target_dir)
+
+    def _read(root: str, name: str) -> bytes:
+        with open(os.path.join(root, name), 'rb') as fp:
+            return fp.read()
+
+    # O arquivo igual é mantido (o mesmo inode do clone), os outros são gravados.
+    assert os.stat(os.path.join(target_dir, 'igual.txt')).st_ino == os.stat(os.path.join(installed_dir, 'igual.txt')).st_ino
+    assert _read(target_dir, 'alterado.txt') == b'versao 2'
+    assert _read(target_dir, 'novo.txt') == b'so na versao 2'
+    assert not os.path.exists(os.path.join(target_dir, 'sub'))
+    assert _read(target_dir, 'perfil.txt') == b'usuario'
+
+    # A instalação atual não é alterada.
+    assert _read(installed_dir, 'alterado.txt') == b'versao 1'
+    assert _read(installed_dir, 'sub/removido.txt') == b'so na versao 1'
+
+    manifest = TreeManifest.load(target_dir)
+    assert sorted(manifest.files) == ['alterado.txt', 'igual.txt', 'novo.txt']
+    assert manifest.check(target_dir, full=True)['modified'] == []